@@ -0,0 +1,83 @@
+"""
+Compare rows/sec of the per-row INSERT ... ON CONFLICT loop the ingestion paths
+used against the COPY + single-merge bulk writer.
+
+Synthetic bars are written for made-up symbols inside a transaction that is
+rolled back after each run, so DailyStockInfo is left untouched. Run from the
+backend directory:
+    python -m benchmarks.bulk_upsert --symbols 50 --days 250
+"""
+import argparse
+import datetime
+import time
+import numpy as np
+import pandas as pd
+from queries.db import lease
+from queries.ingest import daily_frame, store_daily_frame
+
+# The statement the ingestion paths executed once per fetched day before the bulk writer
+row_insert_query = '''
+    INSERT INTO DailyStockInfo (symbol, timestamp, open, high, low, close, volume)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (symbol, timestamp)
+    DO UPDATE SET open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume
+'''
+
+
+def synthetic_frame(num_symbols, num_days, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=datetime.date.today() - datetime.timedelta(days=1), periods=num_days)
+    parts = []
+    for i in range(num_symbols):
+        close = 100 * np.cumprod(1 + rng.normal(0, 0.01, num_days))
+        bars = pd.DataFrame({
+            'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+            'Volume': rng.integers(1_000, 1_000_000, num_days),
+        }, index=index)
+        parts.append(daily_frame(f'ZZ{i:03d}', bars))
+    return pd.concat(parts, ignore_index=True)
+
+
+def timed(conn, fn):
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        fn(cursor)
+        return time.perf_counter() - started
+    finally:
+        conn.rollback()
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--days', type=int, default=250)
+    args = parser.parse_args()
+
+    frame = synthetic_frame(args.symbols, args.days)
+    # Plain Python values, as the old loop passed them (psycopg2 does not adapt NumPy scalars)
+    rows = [(symbol, date, float(o), float(h), float(l), float(c), int(v))
+            for symbol, date, o, h, l, c, v in frame.itertuples(index=False, name=None)]
+
+    def run_rows(cursor):
+        for row in rows:
+            cursor.execute(row_insert_query, row)
+
+    with lease() as conn:
+        row_time = timed(conn, run_rows)
+        bulk_time = timed(conn, lambda cursor: store_daily_frame(cursor, frame))
+
+    print(f"{len(rows)} rows ({args.symbols} symbols x {args.days} days)")
+    print(f"  per-row INSERT : {row_time:8.3f}s  {len(rows) / row_time:10.0f} rows/s")
+    print(f"  COPY + merge   : {bulk_time:8.3f}s  {len(rows) / bulk_time:10.0f} rows/s")
+    if bulk_time > 0:
+        print(f"  speedup        : {row_time / bulk_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Run EXPLAIN (ANALYZE, BUFFERS) on every statement the read query methods
+execute and flag sequential scans, to check the managed index set in
+queries/setup.py covers the access patterns of the query modules.
+
+Each method runs with sample ids on one leased connection whose cursors
+explain every plain SELECT before executing it, in a transaction of its own
+that is rolled back. Other statements, WITH ... INSERT/UPDATE included, are
+not explained: EXPLAIN ANALYZE would run them a second time. On a small
+development database the planner prefers sequential scans of tiny tables
+anyway; --no-seqscan disables them so any that remain mean no index can serve
+the statement. Run from the backend directory:
+    python -m benchmarks.index_advisor --user 1 --portfolio 1 --stocklist 1
+"""
+import argparse
+import json
+import psycopg2.extensions
+from queries.db import lease
+from queries.friends import Friends
+from queries.reviews import Reviews
+from queries.portfolio import Portfolio
+from queries.stock_list import StockList
+from queries.stock_data import StockData
+
+MIN_SCANNED_ROWS = 1000  # sequential scans reading fewer rows are reported but not flagged
+
+_explained = []  # (method, statement, plan) of the statements explained so far
+
+
+class ExplainingCursor(psycopg2.extensions.cursor):
+    """Cursor that records the EXPLAIN ANALYZE plan of each plain SELECT before running it"""
+
+    method = None
+
+    def execute(self, query, params=None):
+        # Named (server-side) cursors cannot declare an EXPLAIN
+        if self.name is None and query.lstrip()[:6].upper() == 'SELECT':
+            super().execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + query, params)
+            plan = self.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            _explained.append((ExplainingCursor.method, ' '.join(query.split()), plan[0]))
+        return super().execute(query, params)
+
+
+def sequential_scans(node):
+    """(relation, rows read, buffers) of every Seq Scan node in a plan tree"""
+    scans = []
+    if node['Node Type'] == 'Seq Scan':
+        loops = node.get('Actual Loops', 1)
+        rows = (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * loops
+        buffers = node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)
+        scans.append((node['Relation Name'], rows, buffers))
+    for child in node.get('Plans', []):
+        scans.extend(sequential_scans(child))
+    return scans
+
+
+def sample_ids(cursor, args):
+    """Fill the ids not given on the command line from the first rows of their tables"""
+    if args.portfolio is None:
+        cursor.execute('SELECT portfolio_id, user_id FROM Portfolios ORDER BY portfolio_id LIMIT 1')
+        row = cursor.fetchone()
+        if row:
+            args.portfolio = row[0]
+            args.user = row[1] if args.user is None else args.user
+    if args.stocklist is None:
+        cursor.execute('SELECT stocklist_id, creator_id FROM StockLists ORDER BY stocklist_id LIMIT 1')
+        row = cursor.fetchone()
+        if row:
+            args.stocklist = row[0]
+            args.user = row[1] if args.user is None else args.user
+    if args.user is None:
+        cursor.execute('SELECT user_id FROM Users ORDER BY user_id LIMIT 1')
+        row = cursor.fetchone()
+        args.user = row[0] if row else 0
+    args.portfolio = 0 if args.portfolio is None else args.portfolio
+    args.stocklist = 0 if args.stocklist is None else args.stocklist
+
+
+def query_methods(args):
+    """(name, call) of the read query methods, bound to the sample ids"""
+    friends, reviews, portfolio, stock_list, stock_data = Friends(), Reviews(), Portfolio(), StockList(), StockData()
+    user, portfolio_id, stocklist_id, symbol = args.user, args.portfolio, args.stocklist, args.symbol
+    return [
+        ('Friends.view_friends', lambda: friends.view_friends(user)),
+        ('Friends.view_incoming_requests', lambda: friends.view_incoming_requests(user)),
+        ('Friends.view_outgoing_requests', lambda: friends.view_outgoing_requests(user)),
+        ('Reviews.view_reviews', lambda: reviews.view_reviews(stocklist_id, user)),
+        ('Portfolio.view_user_portfolios', lambda: portfolio.view_user_portfolios(user)),
+        ('Portfolio.view_portfolio', lambda: portfolio.view_portfolio(user, portfolio_id)),
+        ('Portfolio.view_portfolio_transactions', lambda: portfolio.view_portfolio_transactions(user, portfolio_id)),
+        ('Portfolio.get_cash_balance', lambda: portfolio.get_cash_balance(portfolio_id, user)),
+        ('Portfolio.compute_portfolio_value', lambda: portfolio.compute_portfolio_value(user, portfolio_id)),
+        ('Portfolio.view_portfolio_history', lambda: portfolio.view_portfolio_history(user, portfolio_id, '1y')),
+        ('StockList.view_accessible_stock_lists', lambda: stock_list.view_accessible_stock_lists(user)),
+        ('StockList.view_user_owned_stock_lists', lambda: stock_list.view_user_owned_stock_lists(user)),
+        ('StockList.view_stock_list', lambda: stock_list.view_stock_list(user, stocklist_id)),
+        ('StockList.compute_stock_list_value', lambda: stock_list.compute_stock_list_value(user, stocklist_id)),
+        ('StockList.view_stock_list_history', lambda: stock_list.view_stock_list_history(user, stocklist_id, '1y')),
+        ('StockData.view_stock_info', lambda: stock_data.view_stock_info(symbol, '1y')),
+        ('StockData.count_stock_info', lambda: stock_data.count_stock_info(symbol, '1y')),
+        ('StockData.view_stock_info_page', lambda: stock_data.view_stock_info_page(symbol, '1y')),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', type=int)
+    parser.add_argument('--portfolio', type=int)
+    parser.add_argument('--stocklist', type=int)
+    parser.add_argument('--symbol', default='AAPL')
+    parser.add_argument('--min-rows', type=int, default=MIN_SCANNED_ROWS)
+    parser.add_argument('--no-seqscan', action='store_true', help='set enable_seqscan = off for the run')
+    parser.add_argument('--verbose', action='store_true', help='print every statement, not only flagged ones')
+    args = parser.parse_args()
+
+    with lease() as conn:
+        cursor = conn.cursor()
+        try:
+            sample_ids(cursor, args)
+            conn.rollback()
+            if args.no_seqscan:
+                # Session-wide, so a method that commits does not end it (unlike SET LOCAL)
+                cursor.execute('SET enable_seqscan = off')
+                conn.commit()
+            print(f"user {args.user}, portfolio {args.portfolio}, stocklist {args.stocklist}, symbol {args.symbol}")
+            conn.cursor_factory = ExplainingCursor
+            for name, call in query_methods(args):
+                ExplainingCursor.method = name
+                # Each method gets its own transaction, ended here whether it committed,
+                # rolled back or failed part way
+                try:
+                    call()
+                except Exception as e:
+                    print(f"❌ {name} failed: {e}")
+                finally:
+                    conn.rollback()
+        finally:
+            conn.cursor_factory = psycopg2.extensions.cursor
+            conn.rollback()
+            if args.no_seqscan and not conn.closed:
+                cursor.execute('RESET enable_seqscan')
+                conn.commit()
+            cursor.close()
+
+    flagged = 0
+    for method, statement, explained in _explained:
+        scans = sequential_scans(explained['Plan'])
+        flagged_scans = [scan for scan in scans if args.no_seqscan or scan[1] >= args.min_rows]
+        flagged += bool(flagged_scans)
+        if not flagged_scans and not args.verbose:
+            continue
+        mark = '❌' if flagged_scans else '✅'
+        print(f"{mark} {method}: {explained['Execution Time']:.2f} ms  {statement[:100]}")
+        for relation, rows, buffers in scans:
+            print(f"      Seq Scan on {relation}: {rows} rows, {buffers} buffers")
+    print(f"{len(_explained)} statements explained, {flagged} with sequential scans to index")
+
+
+if __name__ == '__main__':
+    main()
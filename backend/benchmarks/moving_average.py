@@ -0,0 +1,61 @@
+"""
+Compare the per-window np.average loop BasePredictionModel used for its weighted
+moving average against the vectorized implementation, over the full close
+history of every symbol in Stocks.
+
+Run from the backend directory against a database with the S&P history loaded:
+    python -m benchmarks.moving_average
+"""
+import argparse
+import time
+import numpy as np
+from queries.db import lease
+from queries.price_store import price_store
+from models.prediction_model import BasePredictionModel
+
+
+def loop_moving_average(prices, window_size):
+    """The implementation before vectorization"""
+    if len(prices) < window_size:
+        return prices
+    moving_avg = []
+    for i in range(len(prices) - window_size + 1):
+        window = prices[i:i+window_size]
+        weights = np.linspace(1, 2, window_size)
+        moving_avg.append(np.average(window, weights=weights))
+    return moving_avg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=None, help='limit the number of symbols')
+    args = parser.parse_args()
+
+    with lease() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT symbol FROM Stocks ORDER BY symbol")
+        symbols = [row[0] for row in cursor.fetchall()][:args.symbols]
+        history = price_store.get_many(cursor, symbols)
+        cursor.close()
+    closes = [history[symbol].close.tolist() for symbol in symbols if len(history[symbol])]
+
+    model = BasePredictionModel()
+    started = time.perf_counter()
+    expected = [loop_moving_average(prices, model.window_size) for prices in closes]
+    loop_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = [model._calculate_moving_average(prices) for prices in closes]
+    vector_time = time.perf_counter() - started
+
+    identical = all(np.array_equal(a, b) for a, b in zip(expected, actual))
+    print(f"{len(closes)} symbols, {sum(len(prices) for prices in closes)} closes")
+    print(f"  np.average loop : {loop_time:8.3f}s")
+    print(f"  vectorized      : {vector_time:8.3f}s")
+    if vector_time > 0:
+        print(f"  speedup         : {loop_time / vector_time:8.1f}x")
+    print(f"  identical output: {identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare the old CROSS JOIN history SQL against the vectorized history engine.
+
+Run from the backend directory against a database with the S&P history loaded:
+    python -m benchmarks.portfolio_history --symbols 500
+"""
+import argparse
+import datetime
+import time
+from queries.db import lease
+from queries.history_engine import holdings_valuation
+
+# The history query used by view_portfolio_history before the engine, with the
+# holdings inlined so the benchmark does not need to create a portfolio
+sql_history_query = '''
+    WITH holdings(symbol, num_shares) AS (
+        SELECT * FROM unnest(%s::varchar[], %s::int[])
+    ),
+    portfolio_dates AS (
+        SELECT DISTINCT timestamp
+        FROM StockPrices
+        WHERE timestamp >= %s AND timestamp <= %s
+    ),
+    stock_values AS (
+        SELECT pd.timestamp, ps.symbol, ps.num_shares, sp.close as close_price
+        FROM portfolio_dates pd
+        CROSS JOIN holdings ps
+        LEFT JOIN StockPrices sp ON sp.symbol = ps.symbol AND sp.timestamp = pd.timestamp
+    )
+    SELECT timestamp, SUM(num_shares * close_price) + %s as total_value
+    FROM stock_values
+    GROUP BY timestamp
+    ORDER BY timestamp ASC;
+'''
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with lease() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT symbol FROM Stocks ORDER BY symbol LIMIT %s", (args.symbols,))
+        symbols = [row[0] for row in cursor.fetchall()]
+        holdings = [(symbol, 10) for symbol in symbols]
+        cursor.execute("SELECT MAX(timestamp) FROM StockPrices")
+        end_date = cursor.fetchone()[0]
+        start_date = datetime.date(1900, 1, 1)
+
+        def run_sql():
+            cursor.execute(sql_history_query, (symbols, [10] * len(symbols), start_date, end_date, 0))
+            return cursor.fetchall()
+
+        def run_engine():
+            # Measure the computation, not the result cache
+            holdings_valuation.invalidate()
+            return holdings_valuation.value_series(cursor, holdings, start_date, end_date)
+
+        def run_cached():
+            return holdings_valuation.value_series(cursor, holdings, start_date, end_date)
+
+        sql_time, sql_rows = timed(run_sql, args.repeat)
+        engine_time, engine_rows = timed(run_engine, args.repeat)
+        cached_time, _ = timed(run_cached, args.repeat)
+        cursor.close()
+
+    print(f"{len(symbols)} symbols, history through {end_date}")
+    print(f"  SQL CROSS JOIN : {sql_time:8.3f}s  ({len(sql_rows)} rows)")
+    print(f"  vector engine  : {engine_time:8.3f}s  ({len(engine_rows)} rows)")
+    print(f"  cached result  : {cached_time:8.3f}s")
+    if engine_time > 0:
+        print(f"  speedup        : {sql_time / engine_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
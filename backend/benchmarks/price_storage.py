@@ -0,0 +1,99 @@
+"""
+Compare the REAL/INT price layout with compact storage (integer cents, BIGINT
+volume, BRIN index on timestamp): table and index sizes, and the time of a
+full scan and of a date-range scan.
+
+Synthetic bars are COPYed into two temp tables shaped like DailyStockInfo in
+each mode, inside a transaction that is rolled back, so no real table is
+touched. Run from the backend directory:
+    python -m benchmarks.price_storage --symbols 500 --days 2500
+"""
+import argparse
+import datetime
+import io
+import time
+from queries.db import lease
+from queries.setup import stored_prices
+from benchmarks.bulk_upsert import synthetic_frame
+
+LAYOUTS = {
+    'REAL / INT': ('open REAL, high REAL, low REAL, close REAL, volume INT', False, []),
+    'cents / BIGINT': ('open INT, high INT, low INT, close INT, volume BIGINT', True,
+                       ['CREATE INDEX ON {table} USING BRIN (timestamp)']),
+}
+
+
+def build(cursor, table, columns, compact, indexes, buffer):
+    cursor.execute(f'''
+        CREATE TEMP TABLE {table} (
+            timestamp DATE, {columns}, symbol VARCHAR(5),
+            PRIMARY KEY (symbol, timestamp)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TEMP TABLE PriceStorageStaging (
+            symbol VARCHAR(5), timestamp DATE, open DOUBLE PRECISION, high DOUBLE PRECISION,
+            low DOUBLE PRECISION, close DOUBLE PRECISION, volume BIGINT
+        )
+    ''')
+    buffer.seek(0)
+    cursor.copy_expert('COPY PriceStorageStaging FROM STDIN WITH (FORMAT csv)', buffer)
+    cursor.execute(f'''
+        INSERT INTO {table} (timestamp, open, high, low, close, volume, symbol)
+        SELECT timestamp, {stored_prices(compact)}, volume, symbol
+          FROM PriceStorageStaging
+         ORDER BY timestamp, symbol
+    ''')
+    cursor.execute('DROP TABLE PriceStorageStaging')
+    for index in indexes:
+        cursor.execute(index.format(table=table))
+    cursor.execute(f'ANALYZE {table}')
+
+
+def sizes(cursor, table):
+    cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', (table, table))
+    return cursor.fetchone()
+
+
+def timed(cursor, query, params=None, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--days', type=int, default=2500)
+    args = parser.parse_args()
+
+    frame = synthetic_frame(args.symbols, args.days)
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    last_month = frame['timestamp'].max() - datetime.timedelta(days=30)
+
+    with lease() as conn:
+        cursor = conn.cursor()
+        try:
+            print(f"{len(frame)} rows ({args.symbols} symbols x {args.days} days)")
+            for i, (name, (columns, compact, indexes)) in enumerate(LAYOUTS.items()):
+                table = f'price_layout_{i}'
+                build(cursor, table, columns, compact, indexes, buffer)
+                table_bytes, index_bytes = sizes(cursor, table)
+                full_scan = timed(cursor, f'SELECT symbol, AVG(close) FROM {table} GROUP BY symbol')
+                range_scan = timed(cursor, f'SELECT symbol, AVG(close) FROM {table} WHERE timestamp >= %s '
+                                           'GROUP BY symbol', (last_month,))
+                print(f"  {name:15}: table {table_bytes / 2**20:8.1f} MB  indexes {index_bytes / 2**20:8.1f} MB  "
+                      f"full scan {full_scan * 1000:8.1f} ms  last 30 days {range_scan * 1000:8.1f} ms")
+        finally:
+            conn.rollback()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the old self-join correlation SQL against the NumPy analytics engine as
+the number of holdings grows.
+
+Run from the backend directory against a database with the S&P history loaded:
+    python -m benchmarks.risk_analytics --sizes 10 50 100 200
+"""
+import argparse
+import datetime
+import time
+from queries.db import lease
+from queries.analytics_engine import compute_holdings_analytics
+
+# The analytics query used by compute_portfolio_analytics before the engine
+sql_analytics_query = '''
+    WITH daily_returns AS (
+        SELECT symbol, timestamp,
+            (close - LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp)) / LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp) as daily_return
+        FROM StockPrices
+        WHERE symbol IN %s AND timestamp >= %s AND timestamp <= %s
+    ),
+    spy_returns AS (
+        SELECT timestamp,
+            (close - LAG(close) OVER (ORDER BY timestamp)) / LAG(close) OVER (ORDER BY timestamp) as spy_return
+        FROM StockPrices
+        WHERE symbol = 'SPY' AND timestamp >= %s AND timestamp <= %s
+    ),
+    stock_stats AS (
+        SELECT dr.symbol,
+            AVG(dr.daily_return) as mean_return,
+            STDDEV(dr.daily_return) as std_return,
+            (AVG(dr.daily_return * sr.spy_return) - AVG(dr.daily_return) * AVG(sr.spy_return)) as cov_with_spy,
+            VARIANCE(sr.spy_return) as spy_variance
+        FROM daily_returns dr
+        JOIN spy_returns sr ON dr.timestamp = sr.timestamp
+        WHERE dr.daily_return IS NOT NULL AND sr.spy_return IS NOT NULL
+        GROUP BY dr.symbol
+    ),
+    correlation_matrix AS (
+        SELECT a.symbol as symbol1, b.symbol as symbol2,
+            (AVG(a.daily_return * b.daily_return) - AVG(a.daily_return) * AVG(b.daily_return)) /
+            (STDDEV(a.daily_return) * STDDEV(b.daily_return)) as correlation
+        FROM daily_returns a
+        JOIN daily_returns b ON a.timestamp = b.timestamp
+        GROUP BY a.symbol, b.symbol
+    ),
+    covariance_matrix AS (
+        SELECT a.symbol as symbol1, b.symbol as symbol2,
+            (AVG(a.daily_return * b.daily_return) - AVG(a.daily_return) * AVG(b.daily_return)) as covariance
+        FROM daily_returns a
+        JOIN daily_returns b ON a.timestamp = b.timestamp
+        GROUP BY a.symbol, b.symbol
+    )
+    SELECT ss.symbol, cm.symbol2, cm.correlation, covm.symbol2, covm.covariance
+    FROM stock_stats ss
+    LEFT JOIN correlation_matrix cm ON ss.symbol = cm.symbol1
+    LEFT JOIN covariance_matrix covm ON ss.symbol = covm.symbol1
+    ORDER BY ss.symbol, cm.symbol2, covm.symbol2;
+'''
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--years', type=int, default=1, help='length of the analysed window')
+    parser.add_argument('--skip-sql', action='store_true', help='only time the engine (the SQL is O(N^3) in rows)')
+    args = parser.parse_args()
+
+    with lease() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(timestamp) FROM StockPrices WHERE symbol = 'SPY'")
+        end_date = cursor.fetchone()[0]
+        start_date = end_date - datetime.timedelta(days=365 * args.years)
+        cursor.execute("SELECT symbol FROM Stocks WHERE symbol <> 'SPY' ORDER BY symbol LIMIT %s", (max(args.sizes),))
+        universe = [row[0] for row in cursor.fetchall()]
+
+        print(f"window {start_date} .. {end_date}")
+        print(f"{'holdings':>8} {'SQL (s)':>10} {'engine (s)':>11}")
+        for size in args.sizes:
+            symbols = universe[:size]
+            holdings = [(symbol, 1) for symbol in symbols]
+            sql_time = None
+            if not args.skip_sql:
+                sql_time = timed(lambda: (cursor.execute(sql_analytics_query, (tuple(symbols), start_date, end_date,
+                                                                                start_date, end_date)),
+                                          cursor.fetchall()))
+            engine_time = timed(lambda: compute_holdings_analytics(cursor, holdings, start_date, end_date))
+            sql_column = f"{sql_time:10.3f}" if sql_time is not None else f"{'-':>10}"
+            print(f"{size:>8} {sql_column} {engine_time:11.3f}")
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,9 @@ from queries.stock_list import StockList
 from queries.friends import Friends
 from queries.stock_data import StockData
 from queries.reviews import Reviews
-from queries.setup import setup_queries, load_stock_history_from_local, load_stock_history_from_local_fast, load_stock_history_from_csv, copy_symbols
+from queries.setup import setup_queries, load_stock_history_from_local, load_stock_history_from_local_fast, load_stock_history_from_csv, copy_symbols, backfill_stock_prices, refresh_stock_prices, ensure_price_partitions, compact_price_tables
+from queries.history_loader import import_stock_history
+from queries.db import get_pool, get_startup_timings
 import os
 import sys
 from tabulate import tabulate 
@@ -13,12 +15,6 @@ import datetime
 import pandas as pd
 import matplotlib.pyplot as plt
 
-# Database connection parameters
-DB_HOST = '34.130.75.185'
-DB_NAME = 'template1'
-DB_USER = 'postgres'
-DB_PASSWORD = '2357'
-
 # Instantiate the classes
 auth = Auth()
 portfolio = Portfolio()
@@ -400,7 +396,10 @@ def predict_portfolio_value():
             print("Invalid input. Using default 30 days")
             days = 30
             
-        predictions, confidence = portfolio.predict_portfolio_value(current_user_id, portfolio_id, days)
+        correlated = input("Simulate each holding with correlated returns? (y/n): ").lower() == 'y'
+            
+        predictions, confidence = portfolio.predict_portfolio_value(current_user_id, portfolio_id, days,
+                                                                    correlated=correlated)
         if predictions:
             print(f"\nPortfolio Value Predictions (Confidence: {confidence:.2%})")
             df = pd.DataFrame(predictions)
@@ -410,7 +409,9 @@ def predict_portfolio_value():
             if plot.lower() == 'y':
                 # Plot the predictions
                 plt.figure(figsize=(12, 8))
-                plt.plot(df['date'], df['value'], marker='o')
+                plt.plot(df['date'], df['value'], marker='o', label='Expected value')
+                plt.fill_between(df['date'], df['p5'], df['p95'], alpha=0.2, label='5th-95th percentile')
+                plt.legend()
                 plt.title(f'Portfolio {portfolio_id} Value Predictions')
                 plt.xlabel('Date')
                 plt.ylabel('Value ($)')
@@ -441,7 +442,9 @@ def predict_stock_list_value():
             plot = input("Do you want to see a graph of the predictions? (y/n): ")
             if plot.lower() == 'y':
                 plt.figure(figsize=(12, 8))
-                plt.plot(df['date'], df['value'], marker='o')
+                plt.plot(df['date'], df['value'], marker='o', label='Expected value')
+                plt.fill_between(df['date'], df['p5'], df['p95'], alpha=0.2, label='5th-95th percentile')
+                plt.legend()
                 plt.title(f'Stock List {stocklist_id} Value Predictions')
                 plt.xlabel('Date')
                 plt.ylabel('Value ($)')
@@ -912,11 +915,16 @@ def stock_info_menu():
                 pause()
                 continue
             graph = input("Do you want to see a graph of the stock? (y/n): ")
-            data = stock_data.view_stock_info(symbol, period)
-            if data:
-                print_header(f"Stock Information for {symbol}")
-                print(tabulate(data, headers=["Date", "Open", "High", "Low", "Close", "Volume"]))
-            else:
+            # Printed chunk by chunk, so long histories are never held in memory at once
+            printed = 0
+            for dates, values in stock_data.stream_stock_info(symbol, period, as_frame=False):
+                if not printed:
+                    print_header(f"Stock Information for {symbol}")
+                rows = [[date, *row] for date, row in zip(dates.astype(object), values.tolist())]
+                print(tabulate(rows, headers=["Date", "Open", "High", "Low", "Close", "Volume"] if not printed else (),
+                               floatfmt=("", ".2f", ".2f", ".2f", ".2f", ".0f")))
+                printed += len(rows)
+            if not printed:
                 print(f"\nNo stock information found for {symbol}.")
 
             if graph.lower() == 'y':
@@ -1021,44 +1029,52 @@ def delete_account_menu():
     pause()
 
 def setup_db(load_stock_history = False):
+    # Borrow from the shared pool so the socket is reused by the query classes afterwards
+    pool = get_pool()
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
+        conn = pool.getconn()
         cursor = conn.cursor()
         
         for query in setup_queries:
             cursor.execute(query)
+        ensure_price_partitions(cursor)
+        backfill_stock_prices(cursor)
         
         conn.commit()
-        print("Initial Database setup complete!")
+        timings = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in get_startup_timings().items())
+        print(f"Initial Database setup complete! ({timings})")
         
     except psycopg2.Error as e:
         print(f"Database setup failed: {e}")
         sys.exit(1)
 
     if not load_stock_history:
+        cursor.close()
+        pool.putconn(conn)
         return
     try:
+        if 'StocksHistory' in compact_price_tables(cursor):
+            # The server-side COPY would write dollar prices into the cents columns
+            raise psycopg2.Error("compact price storage is loaded by the local importer")
         cursor.execute(load_stock_history_from_csv)
         cursor.execute(copy_symbols)
+        refresh_stock_prices(cursor, include_history=True)
         conn.commit()
         cursor.close()
-        conn.close()
+        pool.putconn(conn)
         print("Database setup complete!")
     except psycopg2.Error as e:
         print(f"Loading stock history from VM has failed: {e}")
         print(f"Attemping to load stock history from local")
         conn.rollback()
         try:
-            load_stock_history_from_local_fast(conn)
+            if not import_stock_history(conn):
+                raise RuntimeError("history import failed; run setup again to resume it")
             cursor.execute(copy_symbols)
+            refresh_stock_prices(cursor, include_history=True)
             conn.commit()
             cursor.close()
-            conn.close()
+            pool.putconn(conn)
             print("Database setup complete!")
         except Exception as e:
             conn.rollback()
@@ -6,7 +6,13 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
 import sys
 import datetime
-from queries.setup import setup_queries, load_stock_history_from_local, load_stock_history_from_local_fast, load_stock_history_from_csv, copy_symbols
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from queries.setup import setup_queries, load_stock_history_from_local, load_stock_history_from_local_fast, load_stock_history_from_csv, copy_symbols, backfill_stock_prices, refresh_stock_prices, ensure_price_partitions
+from queries.history_loader import import_stock_history
+from queries.db import get_pool, get_startup_timings
 
 
 try:
@@ -14,7 +20,7 @@ try:
     from queries.portfolio import Portfolio
     from queries.stock_list import StockList
     from queries.friends import Friends
-    from queries.stock_data import StockData
+    from queries.stock_data import StockData, STOCK_INFO_PAGE_SIZE
     from queries.reviews import Reviews
     print("Backend modules imported successfully.")
 except ImportError as e:
@@ -24,16 +30,15 @@ except ImportError as e:
 
 def setup_db(load_stock_history = False):
     try:
-        conn = psycopg2.connect(
-            host='34.130.75.185',
-            database='template1',
-            user='postgres',
-            password='2357'
-        )
+        # Borrow from the shared pool so the socket is reused by the query classes afterwards
+        pool = get_pool()
+        conn = pool.getconn()
         cursor = conn.cursor()
         
         for query in setup_queries:
             cursor.execute(query)
+        ensure_price_partitions(cursor)
+        backfill_stock_prices(cursor)
         
         conn.commit()
         print("✅ Initial Database setup complete!")
@@ -46,9 +51,10 @@ def setup_db(load_stock_history = False):
                 # conn.commit()
                 # print("✅ Cleared existing stock data")
                 
-                success = load_stock_history_from_local_fast(conn)
+                success = import_stock_history(conn)
                 if success:
                     cursor.execute(copy_symbols)
+                    refresh_stock_prices(cursor, include_history=True)
                     conn.commit()
                     print("✅ Stock history loaded successfully!")
                 else:
@@ -58,12 +64,227 @@ def setup_db(load_stock_history = False):
                 conn.rollback()
                 
         cursor.close()
-        conn.close()
+        pool.putconn(conn)
         
     except psycopg2.Error as e:
         print(f"❌ Database setup failed: {e}")
         sys.exit(1)
 
+class BackgroundTask:
+    """Handle for a call submitted to TaskRunner"""
+
+    def __init__(self, key, label, on_done, on_error, events):
+        self.key = key
+        self.label = label
+        self.on_done = on_done
+        self.on_error = on_error
+        self.progress = None  # (done, total) once the job reports it
+        self.cancel_event = threading.Event()
+        self._events = events
+
+    def report(self, done, total):
+        """Progress callback for long jobs; safe to call from the worker thread"""
+        self._events.put((self, 'progress', (done, total)))
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class TaskRunner:
+    """
+    Runs backend calls on worker threads so the Tk event loop never waits on the
+    database or Yahoo. Workers only put results on a queue; a Tk after() poll
+    applies them on the UI thread. Submitting under a key that is still running
+    cancels the older task, so its result is dropped instead of overwriting the
+    view the user has since switched to.
+    """
+    POLL_MS = 50
+
+    def __init__(self, root, max_workers=4, on_status=None):
+        self.root = root
+        self.on_status = on_status  # called on the Tk thread with the running tasks
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gui-task')
+        self._events = queue.Queue()
+        self._active = {}
+        self._poll_job = root.after(self.POLL_MS, self._poll)
+
+    def submit(self, key, fn, on_done=None, on_error=None, label=None):
+        """
+        Run fn(task) on a worker thread, then on_done(result) or on_error(exception)
+        on the Tk thread. Long jobs can call task.report(done, total) and watch task.cancel_event.
+        """
+        previous = self._active.get(key)
+        if previous:
+            previous.cancel()
+        task = BackgroundTask(key, label or key, on_done, on_error, self._events)
+        self._active[key] = task
+        self._executor.submit(self._run, task, fn)
+        self._notify()
+        return task
+
+    def cancel(self, key=None):
+        """Cancel the task running under key, or every task"""
+        for active_key in [key] if key else list(self._active):
+            task = self._active.pop(active_key, None)
+            if task:
+                task.cancel()
+        self._notify()
+
+    def active(self):
+        return list(self._active.values())
+
+    def _run(self, task, fn):
+        try:
+            result = fn(task)
+        except Exception as e:
+            traceback.print_exc()
+            self._events.put((task, 'error', e))
+        else:
+            self._events.put((task, 'done', result))
+
+    def _poll(self):
+        changed = False
+        while True:
+            try:
+                task, kind, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if kind == 'progress':
+                task.progress = value
+                continue
+            if self._active.get(task.key) is task:
+                del self._active[task.key]
+            if task.cancelled:
+                continue
+            callback = task.on_done if kind == 'done' else task.on_error
+            if callback:
+                try:
+                    callback(value)
+                except Exception as e:
+                    # Failures while rendering a result are reported like failures of the call
+                    traceback.print_exc()
+                    if kind == 'done' and task.on_error:
+                        task.on_error(e)
+        if changed:
+            self._notify()
+        self._poll_job = self.root.after(self.POLL_MS, self._poll)
+
+    def _notify(self):
+        if self.on_status:
+            self.on_status(self.active())
+
+    def shutdown(self):
+        self.root.after_cancel(self._poll_job)
+        for task in self._active.values():
+            task.cancel()
+        self._active.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PagedTreeview(ttk.Frame):
+    """
+    Treeview that holds one page of rows at a time. Pages come from a keyset page
+    function (rows keyed by their first column) on a background task, so memory
+    and redraw time stay flat however many rows the source has.
+    """
+
+    def __init__(self, parent, columns, tasks, page_size=100, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.tasks = tasks
+        self.page_size = page_size
+        self.fetch_page = None
+        self.total = 0
+        self.offset = 0
+        self.rows = []
+
+        nav_frame = ttk.Frame(self)
+        nav_frame.pack(side="bottom", fill="x", pady=(5, 0))
+        ttk.Button(nav_frame, text="<< First", command=self.first_page).pack(side="left", padx=2)
+        ttk.Button(nav_frame, text="< Prev", command=self.previous_page).pack(side="left", padx=2)
+        ttk.Button(nav_frame, text="Next >", command=self.next_page).pack(side="left", padx=2)
+        ttk.Button(nav_frame, text="Last >>", command=self.last_page).pack(side="left", padx=2)
+        self.position_label = ttk.Label(nav_frame, text="")
+        self.position_label.pack(side="right", padx=5)
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings')
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=100)
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+    def load(self, fetch_page, fetch_count, on_empty=None):
+        """
+        Show the first page of a new source. fetch_page(after=, before=, last=, limit=)
+        returns rows in order; fetch_count() returns the total row count.
+        """
+        def load_first(task):
+            total = fetch_count()
+            return total, fetch_page(limit=self.page_size) if total else []
+
+        def on_done(result):
+            self.fetch_page = fetch_page
+            self.total, rows = result
+            self.show_rows(0, rows)
+            if not rows and on_empty:
+                on_empty()
+
+        self._submit(load_first, on_done)
+
+    def clear(self):
+        self.fetch_page = None
+        self.total = 0
+        self.show_rows(0, [])
+
+    def first_page(self):
+        if self.fetch_page and self.offset > 0:
+            self._request(lambda rows: 0)
+
+    def next_page(self):
+        if self.fetch_page and self.rows and self.offset + len(self.rows) < self.total:
+            offset = self.offset + len(self.rows)
+            self._request(lambda rows: offset, after=self.rows[-1][0])
+
+    def previous_page(self):
+        if self.fetch_page and self.rows and self.offset > 0:
+            offset = self.offset
+            self._request(lambda rows: max(offset - len(rows), 0), before=self.rows[0][0])
+
+    def last_page(self):
+        if self.fetch_page and self.offset + len(self.rows) < self.total:
+            total = self.total
+            self._request(lambda rows: max(total - len(rows), 0), last=True)
+
+    def show_rows(self, offset, rows):
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', 'end', values=row)
+        self.offset = offset
+        self.rows = rows
+        if rows:
+            self.position_label.config(text=f"Rows {offset + 1}-{offset + len(rows)} of {self.total}")
+        else:
+            self.position_label.config(text="")
+
+    def _request(self, offset_for, **bounds):
+        fetch_page = self.fetch_page
+        self._submit(lambda task: fetch_page(limit=self.page_size, **bounds),
+                     lambda rows: self.show_rows(offset_for(rows), rows))
+
+    def _submit(self, fn, on_done):
+        # One key per table: paging again before a page arrives supersedes the older request
+        self.tasks.submit(f"page-{id(self)}", fn, on_done=on_done,
+                          on_error=lambda e: messagebox.showerror("Error", f"Failed to load rows: {str(e)}"),
+                          label="Loading rows")
+
+
 class StockApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -211,6 +432,14 @@ class MainAppFrame(ttk.Frame):
         self.controller = controller
         # self._stocklist_refresh_job = None # Removed periodic refresh job
 
+        # Backend calls run off the Tk thread; the status bar shows what is loading
+        self.status_frame = ttk.Frame(self)
+        self.status_label = ttk.Label(self.status_frame, text="")
+        self.status_label.pack(side="left", padx=5)
+        self.status_cancel_button = ttk.Button(self.status_frame, text="Cancel", command=lambda: self.tasks.cancel())
+        self.status_progress = ttk.Progressbar(self.status_frame, length=200)
+        self.tasks = TaskRunner(self, on_status=self.update_task_status)
+
         # Top frame for logout and user info (optional)
         top_frame = ttk.Frame(self)
         top_frame.pack(side="top", fill="x", padx=10, pady=5)
@@ -246,9 +475,37 @@ class MainAppFrame(ttk.Frame):
 
         # Add delete account button
         ttk.Button(self, text="Delete Account", command=self.delete_account).pack(side="bottom", pady=10)
+        self.status_frame.pack(side="bottom", fill="x", padx=10)
 
         # Removed call to schedule_stocklist_refresh()
 
+    def update_task_status(self, tasks):
+        if not tasks:
+            self.status_label.config(text="")
+            self.status_progress.stop()
+            self.status_progress.config(mode="determinate", value=0)
+            self.status_progress.pack_forget()
+            self.status_cancel_button.pack_forget()
+            return
+        task = tasks[-1]
+        if task.progress:
+            done, total = task.progress
+            self.status_label.config(text=f"{task.label}... {done}/{total}")
+            self.status_progress.stop()
+            self.status_progress.config(mode="determinate", maximum=max(total, 1), value=done)
+        else:
+            self.status_label.config(text=f"{task.label}...")
+            if str(self.status_progress.cget("mode")) != "indeterminate":
+                self.status_progress.config(mode="indeterminate")
+                self.status_progress.start(10)
+        if not self.status_progress.winfo_ismapped():
+            self.status_cancel_button.pack(side="right", padx=5)
+            self.status_progress.pack(side="right", padx=5)
+
+    def destroy(self):
+        self.tasks.shutdown()
+        super().destroy()
+
     def setup_portfolio_tab(self):
         # Portfolio Management Frame
         management_frame = ttk.Frame(self.portfolio_tab)
@@ -545,21 +802,10 @@ class MainAppFrame(ttk.Frame):
         data_frame = ttk.LabelFrame(self.stockinfo_tab, text="Stock Data", padding="10")
         data_frame.pack(fill="both", expand=True, padx=5, pady=5)
 
-        # Create Treeview for stock data
+        # Paged table for stock data: only one page of rows is in the widget at a time
         columns = ("Date", "Open", "High", "Low", "Close", "Volume")
-        self.stock_tree = ttk.Treeview(data_frame, columns=columns, show='headings')
-        
-        # Configure column headings
-        for col in columns:
-            self.stock_tree.heading(col, text=col)
-            self.stock_tree.column(col, width=100)
-
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(data_frame, orient="vertical", command=self.stock_tree.yview)
-        self.stock_tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.stock_tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.stock_table = PagedTreeview(data_frame, columns, self.tasks, page_size=STOCK_INFO_PAGE_SIZE)
+        self.stock_table.pack(fill="both", expand=True)
 
         # Graph Frame
         self.graph_frame = ttk.LabelFrame(self.stockinfo_tab, text="Stock Price Chart", padding="10")
@@ -578,20 +824,12 @@ class MainAppFrame(ttk.Frame):
             return
 
         period = self.period_var.get()
-        try:
-            data = self.controller.stock_data.view_stock_info(symbol, period)
-            if data:
-                # Clear existing items
-                for item in self.stock_tree.get_children():
-                    self.stock_tree.delete(item)
-
-                # Insert new data
-                for row in data:
-                    self.stock_tree.insert('', 'end', values=row)
-            else:
-                messagebox.showinfo("Info", f"No data found for {symbol}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to fetch stock data: {str(e)}")
+        stock_data = self.controller.stock_data
+        self.stock_table.load(
+            lambda **page: stock_data.view_stock_info_page(symbol, period, **page),
+            lambda: stock_data.count_stock_info(symbol, period),
+            on_empty=lambda: messagebox.showinfo("Info", f"No data found for {symbol}")
+        )
 
     def fetch_stock_info(self):
         symbol = self.stock_symbol_var.get().upper()
@@ -618,14 +856,21 @@ class MainAppFrame(ttk.Frame):
         if days is None:  # User cancelled
             return
 
-        try:
-            result = self.controller.stock_data.fetch_and_store_all_stocks_daily_info(days)
+        def on_done(result):
             if result:
                 messagebox.showinfo("Success", f"Successfully fetched {days} days of data for all stocks")
             else:
                 messagebox.showerror("Error", "Failed to fetch data for all stocks")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+
+        # Runs for minutes on a full refresh; progress and Cancel are in the status bar
+        self.tasks.submit(
+            'fetch_all_stocks',
+            lambda task: self.controller.stock_data.fetch_and_store_all_stocks_daily_info(
+                days, progress=task.report, cancel=task.cancel_event),
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("Error", f"An error occurred: {str(e)}"),
+            label="Fetching all stocks"
+        )
 
     def predict_stock_price(self):
         symbol = self.stock_symbol_var.get().upper()
@@ -703,15 +948,11 @@ class MainAppFrame(ttk.Frame):
             # Clear previous plot
             self.stock_ax.clear()
             
-            # Get the data
-            data = self.controller.stock_data.view_stock_info(symbol, period)
-            if data:
-                # Convert data for plotting
-                df = pd.DataFrame(data, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-                df['Date'] = pd.to_datetime(df['Date'])
-                
+            # Get the data (already columnar, from the price store)
+            df = self.controller.stock_data.view_stock_frame(symbol, period)
+            if df is not None and not df.empty:
                 # Plot the data
-                self.stock_ax.plot(df['Date'], df['Close'], label='Close Price')
+                self.stock_ax.plot(df.index, df['Close'], label='Close Price')
                 self.stock_ax.set_title(f'{symbol} Stock Price - {period}')
                 self.stock_ax.set_xlabel('Date')
                 self.stock_ax.set_ylabel('Price ($)')
@@ -1022,96 +1263,94 @@ class MainAppFrame(ttk.Frame):
             messagebox.showerror("Error", "Invalid date format. Please use YYYY-MM-DD.")
             return
 
-        try:
-            analytics = self.controller.portfolio.compute_portfolio_analytics(
-                self.controller.current_user_id,
-                portfolio_id,
-                start_date,
-                end_date
-            )
-
-            if not analytics:
-                messagebox.showinfo("Info", "No analytics available for this portfolio or date range.")
-                return
-
-            # 새 창 생성
-            analytics_window = tk.Toplevel(self)
-            analytics_window.title(f"Analytics for Portfolio {portfolio_id}")
-            analytics_window.geometry("800x600")
-
-            # Notebook으로 섹션 나누기
-            notebook = ttk.Notebook(analytics_window)
-            notebook.pack(pady=10, padx=10, fill="both", expand=True)
-
-            # --- Stock Analytics Tab ---
-            stock_frame = ttk.Frame(notebook, padding="10")
-            notebook.add(stock_frame, text='Stock Stats')
-
-            stock_cols = ("Symbol", "Shares", "Coefficient of Variation", "Beta")
-            stock_tree = ttk.Treeview(stock_frame, columns=stock_cols, show='headings')
-            for col in stock_cols:
-                stock_tree.heading(col, text=col)
-                stock_tree.column(col, width=150, anchor='center')
-
-            stock_scrollbar = ttk.Scrollbar(stock_frame, orient="vertical", command=stock_tree.yview)
-            stock_tree.configure(yscrollcommand=stock_scrollbar.set)
-            stock_tree.pack(side="left", fill="both", expand=True)
-            stock_scrollbar.pack(side="right", fill="y")
-
-            for stock in analytics['stock_analytics']:
-                 stock_tree.insert('', 'end', values=(
-                     stock['symbol'],
-                     f"{stock['shares']:.2f}",
-                     f"{stock['coefficient_of_variation']:.4f}",
-                     f"{stock['beta']:.4f}"
-                 ))
-
-            # --- Correlation Matrix Tab ---
-            corr_frame = ttk.Frame(notebook, padding="10")
-            notebook.add(corr_frame, text='Correlation Matrix')
-
-            symbols = sorted(analytics['correlation_matrix'].keys())
-            corr_cols = ["Symbol"] + symbols
-            corr_tree = ttk.Treeview(corr_frame, columns=corr_cols, show='headings')
-            corr_tree.heading("Symbol", text="Symbol")
-            corr_tree.column("Symbol", width=80, anchor='w')
-            for symbol in symbols:
-                corr_tree.heading(symbol, text=symbol)
-                corr_tree.column(symbol, width=80, anchor='center')
-
-            corr_scrollbar = ttk.Scrollbar(corr_frame, orient="vertical", command=corr_tree.yview)
-            corr_tree.configure(yscrollcommand=corr_scrollbar.set)
-            corr_tree.pack(side="left", fill="both", expand=True)
-            corr_scrollbar.pack(side="right", fill="y")
-
-            for symbol1 in symbols:
-                row_values = [symbol1] + [f"{analytics['correlation_matrix'][symbol1].get(symbol2, 0):.4f}" for symbol2 in symbols]
-                corr_tree.insert('', 'end', values=row_values)
-
-            # --- Covariance Matrix Tab ---
-            cov_frame = ttk.Frame(notebook, padding="10")
-            notebook.add(cov_frame, text='Covariance Matrix')
-
-            cov_cols = ["Symbol"] + symbols
-            cov_tree = ttk.Treeview(cov_frame, columns=cov_cols, show='headings')
-            cov_tree.heading("Symbol", text="Symbol")
-            cov_tree.column("Symbol", width=80, anchor='w')
-            for symbol in symbols:
-                cov_tree.heading(symbol, text=symbol)
-                cov_tree.column(symbol, width=80, anchor='center')
-
-            cov_scrollbar = ttk.Scrollbar(cov_frame, orient="vertical", command=cov_tree.yview)
-            cov_tree.configure(yscrollcommand=cov_scrollbar.set)
-            cov_tree.pack(side="left", fill="both", expand=True)
-            cov_scrollbar.pack(side="right", fill="y")
-
-            for symbol1 in symbols:
-                row_values = [symbol1] + [f"{analytics['covariance_matrix'][symbol1].get(symbol2, 0):.4f}" for symbol2 in symbols]
-                cov_tree.insert('', 'end', values=row_values)
+        user_id = self.controller.current_user_id
+        self.tasks.submit(
+            'portfolio_analytics',
+            lambda task: self.controller.portfolio.compute_portfolio_analytics(user_id, portfolio_id, start_date, end_date),
+            on_done=lambda analytics: self.show_analytics(portfolio_id, analytics),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to compute or display analytics: {str(e)}"),
+            label="Computing analytics"
+        )
 
+    def show_analytics(self, portfolio_id, analytics):
+        if not analytics:
+            messagebox.showinfo("Info", "No analytics available for this portfolio or date range.")
+            return
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to compute or display analytics: {str(e)}")
+        # 새 창 생성
+        analytics_window = tk.Toplevel(self)
+        analytics_window.title(f"Analytics for Portfolio {portfolio_id}")
+        analytics_window.geometry("800x600")
+
+        # Notebook으로 섹션 나누기
+        notebook = ttk.Notebook(analytics_window)
+        notebook.pack(pady=10, padx=10, fill="both", expand=True)
+
+        # --- Stock Analytics Tab ---
+        stock_frame = ttk.Frame(notebook, padding="10")
+        notebook.add(stock_frame, text='Stock Stats')
+
+        stock_cols = ("Symbol", "Shares", "Coefficient of Variation", "Beta")
+        stock_tree = ttk.Treeview(stock_frame, columns=stock_cols, show='headings')
+        for col in stock_cols:
+            stock_tree.heading(col, text=col)
+            stock_tree.column(col, width=150, anchor='center')
+
+        stock_scrollbar = ttk.Scrollbar(stock_frame, orient="vertical", command=stock_tree.yview)
+        stock_tree.configure(yscrollcommand=stock_scrollbar.set)
+        stock_tree.pack(side="left", fill="both", expand=True)
+        stock_scrollbar.pack(side="right", fill="y")
+
+        for stock in analytics['stock_analytics']:
+             stock_tree.insert('', 'end', values=(
+                 stock['symbol'],
+                 f"{stock['shares']:.2f}",
+                 f"{stock['coefficient_of_variation']:.4f}",
+                 f"{stock['beta']:.4f}"
+             ))
+
+        # --- Correlation Matrix Tab ---
+        corr_frame = ttk.Frame(notebook, padding="10")
+        notebook.add(corr_frame, text='Correlation Matrix')
+
+        symbols = sorted(analytics['correlation_matrix'].keys())
+        corr_cols = ["Symbol"] + symbols
+        corr_tree = ttk.Treeview(corr_frame, columns=corr_cols, show='headings')
+        corr_tree.heading("Symbol", text="Symbol")
+        corr_tree.column("Symbol", width=80, anchor='w')
+        for symbol in symbols:
+            corr_tree.heading(symbol, text=symbol)
+            corr_tree.column(symbol, width=80, anchor='center')
+
+        corr_scrollbar = ttk.Scrollbar(corr_frame, orient="vertical", command=corr_tree.yview)
+        corr_tree.configure(yscrollcommand=corr_scrollbar.set)
+        corr_tree.pack(side="left", fill="both", expand=True)
+        corr_scrollbar.pack(side="right", fill="y")
+
+        for symbol1 in symbols:
+            row_values = [symbol1] + [f"{analytics['correlation_matrix'][symbol1].get(symbol2, 0):.4f}" for symbol2 in symbols]
+            corr_tree.insert('', 'end', values=row_values)
+
+        # --- Covariance Matrix Tab ---
+        cov_frame = ttk.Frame(notebook, padding="10")
+        notebook.add(cov_frame, text='Covariance Matrix')
+
+        cov_cols = ["Symbol"] + symbols
+        cov_tree = ttk.Treeview(cov_frame, columns=cov_cols, show='headings')
+        cov_tree.heading("Symbol", text="Symbol")
+        cov_tree.column("Symbol", width=80, anchor='w')
+        for symbol in symbols:
+            cov_tree.heading(symbol, text=symbol)
+            cov_tree.column(symbol, width=80, anchor='center')
+
+        cov_scrollbar = ttk.Scrollbar(cov_frame, orient="vertical", command=cov_tree.yview)
+        cov_tree.configure(yscrollcommand=cov_scrollbar.set)
+        cov_tree.pack(side="left", fill="both", expand=True)
+        cov_scrollbar.pack(side="right", fill="y")
+
+        for symbol1 in symbols:
+            row_values = [symbol1] + [f"{analytics['covariance_matrix'][symbol1].get(symbol2, 0):.4f}" for symbol2 in symbols]
+            cov_tree.insert('', 'end', values=row_values)
 
     def predict_value(self):
         portfolio_id = self.get_selected_portfolio_id()
@@ -1122,71 +1361,75 @@ class MainAppFrame(ttk.Frame):
         days = simpledialog.askinteger("Predict Portfolio Value", "Enter number of days to predict:", initialvalue=30, minvalue=1)
         if days is None:  # User cancelled
             return
+        correlated = messagebox.askyesno("Predict Portfolio Value",
+                                         "Simulate each holding with correlated returns?\n"
+                                         "(No simulates the portfolio value as a single series)")
+
+        user_id = self.controller.current_user_id
+        self.tasks.submit(
+            'portfolio_prediction',
+            lambda task: self.controller.portfolio.predict_portfolio_value(user_id, portfolio_id, days,
+                                                                           correlated=correlated),
+            on_done=lambda result: self.show_predictions(portfolio_id, *result),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to predict portfolio value: {str(e)}"),
+            label="Predicting portfolio value"
+        )
 
-        try:
-            predictions, confidence = self.controller.portfolio.predict_portfolio_value(
-                self.controller.current_user_id,
-                portfolio_id,
-                days
-            )
-
-            if not predictions:
-                messagebox.showinfo("Info", "No predictions available for this portfolio.")
-                return
-
-            # 새 창 생성
-            pred_window = tk.Toplevel(self)
-            pred_window.title(f"Value Predictions for Portfolio {portfolio_id}")
-            pred_window.geometry("800x600") # 창 크기 증가
-
-            # 예측 데이터 및 그래프 표시 프레임
-            main_frame = ttk.Frame(pred_window, padding="10")
-            main_frame.pack(fill="both", expand=True)
+    def show_predictions(self, portfolio_id, predictions, confidence):
+        if not predictions:
+            messagebox.showinfo("Info", "No predictions available for this portfolio.")
+            return
 
-            # 신뢰도 표시
-            ttk.Label(main_frame, text=f"Prediction Confidence: {confidence:.2%}").pack(pady=5)
+        # 새 창 생성
+        pred_window = tk.Toplevel(self)
+        pred_window.title(f"Value Predictions for Portfolio {portfolio_id}")
+        pred_window.geometry("800x600") # 창 크기 증가
 
-            # --- 예측 데이터 Treeview ---
-            data_frame = ttk.Frame(main_frame)
-            data_frame.pack(fill="both", expand=True, pady=5)
+        # 예측 데이터 및 그래프 표시 프레임
+        main_frame = ttk.Frame(pred_window, padding="10")
+        main_frame.pack(fill="both", expand=True)
 
-            pred_cols = ("Date", "Predicted Value")
-            pred_tree = ttk.Treeview(data_frame, columns=pred_cols, show='headings', height=10) # 높이 조절
-            for col in pred_cols:
-                pred_tree.heading(col, text=col)
-                pred_tree.column(col, width=150, anchor='center')
+        # 신뢰도 표시
+        ttk.Label(main_frame, text=f"Prediction Confidence: {confidence:.2%}").pack(pady=5)
 
-            pred_scrollbar = ttk.Scrollbar(data_frame, orient="vertical", command=pred_tree.yview)
-            pred_tree.configure(yscrollcommand=pred_scrollbar.set)
-            pred_tree.pack(side="left", fill="both", expand=True)
-            pred_scrollbar.pack(side="right", fill="y")
+        # --- 예측 데이터 Treeview ---
+        data_frame = ttk.Frame(main_frame)
+        data_frame.pack(fill="both", expand=True, pady=5)
 
-            df = pd.DataFrame(predictions) # pandas DataFrame 사용
-            for _, row in df.iterrows():
-                 pred_tree.insert('', 'end', values=(row['date'], f"${row['value']:.2f}"))
+        pred_cols = ("Date", "Predicted Value", "5th Percentile", "95th Percentile")
+        pred_tree = ttk.Treeview(data_frame, columns=pred_cols, show='headings', height=10) # 높이 조절
+        for col in pred_cols:
+            pred_tree.heading(col, text=col)
+            pred_tree.column(col, width=150, anchor='center')
 
+        pred_scrollbar = ttk.Scrollbar(data_frame, orient="vertical", command=pred_tree.yview)
+        pred_tree.configure(yscrollcommand=pred_scrollbar.set)
+        pred_tree.pack(side="left", fill="both", expand=True)
+        pred_scrollbar.pack(side="right", fill="y")
 
-            # --- 예측 그래프 ---
-            graph_frame = ttk.Frame(main_frame)
-            graph_frame.pack(fill="both", expand=True, pady=5)
+        df = pd.DataFrame(predictions) # pandas DataFrame 사용
+        for _, row in df.iterrows():
+             pred_tree.insert('', 'end', values=(row['date'], f"${row['value']:.2f}", f"${row['p5']:.2f}", f"${row['p95']:.2f}"))
 
-            fig = plt.Figure(figsize=(8, 4)) # 그래프 크기 조절
-            ax = fig.add_subplot(111)
-            ax.plot(df['date'], df['value'], marker='o')
-            ax.set_title(f'Portfolio {portfolio_id} Value Predictions')
-            ax.set_xlabel('Date')
-            ax.set_ylabel('Value ($)')
-            ax.grid(True)
-            fig.autofmt_xdate() # x축 레이블 자동 회전
 
-            canvas = FigureCanvasTkAgg(fig, graph_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill="both", expand=True)
+        # --- 예측 그래프 ---
+        graph_frame = ttk.Frame(main_frame)
+        graph_frame.pack(fill="both", expand=True, pady=5)
 
-        except Exception as e:
-            import traceback
-            traceback.print_exc() # 상세 오류 출력
-            messagebox.showerror("Error", f"Failed to predict portfolio value: {str(e)}")
+        fig = plt.Figure(figsize=(8, 4)) # 그래프 크기 조절
+        ax = fig.add_subplot(111)
+        ax.plot(df['date'], df['value'], marker='o', label='Expected value')
+        ax.fill_between(df['date'], df['p5'], df['p95'], alpha=0.2, label='5-95th percentile')
+        ax.legend()
+        ax.set_title(f'Portfolio {portfolio_id} Value Predictions')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Value ($)')
+        ax.grid(True)
+        fig.autofmt_xdate() # x축 레이블 자동 회전
+
+        canvas = FigureCanvasTkAgg(fig, graph_frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill="both", expand=True)
 
     def delete_portfolio_gui(self):
         portfolio_id = self.get_selected_portfolio_id()
@@ -1236,122 +1479,133 @@ class MainAppFrame(ttk.Frame):
 
             if not portfolio_id:
                 print("No portfolio selected, clearing view.")
+                # Drop any load still running for the previous selection
+                self.tasks.cancel('portfolio')
+                self.tasks.cancel('portfolio_graph')
                 return # Exit if no portfolio is selected
 
             print(f"Refreshing portfolio data for portfolio_id: {portfolio_id}")
 
-            # --- Fetch Basic Data and Populate Holdings --- 
+            # --- Fetch Basic Data in the background --- 
             selected = self.portfolio_var.get()
             portfolio_name = selected.split(" (ID:")[0] if selected else "-"
+            user_id = self.controller.current_user_id
 
-            portfolio_data = self.controller.portfolio.view_portfolio(
-                self.controller.current_user_id, portfolio_id)
-            
-            print(f"Portfolio data received: {portfolio_data}")
-            
-            if not portfolio_data:
-                print("No portfolio data found for selected ID.")
-                messagebox.showinfo("Info", "No data found for this portfolio.")
-                return
-
-            # Get cash balance from the fetched data
-            cash_balance = 0.0
-            if portfolio_data and portfolio_data[0][1] is not None:
-                 try:
-                     cash_balance = float(portfolio_data[0][1])
-                 except (ValueError, TypeError):
-                     print(f"Warning: Could not convert cash balance {portfolio_data[0][1]} to float.")
-                     cash_balance = 0.0
-
-            # Populate holdings tree and calculate total shares
-            total_shares = 0.0
-            for holding in portfolio_data:
-                symbol = holding[2]
-                if not symbol: continue # Skip cash row
-
+            def load(task):
+                portfolio_data = self.controller.portfolio.view_portfolio(user_id, portfolio_id)
+                if not portfolio_data or task.cancelled:
+                    return portfolio_data, None
                 try:
-                    shares = float(holding[3]) if holding[3] is not None else 0.0
-                    if shares > 0:
-                        self.holdings_tree.insert('', 'end', values=(symbol, f"{shares:.2f}"))
-                        total_shares += shares
-                except (ValueError, TypeError) as e:
-                    print(f"Error processing holding data {holding}: {e}")
-                    continue 
-
-            # --- Update UI Labels (Basic Info) ---
-            self.portfolio_name_label.config(text=f"Portfolio Name: {portfolio_name}")
-            self.cash_balance_label.config(text=f"Cash Balance: ${cash_balance:.2f}")
-            self.total_shares_label.config(text=f"Total Shares: {total_shares:.2f}")
-
-            # --- Get Total Value from Backend --- 
-            computed_total_value = None
-            try:
-                computed_total_value = self.controller.portfolio.compute_portfolio_value(
-                    self.controller.current_user_id, 
-                    portfolio_id
-                )
-                print(f"Backend computed total value: {computed_total_value}")
-            except Exception as e:
-                print(f"Error calling compute_portfolio_value: {e}")
-                messagebox.showerror("Error", "Failed to compute portfolio value.")
-
-            # Update total value label
-            if computed_total_value is not None:
-                self.total_value_label.config(text=f"Total Value: ${computed_total_value:.2f}")
-            else:
-                self.total_value_label.config(text="Total Value: Error")
-
-            # --- Update Graph --- 
-            self.update_performance_graph() 
+                    computed_total_value = self.controller.portfolio.compute_portfolio_value(user_id, portfolio_id)
+                    print(f"Backend computed total value: {computed_total_value}")
+                except Exception as e:
+                    print(f"Error calling compute_portfolio_value: {e}")
+                    computed_total_value = e
+                return portfolio_data, computed_total_value
+
+            self.tasks.submit(
+                'portfolio', load,
+                on_done=lambda result: self.show_portfolio(portfolio_name, *result),
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to refresh portfolio data: {str(e)}"),
+                label="Loading portfolio"
+            )
+            self.update_performance_graph()
 
         except Exception as e:
             print(f"Error in refresh_portfolio: {str(e)}")
-            import traceback
             traceback.print_exc()
             messagebox.showerror("Error", f"Failed to refresh portfolio data: {str(e)}")
 
+    def show_portfolio(self, portfolio_name, portfolio_data, computed_total_value):
+        print(f"Portfolio data received: {portfolio_data}")
+        
+        if not portfolio_data:
+            print("No portfolio data found for selected ID.")
+            messagebox.showinfo("Info", "No data found for this portfolio.")
+            return
+
+        # Get cash balance from the fetched data
+        cash_balance = 0.0
+        if portfolio_data and portfolio_data[0][1] is not None:
+             try:
+                 cash_balance = float(portfolio_data[0][1])
+             except (ValueError, TypeError):
+                 print(f"Warning: Could not convert cash balance {portfolio_data[0][1]} to float.")
+                 cash_balance = 0.0
+
+        # Populate holdings tree and calculate total shares
+        total_shares = 0.0
+        for holding in portfolio_data:
+            symbol = holding[2]
+            if not symbol: continue # Skip cash row
+
+            try:
+                shares = float(holding[3]) if holding[3] is not None else 0.0
+                if shares > 0:
+                    self.holdings_tree.insert('', 'end', values=(symbol, f"{shares:.2f}"))
+                    total_shares += shares
+            except (ValueError, TypeError) as e:
+                print(f"Error processing holding data {holding}: {e}")
+                continue 
+
+        # --- Update UI Labels (Basic Info) ---
+        self.portfolio_name_label.config(text=f"Portfolio Name: {portfolio_name}")
+        self.cash_balance_label.config(text=f"Cash Balance: ${cash_balance:.2f}")
+        self.total_shares_label.config(text=f"Total Shares: {total_shares:.2f}")
+
+        # Update total value label
+        if isinstance(computed_total_value, Exception):
+            messagebox.showerror("Error", "Failed to compute portfolio value.")
+            computed_total_value = None
+        if computed_total_value is not None:
+            self.total_value_label.config(text=f"Total Value: ${computed_total_value:.2f}")
+        else:
+            self.total_value_label.config(text="Total Value: Error")
+
     def update_performance_graph(self):
-        try:
-            portfolio_id = self.get_selected_portfolio_id()
-            if not portfolio_id:
-                return
+        portfolio_id = self.get_selected_portfolio_id()
+        if not portfolio_id:
+            return
+        period = self.portfolio_period_var.get()  # Use portfolio-specific period var
+        user_id = self.controller.current_user_id
 
-            # Get historical portfolio value data using view_portfolio_history
-            historical_data = self.controller.portfolio.view_portfolio_history(
-                self.controller.current_user_id,
-                portfolio_id,
-                period=self.portfolio_period_var.get()  # Use portfolio-specific period var
-            )
-            
-            if not historical_data:
-                return
-            
-            # Clear previous plot
-            self.ax.clear()
-            
-            # Convert data for plotting
-            dates = [entry[0] for entry in historical_data]  # timestamp
-            values = [float(entry[1]) for entry in historical_data]  # total_value
-            
-            # Plot the data
-            self.ax.plot(dates, values, '-b')
-            self.ax.set_title(f'Portfolio Value Over Time - {self.portfolio_period_var.get()}')
-            self.ax.set_xlabel('Date')
-            self.ax.set_ylabel('Value ($)')
-            self.ax.grid(True)
-            
-            # Rotate x-axis labels for better readability
-            plt.setp(self.ax.get_xticklabels(), rotation=45, ha='right')
-            
-            # Redraw the canvas
-            self.canvas.draw()
-            
-        except Exception as e:
+        def on_error(e):
             print(f"Error in update_performance_graph: {str(e)}")
-            import traceback
-            traceback.print_exc()
             messagebox.showerror("Error", f"Failed to update performance graph: {str(e)}")
 
+        # Get historical portfolio value data using view_portfolio_history
+        self.tasks.submit(
+            'portfolio_graph',
+            lambda task: self.controller.portfolio.view_portfolio_history(user_id, portfolio_id, period=period),
+            on_done=lambda historical_data: self.draw_performance_graph(historical_data, period),
+            on_error=on_error,
+            label="Loading portfolio history"
+        )
+
+    def draw_performance_graph(self, historical_data, period):
+        if not historical_data:
+            return
+        
+        # Clear previous plot
+        self.ax.clear()
+        
+        # Convert data for plotting
+        dates = [entry[0] for entry in historical_data]  # timestamp
+        values = [float(entry[1]) for entry in historical_data]  # total_value
+        
+        # Plot the data
+        self.ax.plot(dates, values, '-b')
+        self.ax.set_title(f'Portfolio Value Over Time - {period}')
+        self.ax.set_xlabel('Date')
+        self.ax.set_ylabel('Value ($)')
+        self.ax.grid(True)
+        
+        # Rotate x-axis labels for better readability
+        plt.setp(self.ax.get_xticklabels(), rotation=45, ha='right')
+        
+        # Redraw the canvas
+        self.canvas.draw()
+
     def delete_account(self):
         if messagebox.askyesno("Delete Account", "Are you sure you want to delete your account?"):
             password = simpledialog.askstring("Password Confirmation", "Enter your password to confirm deletion:", show='*')
@@ -1693,6 +1947,8 @@ class MainAppFrame(ttk.Frame):
         try:
             stocklist_id = self.get_selected_stocklist_id()
             if not stocklist_id:
+                # Drop any load still running for the previous selection
+                self.tasks.cancel('stocklist')
                 # Clear the treeviews if no stock list is selected
                 for tree in [self.stocklist_tree, self.reviews_tree]:
                     for item in tree.get_children():
@@ -1703,63 +1959,75 @@ class MainAppFrame(ttk.Frame):
                 self.stocklist_value_label.config(text="Total Value: $0.00")
                 return
 
-            # Get stock list data
-            stocklist_data = self.controller.stock_list.view_stock_list(
-                self.controller.current_user_id, stocklist_id)
-            
-            if not stocklist_data:
-                messagebox.showinfo("Info", "No stock list data found.")
-                return
-
-            # Clear existing items
-            for tree in [self.stocklist_tree, self.reviews_tree]:
-                for item in tree.get_children():
-                    tree.delete(item)
-
             # Get stock list name and creator from the combo box
             selected = self.stocklist_var.get()
             stocklist_name = selected.split(" (ID:")[0] if selected else "-"
             creator = selected.split("Creator: ")[1] if selected else "-"
-
-            # Update details labels
-            self.stocklist_name_label.config(text=f"List Name: {stocklist_name}")
-            self.stocklist_creator_label.config(text=f"Creator: {creator}")
-            
-            # Process stock list data
-            for item in stocklist_data:
-                if item[3]:  # Only process items with a symbol
-                    self.stocklist_tree.insert('', 'end', values=(
-                        item[3],  # symbol
-                        f"{float(item[4]):.2f}"  # shares
-                    ))
-
-            # Get total value
-            total_value = self.controller.stock_list.compute_stock_list_value(
-                self.controller.current_user_id,
-                stocklist_id
+            user_id = self.controller.current_user_id
+
+            def load(task):
+                # Get stock list data
+                stocklist_data = self.controller.stock_list.view_stock_list(user_id, stocklist_id)
+                if not stocklist_data or task.cancelled:
+                    return stocklist_data, None, None, None
+                # Get total value, public status and reviews
+                total_value = self.controller.stock_list.compute_stock_list_value(user_id, stocklist_id)
+                stocklists = self.controller.stock_list.view_accessible_stock_lists(user_id)
+                reviews_list = self.controller.reviews.view_reviews(stocklist_id, user_id)
+                return stocklist_data, total_value, stocklists, reviews_list
+
+            def on_error(e):
+                print(f"Failed to refresh stock list: {str(e)}")
+                messagebox.showerror("Error", f"Failed to refresh stock list data: {str(e)}")
+
+            self.tasks.submit(
+                'stocklist', load,
+                on_done=lambda result: self.show_stocklist(stocklist_id, stocklist_name, creator, *result),
+                on_error=on_error,
+                label="Loading stock list"
             )
 
-            if total_value is not None:
-                self.stocklist_value_label.config(text=f"Total Value: ${total_value:.2f}")
-            else:
-                self.stocklist_value_label.config(text="Total Value: $0.00")
-            # Get public status
-            stocklists = self.controller.stock_list.view_accessible_stock_lists(self.controller.current_user_id)
-            for sl in stocklists:
-                if sl[0] == stocklist_id:
-                    self.stocklist_public_label.config(text=f"Public: {'Yes' if sl[4] else 'No'}")
-                    break
-
-            # Load reviews
-            reviews_list = self.controller.reviews.view_reviews(stocklist_id, self.controller.current_user_id)
-            if reviews_list:
-                for review in reviews_list:
-                    self.reviews_tree.insert('', 'end', values=review)
-
         except Exception as e:
             print(f"Failed to refresh stock list: {str(e)}")
             messagebox.showerror("Error", f"Failed to refresh stock list data: {str(e)}")
 
+    def show_stocklist(self, stocklist_id, stocklist_name, creator, stocklist_data, total_value, stocklists, reviews_list):
+        if not stocklist_data:
+            messagebox.showinfo("Info", "No stock list data found.")
+            return
+
+        # Clear existing items
+        for tree in [self.stocklist_tree, self.reviews_tree]:
+            for item in tree.get_children():
+                tree.delete(item)
+
+        # Update details labels
+        self.stocklist_name_label.config(text=f"List Name: {stocklist_name}")
+        self.stocklist_creator_label.config(text=f"Creator: {creator}")
+        
+        # Process stock list data
+        for item in stocklist_data:
+            if item[3]:  # Only process items with a symbol
+                self.stocklist_tree.insert('', 'end', values=(
+                    item[3],  # symbol
+                    f"{float(item[4]):.2f}"  # shares
+                ))
+
+        if total_value is not None:
+            self.stocklist_value_label.config(text=f"Total Value: ${total_value:.2f}")
+        else:
+            self.stocklist_value_label.config(text="Total Value: $0.00")
+        # Get public status
+        for sl in stocklists or []:
+            if sl[0] == stocklist_id:
+                self.stocklist_public_label.config(text=f"Public: {'Yes' if sl[4] else 'No'}")
+                break
+
+        # Load reviews
+        if reviews_list:
+            for review in reviews_list:
+                self.reviews_tree.insert('', 'end', values=review)
+
     def view_stocklist_history(self):
         stocklist_id = self.get_selected_stocklist_id()
         if not stocklist_id:
@@ -1873,7 +2141,7 @@ class MainAppFrame(ttk.Frame):
             # --- Prediction Data Treeview ---
             data_frame = ttk.Frame(main_frame)
             data_frame.pack(fill="both", expand=True, pady=5)
-            pred_cols = ("Date", "Predicted Value")
+            pred_cols = ("Date", "Predicted Value", "5th Percentile", "95th Percentile")
             pred_tree = ttk.Treeview(data_frame, columns=pred_cols, show='headings', height=10)
             for col in pred_cols:
                 pred_tree.heading(col, text=col)
@@ -1885,14 +2153,16 @@ class MainAppFrame(ttk.Frame):
 
             df = pd.DataFrame(predictions)
             for _, row in df.iterrows():
-                 pred_tree.insert('', 'end', values=(row['date'], f"${row['value']:.2f}"))
+                 pred_tree.insert('', 'end', values=(row['date'], f"${row['value']:.2f}", f"${row['p5']:.2f}", f"${row['p95']:.2f}"))
 
             # --- Prediction Graph ---
             graph_frame = ttk.Frame(main_frame)
             graph_frame.pack(fill="both", expand=True, pady=5)
             fig = plt.Figure(figsize=(8, 4))
             ax = fig.add_subplot(111)
-            ax.plot(df['date'], df['value'], marker='o')
+            ax.plot(df['date'], df['value'], marker='o', label='Expected value')
+            ax.fill_between(df['date'], df['p5'], df['p95'], alpha=0.2, label='5-95th percentile')
+            ax.legend()
             ax.set_title(f'Stock List {stocklist_id} Value Predictions')
             ax.set_xlabel('Date')
             ax.set_ylabel('Value ($)')
@@ -2083,14 +2353,10 @@ if __name__ == "__main__":
     setup_db(True)
     
     try:
-        conn = psycopg2.connect(
-            host='34.130.75.185',
-            database='template1',
-            user='postgres',
-            password='2357'
-        )
-        print("✅ Database connection successful.")
-        conn.close()
+        with get_pool().connection():
+            pass
+        timings = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in get_startup_timings().items())
+        print(f"✅ Database connection successful ({timings}).")
     except psycopg2.OperationalError as e:
         print(f"❌ Database connection failed: {e}")
         print("Please ensure the database server is running and accessible.")
@@ -0,0 +1,118 @@
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+DEFAULT_PATHS = 10000            # simulated paths per forecast
+HOLDINGS_PATHS = 2000            # paths per correlated holdings forecast, each costs a matrix product per day
+HOLDINGS_FACTORS = 25            # holdings beyond this are simulated in a factor space of this size
+PERCENTILES = (5, 50, 95)        # bands reported for every forecast day
+
+
+def simulate_paths(start_value: float, mean_return: float, std_return: float, days: int,
+                   paths: int = DEFAULT_PATHS, seed: Optional[int] = None) -> np.ndarray:
+    """
+    Simulate value paths with daily returns drawn i.i.d. from N(mean_return, std_return)
+    and compounded from start_value. Returns a (days x paths) array: each row is
+    one day across all paths, contiguous, so per-day statistics read one row.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.standard_normal((days, paths))
+    # In place: returns -> growth factors -> cumulative growth -> values
+    values *= std_return
+    values += 1.0 + mean_return
+    np.cumprod(values, axis=0, out=values)
+    values *= start_value
+    return values
+
+
+def summarize_paths(values: np.ndarray, percentiles: Sequence[float] = PERCENTILES) -> Dict:
+    """
+    Expected value and percentile bands per day of simulate_paths output.
+    Percentiles use linear interpolation, as np.percentile does, read from one
+    sort of each day's row.
+    """
+    ordered = np.sort(values, axis=1)
+    position = np.asarray(percentiles, dtype=np.float64) / 100.0 * (ordered.shape[1] - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, ordered.shape[1] - 1)
+    fraction = position - lower
+    bands = ordered[:, lower] + (ordered[:, upper] - ordered[:, lower]) * fraction
+    return {
+        'expected': values.mean(axis=1),
+        'percentiles': {p: bands[:, i] for i, p in enumerate(percentiles)},
+    }
+
+
+def covariance_factor(covariance: np.ndarray) -> np.ndarray:
+    """
+    Matrix F with F @ F.T == covariance: the Cholesky factor, or, when the
+    estimate is singular or not positive definite (pairwise-complete
+    covariances need not be), the square root of its nearest PSD matrix.
+    """
+    covariance = np.asarray(covariance, dtype=np.float64)
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh((covariance + covariance.T) / 2)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+
+def holdings_factors(covariance: np.ndarray, max_factors: int = HOLDINGS_FACTORS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (loadings, residual_std) with covariance ~= loadings @ loadings.T + diag(residual_std ** 2).
+    Up to max_factors holdings the loadings are the exact covariance_factor and
+    the residuals zero. Beyond that the loadings are the top max_factors
+    principal components, and the residuals carry the rest of each holding's
+    variance, so variances stay exact and only correlations are approximated.
+    """
+    covariance = np.asarray(covariance, dtype=np.float64)
+    if len(covariance) <= max_factors:
+        return covariance_factor(covariance), np.zeros(len(covariance))
+    symmetric = (covariance + covariance.T) / 2
+    eigenvalues, eigenvectors = np.linalg.eigh(symmetric)  # ascending
+    loadings = eigenvectors[:, -max_factors:] * np.sqrt(np.clip(eigenvalues[-max_factors:], 0.0, None))
+    residual = np.diag(symmetric) - np.einsum('ij,ij->i', loadings, loadings)
+    return loadings, np.sqrt(np.clip(residual, 0.0, None))
+
+
+def simulate_holdings_paths(last_prices: Sequence[float], shares: Sequence[float],
+                            mean_returns: Sequence[float], covariance: np.ndarray, days: int,
+                            paths: int = HOLDINGS_PATHS, seed: Optional[int] = None,
+                            cash: float = 0.0, factors: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+    """
+    Simulate the value of a set of holdings with correlated daily returns: each
+    day draws a (paths x factors) block of standard normals, maps it onto the
+    holdings through the holdings_factors loadings in one matrix product and
+    compounds every position. With at most HOLDINGS_FACTORS holdings this is the
+    exact Cholesky simulation. Larger portfolios cost paths x holdings x
+    HOLDINGS_FACTORS per day instead of paths x holdings^2; their independent
+    residuals sum to one normal shock per path, with variance
+    sum(position_i^2 * residual_std_i^2) in value terms (a return of that
+    standard deviation over the total value, applied to every position), so
+    each day's change in portfolio value keeps its exact distribution. Returns a
+    (days x paths) array of total value (positions plus cash), laid out like
+    simulate_paths so summarize_paths applies unchanged. Precomputed
+    holdings_factors can be passed instead of the covariance.
+    """
+    loadings, residual = holdings_factors(covariance) if factors is None else factors
+    loadings = loadings.T
+    mean_returns = np.asarray(mean_returns, dtype=np.float64)
+    positions = np.nan_to_num(np.asarray(last_prices, dtype=np.float64) * np.asarray(shares, dtype=np.float64))
+    positions = np.tile(positions, (paths, 1))
+    rng = np.random.default_rng(seed)
+    shocks = np.empty((paths, loadings.shape[0]))
+    values = np.empty((days, paths))
+    variances = np.square(residual)
+    total = positions.sum(axis=1)
+    for day in range(days):
+        rng.standard_normal(out=shocks)
+        growth = shocks @ loadings
+        growth += 1.0 + mean_returns
+        if variances.any():
+            spread = np.sqrt(np.square(positions) @ variances)
+            np.divide(spread, total, out=spread, where=total != 0)
+            growth += (rng.standard_normal(paths) * spread)[:, None]
+        positions *= growth
+        positions.sum(axis=1, out=values[day])
+        total = values[day]
+    values += cash
+    return values
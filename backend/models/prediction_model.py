@@ -1,8 +1,12 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional
 import pandas as pd
 from scipy import stats
+from models.monte_carlo import (simulate_paths, simulate_holdings_paths, summarize_paths, holdings_factors,
+                                DEFAULT_PATHS, HOLDINGS_PATHS)
 
 class BasePredictionModel:
     """Base class for all prediction models"""
@@ -16,16 +20,68 @@ class BasePredictionModel:
         if len(prices) < self.window_size:
             return prices
         
-        moving_avg = []
-        for i in range(len(prices) - self.window_size + 1):
-            window = prices[i:i+self.window_size]
-            # Use weighted average with more weight on recent prices
-            weights = np.linspace(1, 2, self.window_size)
-            window_avg = np.average(window, weights=weights)
-            moving_avg.append(window_avg)
+        # Use weighted average with more weight on recent prices, over every
+        # window at once: a strided (windows x window_size) view times the weights.
+        # Summing each row like np.average does keeps the output bit-identical.
+        weights = np.linspace(1, 2, self.window_size)
+        windows = sliding_window_view(np.asarray(prices, dtype=np.float64), self.window_size)
+        moving_avg = (windows * weights).sum(axis=1) / weights.sum()
         
-        return moving_avg
+        return list(moving_avg)
     
+    def _simulate_values(self, historical_data: List[Dict], days_to_predict: int,
+                         paths: int = DEFAULT_PATHS, seed: Optional[int] = None) -> Tuple[List[Dict], float]:
+        """
+        Monte Carlo forecast of a value series: `paths` paths of daily returns drawn
+        from the historical return distribution, compounded from the last value.
+        Each predicted day carries the expected value ('value') and the 5/50/95
+        percentile bands ('p5', 'p50', 'p95').
+        """
+        params = self.fit_values(historical_data)
+        if params is None:
+            return [], 0.0
+        return self.forecast_values(params, days_to_predict, paths, seed)
+
+    def fit_values(self, historical_data: List[Dict]) -> Optional[Dict]:
+        """
+        Fit the return distribution _simulate_values draws from, with the last value
+        and the confidence. None when there are fewer than two values.
+        """
+        if len(historical_data) < 2:
+            return None
+            
+        # Extract historical values and their daily returns
+        historical_values = np.array([data['value'] for data in historical_data], dtype=np.float64)
+        returns = np.diff(historical_values) / historical_values[:-1]
+        
+        return {
+            'last_date': historical_data[-1]['timestamp'],
+            'last_value': historical_values[-1],
+            'mean_return': np.mean(returns),
+            'std_return': np.std(returns),
+            'confidence': self._calculate_confidence(historical_values.tolist()),
+        }
+
+    def forecast_values(self, params: Dict, days_to_predict: int, paths: int = DEFAULT_PATHS,
+                        seed: Optional[int] = None) -> Tuple[List[Dict], float]:
+        """Simulate _simulate_values from parameters returned by fit_values"""
+        simulated = simulate_paths(params['last_value'], params['mean_return'], params['std_return'],
+                                   days_to_predict, paths, seed)
+        return self._summarize_simulation(simulated, params['last_date']), params['confidence']
+
+    def _summarize_simulation(self, simulated: np.ndarray, last_timestamp: str) -> List[Dict]:
+        """Per-day expected value and 5/50/95 percentile bands of (days x paths) simulated values"""
+        summary = summarize_paths(simulated)
+        bands = summary['percentiles']
+        last_date = datetime.strptime(last_timestamp, '%Y-%m-%d')
+        return [{
+            'date': (last_date + timedelta(days=i + 1)).strftime('%Y-%m-%d'),
+            'value': round(float(summary['expected'][i]), 2),
+            'p5': round(float(bands[5][i]), 2),
+            'p50': round(float(bands[50][i]), 2),
+            'p95': round(float(bands[95][i]), 2),
+        } for i in range(len(simulated))]
+
     def _calculate_confidence(self, prices: List[float]) -> float:
         """Calculate prediction confidence using multiple factors"""
         if len(prices) < self.min_data_points:
@@ -58,6 +114,38 @@ class BasePredictionModel:
         
         return round(max(0.1, min(0.9, confidence)), 2)
 
+    def _calculate_confidence_batch(self, recent: np.ndarray) -> np.ndarray:
+        """_calculate_confidence for many series at once; recent is (series x min_data_points)"""
+        price_std = recent.std(axis=1)
+        price_mean = recent.mean(axis=1)
+        positive = price_mean > 0
+        safe_mean = np.where(positive, price_mean, 1.0)
+        
+        # Factor 1: Coefficient of variation (lower is better)
+        cv = np.where(positive, price_std / safe_mean, 1.0)
+        
+        # Factor 2: Trend consistency, |r| of the regression on the day index
+        days = np.arange(recent.shape[1], dtype=np.float64)
+        days_centered = days - days.mean()
+        prices_centered = recent - price_mean[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r_value = (prices_centered @ days_centered) / np.sqrt(
+                (prices_centered ** 2).sum(axis=1) * (days_centered ** 2).sum())
+        trend_consistency = np.abs(r_value)
+        
+        # Factor 3: Recent volatility (mean of the 5-day rolling sample std)
+        rolling_std = sliding_window_view(recent, 5, axis=1).std(axis=2, ddof=1)
+        recent_volatility = np.where(positive, rolling_std.mean(axis=1) / safe_mean, 1.0)
+        
+        confidence = (
+            0.4 * (1 - np.minimum(cv, 1.0)) +
+            0.4 * trend_consistency +
+            0.2 * (1 - np.minimum(recent_volatility, 1.0))
+        )
+        # A flat series has no defined r; _calculate_confidence's min() then yields the 0.9 cap
+        confidence = np.where(np.isnan(confidence), 0.9, confidence)
+        return np.round(np.clip(confidence, 0.1, 0.9), 2)
+
 class StockPredictionModel(BasePredictionModel):
     """Model for predicting individual stock prices"""
     
@@ -73,8 +161,19 @@ class StockPredictionModel(BasePredictionModel):
             predicted_prices: List of predicted prices (date, price)
             confidence: Prediction confidence (0-1)
         """
-        if len(historical_data) < self.min_data_points:
+        params = self.fit_prices(historical_data)
+        if params is None:
             return [], 0.0
+        return self.forecast_prices(params, days_to_predict)
+
+    def fit_prices(self, historical_data: List[Dict]) -> Optional[Dict]:
+        """
+        Fit the parameters predict_future_prices simulates from: the recent
+        regression line, the volatility of recent returns, the last moving average
+        and the confidence. None when there are too few data points.
+        """
+        if len(historical_data) < self.min_data_points:
+            return None
         
         # Extract close prices
         close_prices = [data['close'] for data in historical_data]
@@ -91,24 +190,36 @@ class StockPredictionModel(BasePredictionModel):
         recent_returns = np.diff(recent_prices) / recent_prices[:-1]
         volatility = np.std(recent_returns)
         
-        # Predict future prices
+        return {
+            'last_date': historical_data[-1]['timestamp'],
+            'last_close': close_prices[-1],
+            'recent_days': len(recent_prices),
+            'slope': slope,
+            'intercept': intercept,
+            'volatility': volatility,
+            'moving_avg': moving_avg[-1],
+            'confidence': self._calculate_confidence(close_prices),
+        }
+
+    def forecast_prices(self, params: Dict, days_to_predict: int = 30) -> Tuple[List[Dict], float]:
+        """Simulate predict_future_prices from parameters returned by fit_prices"""
         predicted_prices = []
-        last_date = datetime.strptime(historical_data[-1]['timestamp'], '%Y-%m-%d')
+        last_date = datetime.strptime(params['last_date'], '%Y-%m-%d')
         
         for i in range(1, days_to_predict + 1):
             # Base prediction using linear regression
-            predicted_day = len(recent_prices) + i
-            regression_prediction = slope * predicted_day + intercept
+            predicted_day = params['recent_days'] + i
+            regression_prediction = params['slope'] * predicted_day + params['intercept']
             
             # Add volatility-based random factor
             # Scale volatility by sqrt of days ahead (volatility increases with time)
-            volatility_factor = volatility * np.sqrt(i)
-            random_factor = np.random.normal(0, volatility_factor * close_prices[-1])
+            volatility_factor = params['volatility'] * np.sqrt(i)
+            random_factor = np.random.normal(0, volatility_factor * params['last_close'])
             
             # Combine with moving average trend
             ma_weight = min(i / days_to_predict, 0.5)  # Increasing weight on moving average
             predicted_price = (1 - ma_weight) * regression_prediction + \
-                            ma_weight * moving_avg[-1] + \
+                            ma_weight * params['moving_avg'] + \
                             random_factor
             
             # Prevent negative prices
@@ -120,108 +231,162 @@ class StockPredictionModel(BasePredictionModel):
                 'price': round(predicted_price, 2)
             })
         
-        confidence = self._calculate_confidence(close_prices)
+        return predicted_prices, params['confidence']
+
+    def predict_price_matrix(self, recent: np.ndarray, days_to_predict: int = 30,
+                             rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The predict_future_prices model for many symbols at once.
         
-        return predicted_prices, confidence
-    
+        Args:
+            recent: (symbols x min_data_points) matrix of each symbol's latest closes
+            days_to_predict: Number of days to predict into the future
+            rng: NumPy random generator for the volatility noise
+            
+        Returns:
+            prices: (symbols x days_to_predict) predicted prices
+            confidence: Prediction confidence per symbol (0-1)
+        """
+        rng = rng or np.random.default_rng()
+        recent = np.asarray(recent, dtype=np.float64)
+        
+        # Regression line over the recent window, per row (closed-form least squares)
+        days = np.arange(recent.shape[1], dtype=np.float64)
+        days_centered = days - days.mean()
+        slope = (recent - recent.mean(axis=1)[:, None]) @ days_centered / (days_centered ** 2).sum()
+        intercept = recent.mean(axis=1) - slope * days.mean()
+        
+        # Weighted moving average of the last window and volatility of recent returns
+        weights = np.linspace(1, 2, self.window_size)
+        moving_avg = (recent[:, -self.window_size:] * weights).sum(axis=1) / weights.sum()
+        volatility = (np.diff(recent, axis=1) / recent[:, :-1]).std(axis=1)
+        
+        # Same combination as predict_future_prices, for every (symbol, day) at once
+        ahead = np.arange(1, days_to_predict + 1, dtype=np.float64)
+        regression_prediction = slope[:, None] * (recent.shape[1] + ahead) + intercept[:, None]
+        random_factor = rng.standard_normal((len(recent), days_to_predict)) * \
+            (volatility[:, None] * np.sqrt(ahead) * recent[:, -1:])
+        ma_weight = np.minimum(ahead / days_to_predict, 0.5)
+        prices = (1 - ma_weight) * regression_prediction + ma_weight * moving_avg[:, None] + random_factor
+        prices = np.round(np.maximum(prices, 0.01), 2)
+        
+        return prices, self._calculate_confidence_batch(recent)
+
+    def predict_many(self, histories: Dict[str, Tuple[object, np.ndarray]], days_to_predict: int = 30,
+                     processes: Optional[int] = None, seed: Optional[int] = None) -> pd.DataFrame:
+        """
+        Predicts future prices for many symbols in one pass.
+        
+        Args:
+            histories: {symbol: (last_date, closes)} with closes in date order
+            days_to_predict: Number of days to predict into the future
+            processes: Split the symbols across this many worker processes
+            seed: Seed for reproducible forecasts
+            
+        Returns:
+            Forecast table with one row per (symbol, date): symbol, date, price, confidence.
+            Symbols with fewer than min_data_points closes are left out.
+        """
+        symbols = [symbol for symbol, (_, closes) in histories.items() if len(closes) >= self.min_data_points]
+        columns = ['symbol', 'date', 'price', 'confidence']
+        if not symbols:
+            return pd.DataFrame(columns=columns)
+        recent = np.array([histories[symbol][1][-self.min_data_points:] for symbol in symbols], dtype=np.float64)
+        
+        seeds = np.random.SeedSequence(seed)
+        if processes and processes > 1 and len(symbols) > processes:
+            chunks = np.array_split(recent, processes)
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                parts = list(executor.map(_predict_chunk, [self] * len(chunks), chunks,
+                                          [days_to_predict] * len(chunks), seeds.spawn(len(chunks))))
+            prices = np.vstack([part[0] for part in parts])
+            confidence = np.concatenate([part[1] for part in parts])
+        else:
+            prices, confidence = self.predict_price_matrix(recent, days_to_predict, np.random.default_rng(seeds))
+        
+        ahead = [timedelta(days=i) for i in range(1, days_to_predict + 1)]
+        dates = [(histories[symbol][0] + delta).strftime('%Y-%m-%d') for symbol in symbols for delta in ahead]
+        return pd.DataFrame({
+            'symbol': np.repeat(symbols, days_to_predict),
+            'date': dates,
+            'price': prices.ravel(),
+            'confidence': np.repeat(confidence, days_to_predict),
+        }, columns=columns)
+
+
+def _predict_chunk(model, recent, days_to_predict, seed):
+    # Module-level so ProcessPoolExecutor can pickle it
+    return model.predict_price_matrix(recent, days_to_predict, np.random.default_rng(seed))
+
 class PortfolioPredictionModel(BasePredictionModel):
     """Model for predicting portfolio performance"""
     
     def predict_portfolio_value(self, 
                               portfolio_data: List[Dict], 
-                              days_to_predict: int = 30) -> Tuple[List[Dict], float]:
+                              days_to_predict: int = 30,
+                              paths: int = DEFAULT_PATHS,
+                              seed: Optional[int] = None) -> Tuple[List[Dict], float]:
         """
         Predicts future portfolio value based on current holdings and historical data.
         
         Args:
             portfolio_data: List of historical portfolio values by date
             days_to_predict: Number of days to predict into the future
+            paths: Number of simulated paths
+            seed: Seed for a reproducible simulation
             
         Returns:
-            predicted_values: List of predicted portfolio values (date, value)
+            predicted_values: List of predicted portfolio values (date, expected value, p5/p50/p95 bands)
             confidence: Prediction confidence (0-1)
         """
-        if not portfolio_data:
-            return [], 0.0
-            
-        # Extract historical values
-        historical_values = [data['value'] for data in portfolio_data]
-        
-        # Calculate portfolio returns
-        returns = np.diff(historical_values) / historical_values[:-1]
-        
-        # Calculate portfolio statistics
-        mean_return = np.mean(returns)
-        std_return = np.std(returns)
-        
-        # Predict future values
-        predicted_values = []
-        last_date = datetime.strptime(portfolio_data[-1]['timestamp'], '%Y-%m-%d')
-        current_value = historical_values[-1]
-        
-        for i in range(1, days_to_predict + 1):
-            # Generate random return based on historical distribution
-            random_return = np.random.normal(mean_return, std_return)
-            
-            # Calculate new value
-            predicted_value = current_value * (1 + random_return)
-            
-            future_date = (last_date + timedelta(days=i)).strftime('%Y-%m-%d')
-            predicted_values.append({
-                'date': future_date,
-                'value': round(predicted_value, 2)
-            })
-        
-        confidence = self._calculate_confidence(historical_values)
-        
-        return predicted_values, confidence
+        return self._simulate_values(portfolio_data, days_to_predict, paths, seed)
+
+    def fit_holdings(self, portfolio_data: List[Dict], last_prices: np.ndarray, shares: List[float],
+                     mean_returns: np.ndarray, covariance: np.ndarray, cash: float = 0.0) -> Optional[Dict]:
+        """
+        Parameters for simulating every holding with returns correlated through
+        the covariance matrix (already reduced to holdings_factors), instead of the value series
+        alone. None without history or holdings.
+        """
+        if not portfolio_data or not len(shares):
+            return None
+        return {
+            'last_date': portfolio_data[-1]['timestamp'],
+            'last_prices': np.asarray(last_prices, dtype=np.float64),
+            'shares': np.asarray(shares, dtype=np.float64),
+            'mean_returns': np.asarray(mean_returns, dtype=np.float64),
+            'factors': holdings_factors(covariance),
+            'cash': cash,
+            'confidence': self._calculate_confidence([data['value'] for data in portfolio_data]),
+        }
+
+    def forecast_holdings(self, params: Dict, days_to_predict: int, paths: int = HOLDINGS_PATHS,
+                          seed: Optional[int] = None) -> Tuple[List[Dict], float]:
+        """Simulate the portfolio value from parameters returned by fit_holdings"""
+        simulated = simulate_holdings_paths(params['last_prices'], params['shares'], params['mean_returns'],
+                                            None, days_to_predict, paths, seed, params['cash'],
+                                            factors=params['factors'])
+        return self._summarize_simulation(simulated, params['last_date']), params['confidence']
 
 class StockListPredictionModel(BasePredictionModel):
     """Model for predicting stock list performance"""
     
     def predict_stock_list_value(self,
                                stock_list_data: List[Dict],
-                               days_to_predict: int = 30) -> Tuple[List[Dict], float]:
+                               days_to_predict: int = 30,
+                               paths: int = DEFAULT_PATHS,
+                               seed: Optional[int] = None) -> Tuple[List[Dict], float]:
         """
         Predicts future stock list value based on current holdings and historical data.
         
         Args:
             stock_list_data: List of historical stock list values by date
             days_to_predict: Number of days to predict into the future
+            paths: Number of simulated paths
+            seed: Seed for a reproducible simulation
             
         Returns:
-            predicted_values: List of predicted stock list values (date, value)
+            predicted_values: List of predicted stock list values (date, expected value, p5/p50/p95 bands)
             confidence: Prediction confidence (0-1)
         """
-        if not stock_list_data:
-            return [], 0.0
-            
-        # Extract historical values
-        historical_values = [data['value'] for data in stock_list_data]
-        
-        # Calculate returns and statistics
-        returns = np.diff(historical_values) / historical_values[:-1]
-        mean_return = np.mean(returns)
-        std_return = np.std(returns)
-        
-        # Predict future values
-        predicted_values = []
-        last_date = datetime.strptime(stock_list_data[-1]['timestamp'], '%Y-%m-%d')
-        current_value = historical_values[-1]
-        
-        for i in range(1, days_to_predict + 1):
-            # Generate random return based on historical distribution
-            random_return = np.random.normal(mean_return, std_return)
-            
-            # Calculate new value
-            predicted_value = current_value * (1 + random_return)
-            
-            future_date = (last_date + timedelta(days=i)).strftime('%Y-%m-%d')
-            predicted_values.append({
-                'date': future_date,
-                'value': round(predicted_value, 2)
-            })
-        
-        confidence = self._calculate_confidence(historical_values)
-        
-        return predicted_values, confidence 
\ No newline at end of file
+        return self._simulate_values(stock_list_data, days_to_predict, paths, seed)
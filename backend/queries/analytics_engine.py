@@ -0,0 +1,246 @@
+import copy
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from queries.utils import decimal_to_float as d2f
+
+BENCHMARK_SYMBOL = 'SPY'
+
+
+def fetch_returns(cursor, symbols, start_date, end_date, seed_closes=None, include_start=True):
+    """
+    Fetch the close series of `symbols` in one query and return aligned daily
+    returns as (dates, symbols, returns, last_closes), returns being a
+    (dates x symbols) matrix. A symbol's return on a date is measured against
+    its previous close (same as LAG over its own rows); dates it did not trade
+    are NaN. `seed_closes` are the closes preceding the range, used when
+    extending an earlier window, and `last_closes` is the latest close of each
+    symbol up to end_date, to seed the next extension.
+    """
+    symbols = list(symbols)
+    query = '''
+        SELECT symbol, timestamp, close
+          FROM StockPrices
+         WHERE symbol IN %s AND timestamp {op} %s AND timestamp <= %s
+    '''.format(op='>=' if include_start else '>')
+    cursor.execute(query, (tuple(symbols), start_date, end_date))
+    rows = cursor.fetchall()
+    if seed_closes is None:
+        seed_closes = np.full(len(symbols), np.nan)
+    if not rows:
+        return [], symbols, np.empty((0, len(symbols))), seed_closes
+
+    frame = pd.DataFrame(rows, columns=['symbol', 'timestamp', 'close'])
+    frame['close'] = frame['close'].astype('float64')
+    closes = (frame.pivot(index='timestamp', columns='symbol', values='close')
+                   .sort_index()
+                   .reindex(columns=symbols))
+    traded = closes.notna().to_numpy()
+    # Prepend the seed row so the first return of each symbol can use it, then drop it
+    values = np.vstack([seed_closes, closes.to_numpy(dtype=np.float64)])
+    filled = pd.DataFrame(values).ffill().to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = filled[1:] / filled[:-1] - 1.0
+    returns[~traded] = np.nan
+    return list(closes.index), symbols, returns, filled[-1]
+
+
+class ReturnMoments:
+    """
+    Pairwise-complete moments of a returns matrix: for every pair (i, j) the
+    count of dates on which both have a return, the sums and sums of squares of
+    each over those dates, and the sum of cross-products. Covariance,
+    correlation and beta all derive from these with O(N^2) work.
+    """
+
+    def __init__(self, symbols):
+        n = len(symbols)
+        self.symbols = list(symbols)
+        self.counts = np.zeros((n, n))
+        self.sums = np.zeros((n, n))      # sums[i, j]: sum of i's returns on dates where j also has one
+        self.squares = np.zeros((n, n))   # squares[i, j]: same for i's squared returns
+        self.cross = np.zeros((n, n))     # cross[i, j]: sum of i * j
+
+    def add(self, returns):
+        """Accumulate a block of return rows (dates x symbols, NaN where missing)"""
+        if returns.size == 0:
+            return self
+        mask = (~np.isnan(returns)).astype(np.float64)
+        values = np.nan_to_num(returns, nan=0.0)
+        self.counts += mask.T @ mask
+        self.sums += values.T @ mask
+        self.squares += (values * values).T @ mask
+        self.cross += values.T @ values
+        return self
+
+    def covariance(self):
+        """Population covariance over each pair's common dates"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = self.counts
+            return self.cross / n - (self.sums / n) * (self.sums.T / n)
+
+    def std(self, ddof=1):
+        """std[i, j]: standard deviation of i over the dates it shares with j"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = self.counts
+            variance = (self.squares - self.sums * self.sums / n) / (n - ddof)
+            return np.sqrt(np.clip(variance, 0.0, None))
+
+    def correlation(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = self.std(ddof=0)
+            return self.covariance() / (std * std.T)
+
+
+def risk_analytics(moments, holdings, benchmark=BENCHMARK_SYMBOL):
+    """
+    Build the analytics dict returned by compute_portfolio_analytics and
+    compute_stock_list_analytics from moments over the holdings plus the benchmark
+    """
+    symbols = moments.symbols
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    b = index[benchmark]
+    shares = dict(holdings)
+
+    covariance = moments.covariance()
+    correlation = moments.correlation()
+    std = moments.std(ddof=1)
+    counts = moments.counts
+
+    stock_analytics = []
+    correlation_matrix = {}
+    covariance_matrix = {}
+    held = sorted(symbol for symbol in shares if symbol in index)
+    for symbol in held:
+        i = index[symbol]
+        # Stats against the benchmark use only the dates both have a return on
+        if counts[i, b] < 2:
+            continue
+        mean_return = moments.sums[i, b] / counts[i, b]
+        std_return = std[i, b]
+        spy_variance = std[b, i] ** 2
+        cv = 0.0 if mean_return == 0 else std_return / mean_return
+        beta = 0.0 if spy_variance == 0 else covariance[i, b] / spy_variance
+        stock_analytics.append({
+            'symbol': symbol,
+            'shares': shares[symbol],
+            'coefficient_of_variation': float(cv),
+            'beta': float(beta)
+        })
+
+    for symbol in held:
+        i = index[symbol]
+        correlation_matrix[symbol] = {}
+        covariance_matrix[symbol] = {}
+        for other in held:
+            j = index[other]
+            if counts[i, j] == 0:
+                continue
+            corr = correlation[i, j]
+            cov = covariance[i, j]
+            correlation_matrix[symbol][other] = 1.0 if i == j else (0.0 if np.isnan(corr) else float(corr))
+            covariance_matrix[symbol][other] = 0.0 if np.isnan(cov) else float(cov)
+
+    return {
+        'stock_analytics': stock_analytics,
+        'correlation_matrix': correlation_matrix,
+        'covariance_matrix': covariance_matrix
+    }
+
+
+class AnalyticsCache:
+    """
+    Return moments cached per (symbol set, start date). A request for the same
+    window is served from memory; a later end date only fetches and folds in
+    the new trading days (O(N^2) per day), seeded with the previous closes.
+    Built analytics dicts are kept per holdings vector on top of the moments.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def moments(self, cursor, symbols, start_date, end_date):
+        key = (tuple(symbols), start_date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry['end_date'] == end_date:
+            return entry
+        if entry is not None and entry['end_date'] < end_date:
+            # Extend: only the days after the cached window are fetched
+            _, _, returns, last_closes = fetch_returns(cursor, symbols, entry['end_date'], end_date,
+                                                       seed_closes=entry['last_closes'], include_start=False)
+            moments = copy.deepcopy(entry['moments']).add(returns)
+        else:
+            _, _, returns, last_closes = fetch_returns(cursor, symbols, start_date, end_date)
+            moments = ReturnMoments(symbols).add(returns)
+
+        entry = {'moments': moments, 'end_date': end_date, 'last_closes': last_closes, 'results': {}}
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def analytics(self, cursor, holdings, start_date, end_date, benchmark=BENCHMARK_SYMBOL):
+        holdings = [(symbol, d2f(num_shares)) for symbol, num_shares in holdings]
+        symbols = sorted({symbol for symbol, _ in holdings} | {benchmark})
+        entry = self.moments(cursor, symbols, start_date, end_date)
+        result_key = tuple(sorted(holdings))
+        result = entry['results'].get(result_key)
+        if result is None:
+            result = risk_analytics(entry['moments'], holdings, benchmark)
+            entry['results'][result_key] = result
+        return result
+
+    def invalidate(self, symbols=None, since=None):
+        """
+        Drop cached windows that include any of `symbols` and end on or after
+        `since` (rows were rewritten inside them). Appending days after a
+        window's end needs no invalidation, the window is extended on next use.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                key_symbols, _ = key
+                if symbols is not None and not set(symbols) & set(key_symbols):
+                    continue
+                if since is not None and self._entries[key]['end_date'] < since:
+                    continue
+                del self._entries[key]
+
+
+analytics_cache = AnalyticsCache()
+
+
+def compute_holdings_analytics(cursor, holdings, start_date, end_date, benchmark=BENCHMARK_SYMBOL):
+    """Coefficient of variation, beta, correlation and covariance for holdings [(symbol, num_shares), ...]"""
+    analytics = analytics_cache.analytics(cursor, holdings, start_date, end_date, benchmark)
+    if not analytics['stock_analytics']:
+        return None
+    return analytics
+
+
+def holdings_return_distribution(cursor, symbols, start_date, end_date):
+    """
+    Mean daily returns, return covariance and latest closes of `symbols` over
+    the window, from analytics_cache moments. The benchmark is included in the
+    symbol set (it does not change the pairwise moments of the others), so the
+    key matches the analytics of the same holdings and an entry is shared
+    whenever the windows start on the same date. Returns (means, covariance,
+    last_closes) aligned with `symbols`; pairs without common dates get zero
+    covariance.
+    """
+    symbols = list(symbols)
+    entry = analytics_cache.moments(cursor, sorted(set(symbols) | {BENCHMARK_SYMBOL}), start_date, end_date)
+    moments = entry['moments']
+    index = [moments.symbols.index(symbol) for symbol in symbols]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.diag(moments.sums)[index] / np.diag(moments.counts)[index]
+    covariance = moments.covariance()[np.ix_(index, index)]
+    return (np.nan_to_num(means, nan=0.0), np.nan_to_num(covariance, nan=0.0),
+            np.asarray(entry['last_closes'], dtype=np.float64)[index])
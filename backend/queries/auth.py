@@ -1,25 +1,11 @@
 import psycopg2
+from queries.db import PooledQueries, with_connection
 from queries.utils import decimal_to_float as d2f
 import re
-class Auth:
-    conn = psycopg2.connect(
-        host='34.130.75.185',
-        database='template1',
-        user='postgres',
-        password='2357'
-    )
-
-    def ensure_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(
-                host='34.130.75.185',
-                database='template1',
-                user='postgres',
-                password='2357'
-            )
+class Auth(PooledQueries):
 
+    @with_connection
     def register(self, username, password, email):
-        self.ensure_connection()
         # Verify username, password and email are valid
         if not username or len(username) == 0:
             return False
@@ -40,8 +26,8 @@ class Auth:
         cursor.close()
         return True
 
+    @with_connection
     def login(self, email, password):
-        self.ensure_connection()
         cursor = self.conn.cursor()
         cursor.execute("SELECT user_id FROM Users WHERE email=%s AND password=%s", (email, password))
         user_id = cursor.fetchone()
@@ -51,8 +37,8 @@ class Auth:
     def logout(self):
         return True
 
+    @with_connection
     def delete_account(self, user_id):
-        self.ensure_connection()
         try:
             cursor = self.conn.cursor()
             # Delete the user (cascade will handle related data)
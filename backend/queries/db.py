@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+import functools
+import configparser
+import uuid
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+# Defaults used when neither the environment nor the config file set a value
+DEFAULT_SETTINGS = {
+    'host': '34.130.75.185',
+    'port': '5432',
+    'database': 'template1',
+    'user': 'postgres',
+    'password': '2357',
+    'connect_timeout': '10',
+}
+
+# Environment variables override the config file, which overrides the defaults
+ENV_SETTINGS = {
+    'host': 'DB_HOST',
+    'port': 'DB_PORT',
+    'database': 'DB_NAME',
+    'user': 'DB_USER',
+    'password': 'DB_PASSWORD',
+    'connect_timeout': 'DB_CONNECT_TIMEOUT',
+}
+
+# Config file location; the file is optional and uses a [database] section
+CONFIG_PATH = os.environ.get(
+    'DB_CONFIG', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db.ini')
+)
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+CHECKOUT_TIMEOUT = 10.0       # seconds to wait for a free connection
+HEALTH_CHECK_INTERVAL = 30.0  # idle seconds before a connection is pinged on checkout
+STREAM_CHUNK_SIZE = 5000      # rows fetched per round trip by stream_query
+
+_startup_timings = {}
+
+
+def _record_timing(name, started):
+    _startup_timings.setdefault(name, time.perf_counter() - started)
+
+
+def load_settings(config_path=None):
+    """
+    Resolve connection settings from the defaults, the optional config file
+    and DB_* environment variables, in increasing order of precedence
+    """
+    started = time.perf_counter()
+    settings = dict(DEFAULT_SETTINGS)
+    pool_settings = {
+        'minconn': POOL_MIN_SIZE,
+        'maxconn': POOL_MAX_SIZE,
+        'checkout_timeout': CHECKOUT_TIMEOUT,
+        'health_check_interval': HEALTH_CHECK_INTERVAL,
+    }
+
+    parser = configparser.ConfigParser()
+    if parser.read(config_path or CONFIG_PATH):
+        if parser.has_section('database'):
+            for key in settings:
+                if parser.has_option('database', key):
+                    settings[key] = parser.get('database', key)
+        if parser.has_section('pool'):
+            for key, value in pool_settings.items():
+                if parser.has_option('pool', key):
+                    pool_settings[key] = type(value)(parser.get('pool', key))
+
+    for key, env_name in ENV_SETTINGS.items():
+        if os.environ.get(env_name):
+            settings[key] = os.environ[env_name]
+    for key, env_name in (('minconn', 'DB_POOL_MIN'), ('maxconn', 'DB_POOL_MAX'),
+                          ('checkout_timeout', 'DB_CHECKOUT_TIMEOUT')):
+        if os.environ.get(env_name):
+            pool_settings[key] = type(pool_settings[key])(os.environ[env_name])
+
+    _record_timing('load_settings', started)
+    return settings, pool_settings
+
+
+def connect(**overrides):
+    """Open a standalone connection using the resolved settings (for setup and maintenance scripts)"""
+    settings, _ = load_settings()
+    settings.update(overrides)
+    return psycopg2.connect(**settings)
+
+
+class PoolTimeout(pg_pool.PoolError):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe connection pool with a bounded size, checkout timeout and health checks"""
+
+    def __init__(self, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE,
+                 checkout_timeout=CHECKOUT_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.conn_kwargs = conn_kwargs
+        self._pool = None
+        self._lock = threading.Lock()
+        # ThreadedConnectionPool raises immediately when exhausted, so callers
+        # queue on this semaphore instead to get a real checkout timeout
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+
+    def _get_pool(self):
+        # The underlying pool (and its minconn sockets) is only opened on first use
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    started = time.perf_counter()
+                    self._pool = pg_pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, **self.conn_kwargs
+                    )
+                    _record_timing('first_connection', started)
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        # Connections that were just opened, or used recently, are trusted as-is
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"No database connection available after {timeout}s")
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                # Drop the broken connection and open a fresh one in its place
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            self._last_used[id(conn)] = time.monotonic()
+            if close or conn.closed:
+                self._last_used.pop(id(conn), None)
+            self._get_pool().putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_pool():
+    """Return the shared pool, building it from the configured settings on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                settings, pool_settings = load_settings()
+                _pool = ConnectionPool(**pool_settings, **settings)
+    return _pool
+
+
+def get_startup_timings():
+    """Seconds spent resolving settings and opening the first connection, for cold-start profiling"""
+    return dict(_startup_timings)
+
+
+@contextmanager
+def lease():
+    """
+    Borrow a pooled connection for the current thread. Nested leases (a query
+    method calling another one, on the same or a different class) reuse the
+    connection that is already checked out, so they see the same transaction.
+    """
+    depth = getattr(_local, 'depth', 0)
+    if depth == 0:
+        _local.conn = get_pool().getconn()
+    _local.depth = depth + 1
+    try:
+        yield _local.conn
+    except Exception:
+        # Only the outermost call owns the transaction; inner callers let it propagate
+        if depth == 0 and not _local.conn.closed:
+            _local.conn.rollback()
+        raise
+    finally:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn = _local.conn
+            _local.conn = None
+            get_pool().putconn(conn)
+
+
+def with_connection(method):
+    """Decorator for query methods: holds a pooled connection for the duration of the call"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with lease():
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def stream_query(query, params=None, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Run a query on a server-side (named) cursor and yield its rows in lists of at
+    most chunk_size, so only one chunk is in memory at a time. The generator checks
+    out a connection of its own until it is exhausted or closed; it is never shared
+    through lease(), so query methods the consumer calls between chunks cannot end
+    the cursor's transaction, and a generator finalized on another thread does not
+    touch that thread's lease.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.itersize = chunk_size
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if not conn.closed:
+                cursor.close()
+    finally:
+        # Also reached on GeneratorExit: end the cursor's read transaction before returning the connection
+        if not conn.closed:
+            conn.rollback()
+        pool.putconn(conn)
+
+
+class PooledQueries:
+    """Base class for the query classes. `self.conn` is the connection leased to the running call."""
+
+    @property
+    def conn(self):
+        conn = getattr(_local, 'conn', None)
+        if conn is None:
+            raise RuntimeError("No pooled connection leased; decorate the method with @with_connection")
+        return conn
@@ -0,0 +1,45 @@
+import threading
+from collections import OrderedDict
+
+
+class ForecastCache:
+    """
+    Fitted forecast parameters (regression line, volatility, moving average,
+    return distribution, confidence) keyed by what was forecast and the latest
+    date of its price data. Repeat predictions skip the history read and the
+    fit and only run the simulation. Entries remember their symbols, so an
+    ingest that rewrites a symbol's prices drops the forecasts built on them.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (symbols, params)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, symbols, params):
+        with self._lock:
+            self._entries[key] = (frozenset(symbols), params)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, symbols=None):
+        """Drop the forecasts of any of `symbols` (everything when symbols is None)"""
+        with self._lock:
+            if symbols is None:
+                self._entries.clear()
+                return
+            symbols = set(symbols)
+            for key in [key for key, (entry_symbols, _) in self._entries.items() if entry_symbols & symbols]:
+                del self._entries[key]
+
+
+forecast_cache = ForecastCache()
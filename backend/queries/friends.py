@@ -1,26 +1,12 @@
 import psycopg2
+from queries.db import PooledQueries, with_connection
 from queries.utils import decimal_to_float as d2f
 
-class Friends:
-    conn = psycopg2.connect(
-        host='34.130.75.185',
-        database='template1',
-        user='postgres',
-        password='2357'
-    )
-
-    def ensure_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(
-                host='34.130.75.185',
-                database='template1',
-                user='postgres',
-                password='2357'
-            )
+class Friends(PooledQueries):
 
+    @with_connection
     def send_friend_request(self, sender_id, receiver_id):
 
-        self.ensure_connection()
         if sender_id == receiver_id:
             return -3
         cursor = self.conn.cursor()
@@ -81,9 +67,9 @@ class Friends:
             cursor.close()
             return new_id
 
+    @with_connection
     def view_friends(self, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT 
@@ -100,9 +86,9 @@ class Friends:
         cursor.close()
         return friends
 
+    @with_connection
     def view_incoming_requests(self, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT request_id, sender_id, u.username AS sender_name
@@ -115,9 +101,9 @@ class Friends:
         cursor.close()
         return incoming
 
+    @with_connection
     def view_outgoing_requests(self, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT request_id, receiver_id, u.username AS receiver_name
@@ -130,9 +116,9 @@ class Friends:
         cursor.close()
         return outgoing
 
+    @with_connection
     def accept_friend_request(self, request_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             UPDATE FriendRequest
@@ -149,9 +135,9 @@ class Friends:
         cursor.close()
         return result
 
+    @with_connection
     def reject_friend_request(self, request_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             UPDATE FriendRequest
@@ -168,9 +154,9 @@ class Friends:
         cursor.close()
         return result
 
+    @with_connection
     def delete_friend(self, user_id, friend_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         # First update the friendship status
         query = '''
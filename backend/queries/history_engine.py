@@ -0,0 +1,111 @@
+import threading
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from queries.utils import decimal_to_float as d2f, period_start_date
+from queries.price_store import price_store
+
+
+def fetch_close_matrix(cursor, symbols, start_date, end_date):
+    """
+    Align the close series of `symbols` as a (dates x symbols) matrix over the
+    dates any of them traded between start_date and end_date. Each cell is the
+    symbol's close on or before that date, so days a symbol did not trade carry
+    its previous close (including one from before start_date). Dates before a
+    symbol's first close stay NaN. Histories come from the in-memory price store.
+
+    Returns (dates, symbols, closes) where dates is a list of datetime.date.
+    """
+    symbols = list(symbols)
+    history = price_store.get_many(cursor, symbols)
+    windows = [history[symbol].between(start_date, end_date).dates for symbol in symbols]
+    dates = np.unique(np.concatenate(windows)) if windows else np.empty(0, dtype='datetime64[D]')
+    if not len(dates):
+        return [], symbols, np.empty((0, len(symbols)))
+
+    closes = np.empty((len(dates), len(symbols)))
+    for j, symbol in enumerate(symbols):
+        closes[:, j] = history[symbol].close_asof(dates)
+    return dates.astype(object).tolist(), symbols, closes
+
+
+def value_series(closes, shares, cash=0.0):
+    """Value curve of the holdings as one matrix-vector product; symbols without a price yet count as 0"""
+    if closes.size == 0:
+        return np.empty(0)
+    return np.nan_to_num(closes, nan=0.0) @ np.asarray(shares, dtype=np.float64) + cash
+
+
+def holdings_key(holdings):
+    """Stable hash of a holdings vector, independent of row order"""
+    normalized = sorted((symbol, d2f(num_shares)) for symbol, num_shares in holdings)
+    return hashlib.sha1(repr(normalized).encode()).hexdigest()
+
+
+class HoldingsValuation:
+    """
+    Value series of a holdings vector over a date range, shared by portfolios and
+    stock lists. Results are cached per (holdings hash, start, end) without the
+    cash term, so a cash deposit does not invalidate them; the cache is cleared
+    whenever new prices are ingested.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def latest_common_date(self, cursor, symbols):
+        """Most recent date on which every symbol (that has data) has a price"""
+        if not symbols:
+            return None
+        query = '''
+            SELECT MIN(timestamp)
+              FROM LatestPrices
+             WHERE symbol IN %s;
+        '''
+        cursor.execute(query, (tuple(symbols),))
+        return cursor.fetchone()[0]
+
+    def value_series(self, cursor, holdings, start_date, end_date, cash=0.0):
+        """[(date, value), ...] for holdings [(symbol, num_shares), ...] between the two dates"""
+        if not holdings:
+            return []
+        key = (holdings_key(holdings), start_date, end_date)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+
+        if cached is None:
+            symbols = [symbol for symbol, _ in holdings]
+            shares = [d2f(num_shares) for _, num_shares in holdings]
+            dates, _, closes = fetch_close_matrix(cursor, symbols, start_date, end_date)
+            cached = (dates, value_series(closes, shares))
+            with self._lock:
+                self._cache[key] = cached
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+
+        dates, values = cached
+        return list(zip(dates, (values + (d2f(cash) or 0.0)).tolist()))
+
+    def history(self, cursor, holdings, period='all', cash=0.0):
+        """
+        Value series for a named period ending on the holdings' latest common date.
+        Returns None for an unknown period or when there is no price data.
+        """
+        latest_date = self.latest_common_date(cursor, [symbol for symbol, _ in holdings])
+        if not latest_date:
+            return None
+        start_date = period_start_date(latest_date, period)
+        if start_date is None:
+            return None
+        return self.value_series(cursor, holdings, start_date, latest_date, cash)
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+
+holdings_valuation = HoldingsValuation()
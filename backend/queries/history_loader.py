@@ -0,0 +1,340 @@
+import io
+import os
+import hashlib
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+import numpy as np
+import pandas as pd
+import psycopg2
+from queries.db import lease
+from queries.setup import HISTORY_CSV_PATH, create_price_staging, compact_price_tables, stored_prices
+
+HISTORY_DIR = os.path.dirname(HISTORY_CSV_PATH)  # import_stock_history reads every CSV in it
+
+CHUNK_ROWS = 100_000   # CSV rows parsed, validated and COPYed per chunk
+LOAD_WORKERS = 4       # chunks COPYed at once, each on its own pooled connection
+INT_MAX = 2**31 - 1    # StocksHistory.volume is INT (BIGINT in compact storage)
+HASH_BLOCK = 64 * 1024  # bytes at the start of a file, and before its checkpoint, fingerprinted by prefix_hash
+
+# Column order of SP500History.csv, which is also the COPY column list
+HISTORY_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'symbol']
+
+
+def validate_history_chunk(chunk):
+    """
+    Convert a chunk of raw CSV strings to StocksHistory types. Rows without a
+    parsable date, a 1-5 character symbol and a finite non-negative close, or
+    with a volume outside INT, are rejected; other empty or unparsable prices
+    and volumes load as NULL. Returns (frame, rejected_count).
+    """
+    timestamps = pd.to_datetime(chunk['timestamp'], errors='coerce', format='%Y-%m-%d')
+    prices = np.column_stack([
+        pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=np.float64)
+        for name in ('open', 'high', 'low', 'close')
+    ])
+    prices[~np.isfinite(prices)] = np.nan
+    volume = np.round(pd.to_numeric(chunk['volume'], errors='coerce').to_numpy(dtype=np.float64))
+    symbols = chunk['symbol'].fillna('').str.strip()
+    lengths = symbols.str.len().to_numpy()
+
+    with np.errstate(invalid='ignore'):
+        valid = (timestamps.notna().to_numpy()
+                 & (lengths >= 1) & (lengths <= 5)
+                 & (prices[:, 3] >= 0)
+                 & ~(volume < 0) & ~(volume > INT_MAX))
+
+    frame = pd.DataFrame({
+        'timestamp': timestamps[valid].dt.strftime('%Y-%m-%d').to_numpy(),
+        'open': prices[valid, 0],
+        'high': prices[valid, 1],
+        'low': prices[valid, 2],
+        'close': prices[valid, 3],
+        'volume': pd.array(volume[valid], dtype='Float64').astype('Int64'),
+        'symbol': symbols[valid].to_numpy(),
+    }, columns=HISTORY_COLUMNS)
+    return frame, int((~valid).sum())
+
+
+def read_history_chunks(path, chunk_rows=CHUNK_ROWS, offset=0):
+    """
+    Stream the CSV from byte `offset` (0 skips the header) as validated chunks
+    (frame, rejected_count, rows_read, end_offset), end_offset being the byte
+    offset just past the chunk's last line
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        if offset == 0:
+            offset += len(f.readline())
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                return
+            offset += sum(len(line) for line in lines)
+            chunk = pd.read_csv(io.BytesIO(b''.join(lines)), header=None, names=HISTORY_COLUMNS, dtype=str,
+                                keep_default_na=False, na_values=[''], skip_blank_lines=True)
+            frame, rejected = validate_history_chunk(chunk)
+            yield frame, rejected, len(chunk), offset
+
+
+def copy_history_chunk(frame):
+    """
+    COPY one validated chunk into StocksHistory on the calling thread's pooled
+    connection: into a session temp table first, then one INSERT ... ON CONFLICT
+    DO NOTHING, so reloads and duplicate rows are skipped as the row-by-row
+    loader did. Prices become cents when StocksHistory uses compact storage.
+    Commits and returns the number of rows inserted.
+    """
+    if frame.empty:
+        return 0
+    with lease() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(create_price_staging.format(name='StocksHistoryStaging'))
+            buffer = io.StringIO()
+            frame.to_csv(buffer, index=False, header=False, na_rep='')
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY StocksHistoryStaging ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(HISTORY_COLUMNS)),
+                buffer
+            )
+            merge_query = '''
+                INSERT INTO StocksHistory (timestamp, open, high, low, close, volume, symbol)
+                SELECT DISTINCT ON (symbol, timestamp) timestamp, {prices}, volume, symbol
+                  FROM StocksHistoryStaging
+                 ORDER BY symbol, timestamp
+                ON CONFLICT (symbol, timestamp) DO NOTHING
+            '''
+            compact = 'StocksHistory' in compact_price_tables(cursor)
+            cursor.execute(merge_query.format(prices=stored_prices(compact)))
+            inserted = cursor.rowcount
+            conn.commit()
+            return inserted
+        finally:
+            cursor.close()
+
+
+def copy_history_chunks(chunks, workers, on_committed):
+    """
+    COPY (frame, meta) chunks with `workers` pooled connections at once, at most
+    2 * workers chunks in memory. on_committed(meta, rows_inserted) runs on the
+    calling thread as chunks commit, in completion order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def collect(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                on_committed(pending.pop(future), future.result())
+
+        try:
+            for frame, meta in chunks:
+                pending[executor.submit(copy_history_chunk, frame)] = meta
+                while len(pending) >= 2 * workers:
+                    collect(FIRST_COMPLETED)
+            if pending:
+                collect(ALL_COMPLETED)
+        except Exception:
+            for future in pending:
+                future.cancel()
+            raise
+
+
+def report_load(totals, load_seconds):
+    print(f"✅ Loaded {totals['inserted']} of {totals['read']} rows ({totals['rejected']} rejected) "
+          f"in {load_seconds:.1f}s: {totals['read'] / load_seconds if load_seconds else 0:,.0f} rows/s")
+
+
+def load_stock_history_parallel(conn, csv_path=HISTORY_CSV_PATH, chunk_rows=CHUNK_ROWS,
+                                workers=LOAD_WORKERS, progress=None):
+    """
+    Load the S&P history CSV into StocksHistory: the file is streamed in chunks,
+    validated with NumPy and COPYed by `workers` pooled connections at once.
+    `progress(rows_read, rows_inserted)` is called after every chunk. Each chunk
+    commits on its own on its pooled connection; `conn` is rolled back on
+    failure. Prints rows/sec and returns True on success.
+    """
+    print(f"Reading CSV from local path: {csv_path}")
+    if not os.path.exists(csv_path):
+        print(f"❌ CSV file not found at: {csv_path}")
+        return False
+
+    totals = {'read': 0, 'inserted': 0, 'rejected': 0}
+
+    def on_committed(meta, inserted):
+        totals['read'] += meta[0]
+        totals['rejected'] += meta[1]
+        totals['inserted'] += inserted
+        if progress:
+            progress(totals['read'], totals['inserted'])
+
+    chunks = ((frame, (rows, rejected)) for frame, rejected, rows, _ in read_history_chunks(csv_path, chunk_rows))
+    started = time.perf_counter()
+    try:
+        copy_history_chunks(chunks, workers, on_committed)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Failed to load stock history: {e}")
+        return False
+
+    report_load(totals, time.perf_counter() - started)
+    return True
+
+
+def history_csv_files(directory=HISTORY_DIR):
+    """The CSV files of the history data directory, in name order"""
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.lower().endswith('.csv')]
+
+
+def prefix_hash(path, offset):
+    """
+    Fingerprint of the first `offset` bytes of a file: SHA-256 of its first
+    HASH_BLOCK bytes and of the HASH_BLOCK bytes ending at `offset`. Cheap to
+    recompute on every run, and changes when the file was replaced rather than
+    appended to.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        digest.update(handle.read(min(offset, HASH_BLOCK)))
+        tail_start = max(offset - HASH_BLOCK, 0)
+        handle.seek(tail_start)
+        digest.update(handle.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def import_plan(cursor, paths):
+    """
+    [(path, start_offset, checkpoint_totals)] for the files with bytes not yet
+    imported. A file is resumed from its checkpoint when it is the size it was
+    checkpointed at (an interrupted import), and only its tail is imported when it
+    grew (an append), in both cases provided the bytes before the checkpoint still
+    match prefix_hash. A file that shrank or whose imported bytes changed was
+    replaced and is imported from the start, as is one checkpointed without a hash.
+    """
+    cursor.execute('''
+        SELECT file_name, file_size, byte_offset, prefix_hash, rows_read, rows_inserted, rows_rejected
+          FROM ImportCheckpoints
+    ''')
+    checkpoints = {row[0]: row[1:] for row in cursor.fetchall()}
+    plan = []
+    for path in paths:
+        size = os.path.getsize(path)
+        checkpoint = checkpoints.get(os.path.basename(path))
+        offset, counts = 0, [0, 0, 0]
+        if checkpoint is not None:
+            file_size, checkpoint_offset, checkpoint_hash, *checkpoint_counts = checkpoint
+            if (size >= file_size and checkpoint_offset <= size and checkpoint_hash is not None
+                    and prefix_hash(path, checkpoint_offset) == checkpoint_hash):
+                offset, counts = checkpoint_offset, checkpoint_counts
+            else:
+                print(f"{os.path.basename(path)} changed since its checkpoint, importing it from the start")
+        if offset < size:
+            plan.append((path, offset, dict(zip(('read', 'inserted', 'rejected'), counts))))
+    return plan
+
+
+def save_checkpoint(cursor, path, offset, totals):
+    query = '''
+        INSERT INTO ImportCheckpoints (file_name, file_size, byte_offset, prefix_hash,
+                                       rows_read, rows_inserted, rows_rejected)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (file_name)
+        DO UPDATE SET file_size = EXCLUDED.file_size,
+                      byte_offset = EXCLUDED.byte_offset,
+                      prefix_hash = EXCLUDED.prefix_hash,
+                      rows_read = EXCLUDED.rows_read,
+                      rows_inserted = EXCLUDED.rows_inserted,
+                      rows_rejected = EXCLUDED.rows_rejected,
+                      updated_at = CURRENT_TIMESTAMP
+    '''
+    cursor.execute(query, (os.path.basename(path), os.path.getsize(path), offset, prefix_hash(path, offset),
+                           totals['read'], totals['inserted'], totals['rejected']))
+
+
+class FileCheckpointer:
+    """
+    Advances a file's ImportCheckpoints row as its chunks commit. Chunks finish
+    out of order, so the checkpoint moves to the end of the longest run of
+    committed chunks counted from the start of the import.
+    """
+
+    def __init__(self, conn, cursor, path, totals, run, progress=None):
+        self.conn = conn
+        self.cursor = cursor
+        self.path = path
+        self.totals = totals  # the file's counts, including earlier runs
+        self.run = run        # this import's counts over all files
+        self.progress = progress
+        self._next = 0
+        self._committed = {}  # sequence -> (rows_read, rejected, inserted, end_offset)
+
+    def committed(self, meta, inserted):
+        sequence, rows, rejected, end_offset = meta
+        self._committed[sequence] = (rows, rejected, inserted, end_offset)
+        checkpoint = None
+        while self._next in self._committed:
+            rows, rejected, inserted, checkpoint = self._committed.pop(self._next)
+            for counts in (self.totals, self.run):
+                counts['read'] += rows
+                counts['rejected'] += rejected
+                counts['inserted'] += inserted
+            self._next += 1
+        if checkpoint is not None:
+            save_checkpoint(self.cursor, self.path, checkpoint, self.totals)
+            self.conn.commit()
+        if self.progress:
+            self.progress(self.run['read'], self.run['inserted'])
+
+
+def import_stock_history(conn, paths=None, chunk_rows=CHUNK_ROWS, workers=LOAD_WORKERS, progress=None):
+    """
+    Resumable load_stock_history_parallel over the history CSV files (every CSV
+    in the data directory by default). Each file's checkpoint in
+    ImportCheckpoints advances to the end of the longest run of committed
+    chunks, so an interrupted import resumes there (chunks committed past it
+    are re-merged and skipped by ON CONFLICT), finished files are not read
+    again, and files that grew only have their new lines imported.
+    `progress(rows_read, rows_inserted)` counts this run's rows. Returns True
+    on success.
+    """
+    paths = history_csv_files() if paths is None else list(paths)
+    if not paths:
+        print(f"❌ No history CSV files found in: {HISTORY_DIR}")
+        return False
+
+    cursor = conn.cursor()
+    try:
+        plan = import_plan(cursor, paths)
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        cursor.close()
+        print(f"❌ Failed to read import checkpoints: {e}")
+        return False
+    if not plan:
+        cursor.close()
+        print("✅ Stock history is up to date")
+        return True
+
+    run = {'read': 0, 'inserted': 0, 'rejected': 0}
+    started = time.perf_counter()
+    try:
+        for path, offset, totals in plan:
+            print(f"Importing {os.path.basename(path)} from byte {offset}")
+            checkpointer = FileCheckpointer(conn, cursor, path, totals, run, progress)
+            chunks = ((frame, (sequence, rows, rejected, end_offset))
+                      for sequence, (frame, rejected, rows, end_offset)
+                      in enumerate(read_history_chunks(path, chunk_rows, offset)))
+            copy_history_chunks(chunks, workers, checkpointer.committed)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Failed to import stock history (resume by running the import again): {e}")
+        return False
+    finally:
+        cursor.close()
+
+    report_load(run, time.perf_counter() - started)
+    return True
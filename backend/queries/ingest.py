@@ -0,0 +1,336 @@
+import datetime
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from queries.utils import decimal_to_float as d2f
+from queries.setup import refresh_stock_prices, create_price_staging, compact_price_tables, stored_prices
+from queries.latest_prices import latest_prices
+from queries.price_store import price_store
+from queries.history_engine import holdings_valuation
+from queries.analytics_engine import analytics_cache
+from queries.forecast_cache import forecast_cache
+
+BATCH_SIZE = 50            # tickers per download request
+MAX_WORKERS = 4            # downloads in flight at once
+REQUESTS_PER_SECOND = 1.0  # sustained request rate towards the provider
+BURST = 2                  # requests allowed back to back before throttling
+RETRIES = 2                # extra attempts per batch before its symbols are reported as failed
+HISTORY_DAYS = 5 * 365     # window fetched for symbols that have no price data yet
+
+
+class MarketDataProvider:
+    """
+    Source of daily OHLCV bars. Subclass and pass to DailyIngestor to ingest
+    from something other than Yahoo Finance (a local stand-in, another vendor).
+    """
+
+    def fetch_daily(self, symbols, start_date, end_date):
+        """
+        Return {symbol: DataFrame} of daily bars in [start_date, end_date), indexed
+        by date with Open, High, Low, Close and Volume columns. Symbols without
+        data are left out.
+        """
+        raise NotImplementedError
+
+
+class YahooProvider(MarketDataProvider):
+    """Yahoo Finance through yf.download, many tickers per request"""
+
+    def fetch_daily(self, symbols, start_date, end_date):
+        symbols = list(symbols)
+        data = yf.download(symbols, start=start_date.strftime('%Y-%m-%d'), end=end_date.strftime('%Y-%m-%d'),
+                           group_by='ticker', auto_adjust=True, progress=False, threads=False)
+        frames = {}
+        if data is None or data.empty:
+            return frames
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            # Tickers that failed or did not trade come back as all-NaN rows
+            frame = frame.dropna(subset=['Close'])
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+
+class FrameProvider(MarketDataProvider):
+    """Serves bars from in-memory DataFrames ({symbol: frame}), for tests and offline runs"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def fetch_daily(self, symbols, start_date, end_date):
+        frames = {}
+        for symbol in symbols:
+            frame = self.frames.get(symbol)
+            if frame is None:
+                continue
+            dates = pd.Index([_as_date(index) for index in frame.index])
+            frame = frame[(dates >= start_date) & (dates < end_date)]
+            if not frame.empty:
+                frames[symbol] = frame
+        return frames
+
+
+class TokenBucket:
+    """Rate limiter: `rate` tokens per second, holding at most `capacity` for bursts"""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available and take them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _as_date(index):
+    return index.date() if hasattr(index, 'date') else index.to_pydatetime().date()
+
+
+DAILY_COLUMNS = ['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def daily_frame(symbol, bars, adjustment_ratio=1.0, until=None):
+    """
+    Shape provider bars (Open/High/Low/Close/Volume indexed by date) into
+    DailyStockInfo columns, scaling prices by adjustment_ratio and volume by its
+    inverse. Bars after `until` are dropped.
+    """
+    frame = pd.DataFrame({
+        'symbol': symbol,
+        'timestamp': [_as_date(index) for index in bars.index],
+        'open': bars['Open'].to_numpy(dtype=np.float64) * adjustment_ratio,
+        'high': bars['High'].to_numpy(dtype=np.float64) * adjustment_ratio,
+        'low': bars['Low'].to_numpy(dtype=np.float64) * adjustment_ratio,
+        'close': bars['Close'].to_numpy(dtype=np.float64) * adjustment_ratio,
+        'volume': np.round(np.nan_to_num(bars['Volume'].to_numpy(dtype=np.float64)) / adjustment_ratio).astype(np.int64),
+    }, columns=DAILY_COLUMNS)
+    if until is not None:
+        frame = frame[frame['timestamp'] <= until]
+    return frame
+
+
+def store_daily_frame(cursor, frame):
+    """
+    Upsert a DataFrame with DAILY_COLUMNS into DailyStockInfo: the rows are
+    COPYed into a session temp table and merged with a single INSERT ... ON
+    CONFLICT, instead of one statement per row, converting prices to cents when
+    the table uses compact storage. The caller commits.
+    """
+    if frame is None or frame.empty:
+        return 0
+    cursor.execute(create_price_staging.format(name='DailyStockInfoStaging'))
+    buffer = io.StringIO()
+    frame[DAILY_COLUMNS].to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+    cursor.copy_expert(
+        'COPY DailyStockInfoStaging ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(DAILY_COLUMNS)),
+        buffer
+    )
+    # DISTINCT ON keeps one row per key, ON CONFLICT cannot touch the same row twice
+    merge_query = '''
+        INSERT INTO DailyStockInfo (symbol, timestamp, open, high, low, close, volume)
+        SELECT DISTINCT ON (symbol, timestamp) symbol, timestamp, {prices}, volume
+          FROM DailyStockInfoStaging
+         ORDER BY symbol, timestamp
+        ON CONFLICT (symbol, timestamp)
+        DO UPDATE SET open = EXCLUDED.open,
+                      high = EXCLUDED.high,
+                      low = EXCLUDED.low,
+                      close = EXCLUDED.close,
+                      volume = EXCLUDED.volume
+    '''
+    compact = 'DailyStockInfo' in compact_price_tables(cursor)
+    cursor.execute(merge_query.format(prices=stored_prices(compact)))
+    cursor.execute('TRUNCATE DailyStockInfoStaging')
+    return len(frame)
+
+
+class DailyIngestor:
+    """
+    Bulk daily refresh: symbols are grouped by the window they need, downloaded
+    BATCH_SIZE at a time by a bounded worker pool under a token-bucket rate
+    limit, and each finished batch is written and committed on the calling
+    thread. The outcome of every symbol is reported (rows written, 0 when there
+    was nothing new, None when its download failed).
+    """
+
+    def __init__(self, provider=None, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS,
+                 limiter=None, retries=RETRIES):
+        self.provider = provider or YahooProvider()
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.limiter = limiter or TokenBucket()
+        self.retries = retries
+
+    def plan(self, cursor, num_days=1, symbols=None, today=None):
+        """
+        Split the symbols into download batches [(start, end, [symbol, ...]), ...]
+        and return them with {symbol: (latest_date, latest_close)} and the
+        symbols that are already up to date.
+        """
+        today = today or datetime.date.today()
+        query = '''
+            SELECT s.symbol, lp.timestamp, lp.close
+              FROM Stocks s
+              LEFT JOIN LatestPrices lp ON lp.symbol = s.symbol
+        '''
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        if symbols is not None:
+            wanted = set(symbols)
+            rows = [row for row in rows if row[0] in wanted]
+
+        latest = {}
+        windows = {}
+        up_to_date = []
+        for symbol, latest_date, latest_close in rows:
+            if latest_date:
+                # Re-read the latest stored day too: it anchors the split adjustment
+                start_date = latest_date
+                end_date = latest_date + datetime.timedelta(days=1 + num_days)
+                latest[symbol] = (latest_date, d2f(latest_close))
+                if latest_date + datetime.timedelta(days=1) > today:
+                    up_to_date.append(symbol)
+                    continue
+            else:
+                start_date = today - datetime.timedelta(days=HISTORY_DAYS)
+                end_date = start_date + datetime.timedelta(days=num_days)
+            windows.setdefault((start_date, end_date), []).append(symbol)
+
+        batches = []
+        for (start_date, end_date), window_symbols in sorted(windows.items()):
+            window_symbols.sort()
+            for i in range(0, len(window_symbols), self.batch_size):
+                batches.append((start_date, end_date, window_symbols[i:i + self.batch_size]))
+        return batches, latest, up_to_date
+
+    def _download(self, symbols, start_date, end_date):
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                return self.provider.fetch_daily(symbols, start_date, end_date)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                print(f"Retrying batch {symbols[0]}..{symbols[-1]} after error: {e}")
+                time.sleep(2 ** attempt)
+
+    def _frame(self, symbol, bars, latest, today):
+        """
+        New DailyStockInfo rows for one symbol, scaled so its latest stored close
+        carries over. The latest stored day is only read as the anchor, not rewritten.
+        """
+        if symbol not in latest:
+            return daily_frame(symbol, bars, until=today)
+        latest_date, latest_close = latest[symbol]
+        adjustment_ratio = 1.0
+        anchor = bars['Close'][[_as_date(index) == latest_date for index in bars.index]]
+        if len(anchor) and latest_close and float(anchor.iloc[0]):
+            # Adjusts in case the stock split between the stored history and now
+            adjustment_ratio = latest_close / float(anchor.iloc[0])
+        frame = daily_frame(symbol, bars, adjustment_ratio, until=today)
+        return frame[frame['timestamp'] > latest_date]
+
+    def _store(self, conn, symbols, frames, latest, today, results):
+        cursor = conn.cursor()
+        written_from = None
+        written = []
+        try:
+            parts = []
+            for symbol in symbols:
+                frame = self._frame(symbol, frames[symbol], latest, today) if symbol in frames else None
+                results[symbol] = 0 if frame is None else len(frame)
+                if results[symbol]:
+                    written.append(symbol)
+                    first = frame['timestamp'].min()
+                    written_from = first if written_from is None else min(written_from, first)
+                    parts.append(frame)
+            if parts:
+                store_daily_frame(cursor, pd.concat(parts, ignore_index=True))
+            if written:
+                refresh_stock_prices(cursor, written, written_from)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        latest_prices.invalidate(written)
+        if written:
+            price_store.invalidate(written, written_from)
+            analytics_cache.invalidate(written, written_from)
+            forecast_cache.invalidate(written)
+
+    def run(self, conn, num_days=1, symbols=None, progress=None, cancel=None):
+        """
+        Refresh the symbols (all of Stocks by default); returns {symbol: rows written | 0 | None}.
+        `progress(done, total)` is called with symbol counts after every batch, and
+        setting the `cancel` event stops the run after the batch being written;
+        symbols that were not reached are left out of the result.
+        """
+        today = datetime.date.today()
+        cursor = conn.cursor()
+        batches, latest, up_to_date = self.plan(cursor, num_days, symbols, today)
+        cursor.close()
+
+        results = {symbol: 0 for symbol in up_to_date}
+        total = len(up_to_date) + sum(len(batch_symbols) for _, _, batch_symbols in batches)
+        if progress:
+            progress(len(results), total)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._download, batch_symbols, start_date, end_date): batch_symbols
+                for start_date, end_date, batch_symbols in batches
+            }
+            for future in as_completed(futures):
+                if cancel is not None and cancel.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    print("Ingestion cancelled")
+                    break
+                batch_symbols = futures[future]
+                try:
+                    self._store(conn, batch_symbols, future.result(), latest, today, results)
+                except Exception as e:
+                    print(f"❌ Error fetching data for {', '.join(batch_symbols)}: {e}")
+                    for symbol in batch_symbols:
+                        results[symbol] = None
+                else:
+                    for symbol in batch_symbols:
+                        if results[symbol]:
+                            print(f"✅ Successfully updated {results[symbol]} days for {symbol}")
+                        else:
+                            print(f"ℹ️ No new data available for {symbol}")
+                if progress:
+                    progress(len(results), total)
+
+        holdings_valuation.invalidate()
+        updated = sum(1 for count in results.values() if count)
+        failed = sum(1 for count in results.values() if count is None)
+        print(f"Updated {updated} of {len(results)} symbols ({failed} failed) "
+              f"in {time.perf_counter() - started:.1f}s")
+        return results
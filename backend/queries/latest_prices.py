@@ -0,0 +1,61 @@
+import threading
+import time
+from queries.utils import decimal_to_float as d2f
+
+LATEST_PRICE_TTL = 60.0  # seconds a cached close is served before LatestPrices is re-read
+
+
+class LatestPriceCache:
+    """
+    In-process TTL cache over the LatestPrices table. Lookups only touch the
+    requested symbols, so valuing a portfolio costs O(holdings) instead of
+    grouping over the whole price history.
+    """
+
+    def __init__(self, ttl=LATEST_PRICE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # symbol -> (expires_at, timestamp, close)
+        self._lock = threading.Lock()
+
+    def get_latest(self, cursor, symbols):
+        """Return {symbol: (timestamp, close)} for the symbols that have price data"""
+        now = time.monotonic()
+        result = {}
+        missing = []
+        with self._lock:
+            for symbol in set(symbols):
+                entry = self._entries.get(symbol)
+                if entry and entry[0] > now:
+                    result[symbol] = entry[1:]
+                else:
+                    missing.append(symbol)
+
+        if missing:
+            query = '''
+                SELECT symbol, timestamp, close
+                  FROM LatestPrices
+                 WHERE symbol IN %s;
+            '''
+            cursor.execute(query, (tuple(missing),))
+            rows = cursor.fetchall()
+            with self._lock:
+                for symbol, timestamp, close in rows:
+                    close = d2f(close)
+                    self._entries[symbol] = (now + self.ttl, timestamp, close)
+                    result[symbol] = (timestamp, close)
+        return result
+
+    def get_prices(self, cursor, symbols):
+        """Return {symbol: close} for the symbols that have price data"""
+        return {symbol: close for symbol, (_, close) in self.get_latest(cursor, symbols).items()}
+
+    def invalidate(self, symbols=None):
+        with self._lock:
+            if symbols is None:
+                self._entries.clear()
+            else:
+                for symbol in symbols:
+                    self._entries.pop(symbol, None)
+
+
+latest_prices = LatestPriceCache()
@@ -1,28 +1,19 @@
 import psycopg2
+from queries.db import PooledQueries, with_connection
 from queries.utils import decimal_to_float as d2f
+from queries.latest_prices import latest_prices
+from queries.history_engine import holdings_valuation, holdings_key
+from queries.analytics_engine import compute_holdings_analytics, holdings_return_distribution
+from queries.forecast_cache import forecast_cache
 import datetime
 import json
 from typing import Optional, Dict, Tuple, List
 
-class Portfolio:
-    conn = psycopg2.connect(
-        host='34.130.75.185',
-        database='template1',
-        user='postgres',
-        password='2357'
-    )
-
-    def ensure_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(
-                host='34.130.75.185',
-                database='template1',
-                user='postgres',
-                password='2357'
-            )
+class Portfolio(PooledQueries):
+
+    @with_connection
     def create_portfolio(self, user_id, portfolio_name, initial_cash=0):
 
-        self.ensure_connection()
         try:
             user_id = int(user_id)  # Ensure integer conversion
             initial_cash = float(initial_cash)  # Ensure float conversion
@@ -43,9 +34,9 @@ class Portfolio:
             print(f"Error in create_portfolio: {e}")
             raise e
         
+    @with_connection
     def delete_portfolio(self, portfolio_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Proceed with deletion
@@ -60,9 +51,9 @@ class Portfolio:
         cursor.close()
         return deleted_id
 
+    @with_connection
     def update_cash_balance(self, user_id, portfolio_id, amount, record_transaction=True):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         is_owner_query = '''
             SELECT 1
@@ -114,9 +105,9 @@ class Portfolio:
         cursor.close()
         return updated_balance
     
+    @with_connection
     def get_cash_balance(self, portfolio_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT cash_balance
@@ -132,9 +123,9 @@ class Portfolio:
         cursor.close()
         return cash_balance
 
+    @with_connection
     def buy_stock_shares(self, user_id, portfolio_id, symbol, num_shares):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
 
         is_owner_query = '''
@@ -148,24 +139,11 @@ class Portfolio:
             cursor.close()
             return None
 
-        # Get the latest price per share from StockHistory and DailyStockInfo 
-        price_query = '''
-            (SELECT close, timestamp
-              FROM DailyStockInfo
-             WHERE symbol = %s
-            UNION
-            SELECT close, timestamp
-              FROM StocksHistory
-             WHERE symbol = %s)
-            ORDER BY timestamp DESC
-            LIMIT 1;
-        '''
-        cursor.execute(price_query, (symbol, symbol))
-        result = cursor.fetchone()
-        if not result:
+        # Get the latest price per share from LatestPrices
+        price_per_share = latest_prices.get_prices(cursor, [symbol]).get(symbol)
+        if price_per_share is None:
             cursor.close()
             return None  # No price data available
-        price_per_share = d2f(result[0])
         
         # Calculate the total cost and check if the portfolio has enough cash
         total_cost = num_shares * price_per_share
@@ -196,9 +174,9 @@ class Portfolio:
         cursor.close()
         return result
     
+    @with_connection
     def sell_stock_shares(self, user_id, portfolio_id, symbol, num_shares):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
 
         is_owner_query = '''
@@ -250,24 +228,8 @@ class Portfolio:
             cursor.execute(update_query, (num_shares, portfolio_id, symbol))
             result = cursor.fetchone()
 
-        # Get the latest price per share from StockHistory
-        price_query = '''
-            (SELECT close, timestamp
-              FROM DailyStockInfo
-             WHERE symbol = %s
-            UNION
-            SELECT close, timestamp
-              FROM StocksHistory
-             WHERE symbol = %s)
-            ORDER BY timestamp DESC
-            LIMIT 1;
-        '''
-        cursor.execute(price_query, (symbol, symbol))
-        result = cursor.fetchone()
-        if not result:
-            cursor.close()
-            return None
-        price_per_share = d2f(result[0])
+        # Get the latest price per share from LatestPrices
+        price_per_share = latest_prices.get_prices(cursor, [symbol]).get(symbol)
         if not price_per_share:
             cursor.close()
             return None  # No price data available
@@ -289,9 +251,9 @@ class Portfolio:
         cursor.close()
         return result
 
+    @with_connection
     def view_portfolio(self, user_id, portfolio_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         is_owner_query = '''
             SELECT 1
@@ -314,9 +276,9 @@ class Portfolio:
         cursor.close()
         return portfolio_data
 
+    @with_connection
     def view_portfolio_transactions(self, user_id, portfolio_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         is_owner_query = '''
             SELECT 1
@@ -340,9 +302,9 @@ class Portfolio:
         cursor.close()
         return transactions
 
+    @with_connection
     def compute_portfolio_value(self, user_id, portfolio_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         is_owner_query = '''
             SELECT 1
@@ -369,39 +331,15 @@ class Portfolio:
 
         # stock value
         # latest close stock price for each stock in the portfolio multiplied by num shares
-        value_query = '''
-            WITH latest_prices AS (
-                SELECT 
-                    symbol,
-                    MAX(timestamp) as max_time
-                FROM (
-                    SELECT symbol, timestamp FROM StocksHistory
-                    UNION ALL
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                ) combined
-                GROUP BY symbol
-            ),
-            current_prices AS (
-                SELECT 
-                    lp.symbol,
-                    COALESCE(
-                        (SELECT close FROM DailyStockInfo WHERE symbol = lp.symbol AND timestamp = lp.max_time),
-                        (SELECT close FROM StocksHistory WHERE symbol = lp.symbol AND timestamp = lp.max_time)
-                    ) as close_price
-                FROM latest_prices lp
-            )
-            SELECT COALESCE(SUM(ps.num_shares * cp.close_price), 0)
-            FROM PortfolioStocks ps
-            JOIN current_prices cp ON ps.symbol = cp.symbol
-            WHERE ps.portfolio_id = %s;
+        holdings_query = '''
+            SELECT symbol, num_shares
+              FROM PortfolioStocks
+             WHERE portfolio_id = %s
         '''
-        cursor.execute(value_query, (portfolio_id,))
-        result = cursor.fetchone()
-        if not result:
-            cursor.close()
-            return None
-        
-        stock_value = d2f(result[0])
+        cursor.execute(holdings_query, (portfolio_id,))
+        holdings = cursor.fetchall()
+        prices = latest_prices.get_prices(cursor, [symbol for symbol, _ in holdings])
+        stock_value = sum(num_shares * prices[symbol] for symbol, num_shares in holdings if symbol in prices)
         if not stock_value:
             cursor.close()
             return cash_balance
@@ -411,9 +349,9 @@ class Portfolio:
         cursor.close()
         return total_value
 
+    @with_connection
     def view_user_portfolios(self, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT p.portfolio_id, p.portfolio_name, p.cash_balance, 
@@ -430,9 +368,9 @@ class Portfolio:
         cursor.close()
         return portfolios 
 
+    @with_connection
     def compute_portfolio_analytics(self, user_id, portfolio_id, start_date=None, end_date=None):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to portfolio
@@ -453,11 +391,7 @@ class Portfolio:
                 FROM (
                     SELECT ps.symbol, MAX(combined.timestamp) as max_ts
                     FROM PortfolioStocks ps
-                    JOIN (
-                        SELECT symbol, timestamp FROM DailyStockInfo
-                        UNION ALL
-                        SELECT symbol, timestamp FROM StocksHistory
-                    ) combined ON ps.symbol = combined.symbol
+                    JOIN StockPrices combined ON ps.symbol = combined.symbol
                     WHERE ps.portfolio_id = %s
                     GROUP BY ps.symbol
                 ) AS symbol_max_dates;
@@ -471,11 +405,7 @@ class Portfolio:
             end_date = latest_date
             earliest_date_query = '''
                 SELECT MIN(timestamp)
-                FROM (
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                    UNION ALL
-                    SELECT symbol, timestamp FROM StocksHistory
-                ) combined
+                FROM StockPrices
             '''
             cursor.execute(earliest_date_query, (portfolio_id,))
             start_date = cursor.fetchone()[0]
@@ -496,12 +426,12 @@ class Portfolio:
             
         # Check if SPY data is available for the date range
         # NOTE: Currently all spy data is stored in DailyStockInfo even though the dates may
-        # be in the range of what is in StocksHistory
+        # be in the range of what is in StocksHistory; both feed StockPrices
         spy_check_query = '''
             SELECT COUNT(*)
             FROM (
                 SELECT timestamp
-                FROM DailyStockInfo
+                FROM StockPrices
                 WHERE symbol = 'SPY' AND timestamp BETWEEN %s AND %s
             ) spy_data
         '''
@@ -519,154 +449,18 @@ class Portfolio:
                 return None  # Could not fetch SPY data
             
 
-        # Calculate daily returns, CV, and Beta for each stock
-        analytics_query = '''
-            WITH daily_returns AS (
-                SELECT 
-                    symbol,
-                    timestamp,
-                    (close - LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp)) / LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp) as daily_return
-                FROM (
-                    (SELECT symbol, timestamp, close
-                    FROM StocksHistory
-                    WHERE symbol IN %s AND timestamp >= %s AND timestamp <= %s)
-                    UNION ALL
-                    (SELECT symbol, timestamp, close
-                    FROM DailyStockInfo
-                    WHERE symbol IN %s AND timestamp >= %s AND timestamp <= %s)
-                ) combined
-            ),
-            spy_returns AS (
-                SELECT 
-                    timestamp,
-                    (close - LAG(close) OVER (ORDER BY timestamp)) / LAG(close) OVER (ORDER BY timestamp) as spy_return
-                FROM (
-                    SELECT timestamp, close
-                    FROM DailyStockInfo
-                    WHERE symbol = 'SPY' AND timestamp >= %s AND timestamp <= %s
-                ) spy_data
-            ),
-            stock_stats AS (
-                SELECT 
-                    dr.symbol,
-                    AVG(dr.daily_return) as mean_return,
-                    STDDEV(dr.daily_return) as std_return,
-                    (AVG(dr.daily_return * sr.spy_return) - AVG(dr.daily_return) * AVG(sr.spy_return)) as cov_with_spy,
-                    VARIANCE(sr.spy_return) as spy_variance
-                FROM daily_returns dr
-                JOIN spy_returns sr ON dr.timestamp = sr.timestamp
-                WHERE dr.daily_return IS NOT NULL AND sr.spy_return IS NOT NULL
-                GROUP BY dr.symbol
-            ),
-            correlation_matrix AS (
-                SELECT 
-                    a.symbol as symbol1,
-                    b.symbol as symbol2,
-                    (AVG(a.daily_return * b.daily_return) - AVG(a.daily_return) * AVG(b.daily_return)) / 
-                    (STDDEV(a.daily_return) * STDDEV(b.daily_return)) as correlation
-                FROM daily_returns a
-                JOIN daily_returns b ON a.timestamp = b.timestamp
-                GROUP BY a.symbol, b.symbol
-            ),
-            covariance_matrix AS (
-                SELECT 
-                    a.symbol as symbol1,
-                    b.symbol as symbol2,
-                    (AVG(a.daily_return * b.daily_return) - AVG(a.daily_return) * AVG(b.daily_return)) as covariance
-                FROM daily_returns a
-                JOIN daily_returns b ON a.timestamp = b.timestamp
-                GROUP BY a.symbol, b.symbol
-            )
-            SELECT 
-                ss.symbol,
-                ss.mean_return,
-                ss.std_return,
-                CASE 
-                    WHEN ss.mean_return = 0 THEN 0 
-                    ELSE ss.std_return / ss.mean_return 
-                END as coefficient_of_variation,
-                CASE 
-                    WHEN ss.spy_variance = 0 THEN 0 
-                    ELSE ss.cov_with_spy / ss.spy_variance 
-                END as beta,
-                cm.symbol2,
-                cm.correlation,
-                covm.symbol2 as cov_symbol2,
-                covm.covariance
-            FROM stock_stats ss
-            LEFT JOIN correlation_matrix cm ON ss.symbol = cm.symbol1
-            LEFT JOIN covariance_matrix covm ON ss.symbol = covm.symbol1
-            ORDER BY ss.symbol, cm.symbol2, covm.symbol2;
-        '''
-        
-        # Prepare parameters for the query
-        symbols = tuple(stock[0] for stock in portfolio_stocks)
-        params = (symbols, start_date, end_date, symbols, start_date, end_date,
-                 start_date, end_date)
-        
-        # import time
-        # start_time = time.time()    
-        cursor.execute(analytics_query, params)
-        analytics_data = cursor.fetchall()
-        # end_time = time.time()  
-        # print(f"Time taken to execute analytics_query: {end_time - start_time} seconds")
-        
-        if not analytics_data:
-            cursor.close()
+        # Calculate daily returns, CV, Beta, correlation and covariance for each stock from one
+        # fetch of the aligned returns (holdings + SPY), vectorized in memory
+        analytics = compute_holdings_analytics(cursor, portfolio_stocks, start_date, end_date)
+        cursor.close()
+        if not analytics:
             print("No analytics data")
             return None
-            
-        stock_analytics = []
-        correlation_matrix = {}
-        covariance_matrix = {}
-        
-        current_symbol = None
-        for row in analytics_data:
-            symbol = row[0]
-            cv = float(row[3])
-            beta = float(row[4])
-            corr_symbol2 = row[5]
-            correlation = float(row[6]) if row[6] is not None else 0
-            cov_symbol2 = row[7]
-            covariance = float(row[8]) if row[8] is not None else 0
-            
-            # Add stock analytics if we haven't seen this symbol before
-            if symbol != current_symbol:
-                current_symbol = symbol
-                stock_analytics.append({
-                    'symbol': symbol,
-                    'shares': next(stock[1] for stock in portfolio_stocks if stock[0] == symbol),
-                    'coefficient_of_variation': cv,
-                    'beta': beta
-                })
-                correlation_matrix[symbol] = {symbol: 1.0}  # Self-correlation is always 1
-                covariance_matrix[symbol] = {symbol: covariance}  # Self-covariance
-            
-            # Add correlation and covariance data if available
-            if corr_symbol2 is not None:
-                correlation_matrix[symbol][corr_symbol2] = correlation
-                if corr_symbol2 not in correlation_matrix:
-                    correlation_matrix[corr_symbol2] = {}
-                correlation_matrix[corr_symbol2][symbol] = correlation
-                correlation_matrix[corr_symbol2][corr_symbol2] = 1.0
-            
-            if cov_symbol2 is not None:
-                covariance_matrix[symbol][cov_symbol2] = covariance
-                if cov_symbol2 not in covariance_matrix:
-                    covariance_matrix[cov_symbol2] = {}
-                covariance_matrix[cov_symbol2][symbol] = covariance
-                #covariance_matrix[cov_symbol2][cov_symbol2] = covariance
-        
-        cursor.close()
-        return {
-            'stock_analytics': stock_analytics,
-            'correlation_matrix': correlation_matrix,
-            'covariance_matrix': covariance_matrix
-        } 
+        return analytics
 
+    @with_connection
     def view_portfolio_history(self, user_id, portfolio_id, period='all'):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to portfolio
@@ -699,87 +493,16 @@ class Portfolio:
             cursor.close()
             return None
             
-        # Get the most recent date from DailyStockInfo or StocksHistory
-        recent_date_query = '''
-            SELECT MIN(max_ts)
-            FROM (
-                SELECT ps.symbol, MAX(combined.timestamp) as max_ts
-                FROM PortfolioStocks ps
-                JOIN (
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                    UNION ALL
-                    SELECT symbol, timestamp FROM StocksHistory
-                ) combined ON ps.symbol = combined.symbol
-                WHERE ps.portfolio_id = %s
-                GROUP BY ps.symbol
-            ) AS symbol_max_dates;
-        '''
-        cursor.execute(recent_date_query, (portfolio_id,))
-        latest_date = cursor.fetchone()[0]
-        
-        if not latest_date:
-            cursor.close()
-            return None
-            
-        # Calculate the start date based on period
-        if period == '5d':
-            start_date = latest_date - datetime.timedelta(days=5)
-        elif period == '1mo':
-            start_date = latest_date - datetime.timedelta(days=30)
-        elif period == '6mo':
-            start_date = latest_date - datetime.timedelta(days=180)
-        elif period == '1y':
-            start_date = latest_date - datetime.timedelta(days=365)
-        elif period == '5y':
-            start_date = latest_date - datetime.timedelta(days=5*365)
-        elif period == 'all':
-            start_date = datetime.date(1900, 1, 1)
-        else:
-            cursor.close()
-            return None
-            
-        # Get historical data for all stocks in the portfolio
-        history_query = '''
-            WITH portfolio_dates AS (
-                SELECT DISTINCT timestamp
-                FROM (
-                    SELECT timestamp FROM StocksHistory
-                    UNION
-                    SELECT timestamp FROM DailyStockInfo
-                ) all_dates
-                WHERE timestamp >= %s AND timestamp <= %s
-            ),
-            stock_values AS (
-                SELECT 
-                    pd.timestamp,
-                    ps.symbol,
-                    ps.num_shares,
-                    COALESCE(sh.close, dsi.close) as close_price
-                FROM portfolio_dates pd
-                CROSS JOIN (
-                    SELECT symbol, num_shares
-                    FROM PortfolioStocks
-                    WHERE portfolio_id = %s
-                ) ps
-                LEFT JOIN StocksHistory sh ON sh.symbol = ps.symbol AND sh.timestamp = pd.timestamp
-                LEFT JOIN DailyStockInfo dsi ON dsi.symbol = ps.symbol AND dsi.timestamp = pd.timestamp
-            )
-            SELECT 
-                timestamp,
-                SUM(num_shares * close_price) + %s as total_value
-            FROM stock_values
-            GROUP BY timestamp
-            ORDER BY timestamp ASC;
-        '''
-        
-        cursor.execute(history_query, (start_date, latest_date, portfolio_id, cash_balance))
-        history = cursor.fetchall()
+        # Value the holdings up to the latest date on which every stock in the portfolio has a
+        # price: one fetch of the close series, aligned and valued in memory (cached per holdings)
+        history = holdings_valuation.history(cursor, holdings, period, cash_balance)
         cursor.close()
         return history
 
-    def predict_portfolio_value(self, user_id: int, portfolio_id: int, days_to_predict: int = 30) -> Tuple[List[Dict], float]:
+    @with_connection
+    def predict_portfolio_value(self, user_id: int, portfolio_id: int, days_to_predict: int = 30, seed=None,
+                                correlated: bool = False) -> Tuple[List[Dict], float]:
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to portfolio
@@ -800,69 +523,47 @@ class Portfolio:
             cursor.close()
             return [], 0.0
             
-        # Get the minimum of maximum dates for all stocks in the portfolio
-        max_dates_query = '''
-            SELECT MIN(max_ts)
-            FROM (
-                SELECT ps.symbol, MAX(combined.timestamp) as max_ts
-                FROM PortfolioStocks ps
-                JOIN (
-                    SELECT symbol, timestamp FROM StocksHistory
-                    UNION ALL
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                ) combined ON ps.symbol = combined.symbol
-                WHERE ps.portfolio_id = %s
-                GROUP BY ps.symbol
-            ) AS symbol_max_dates;
+        holdings_query = '''
+            SELECT symbol, num_shares
+            FROM PortfolioStocks
+            WHERE portfolio_id = %s
         '''
-        cursor.execute(max_dates_query, (portfolio_id,))
-        latest_date = cursor.fetchone()[0]
+        cursor.execute(holdings_query, (portfolio_id,))
+        holdings = cursor.fetchall()
+        symbols = [symbol for symbol, _ in holdings]
         
-        if not latest_date:
-            cursor.close()
-            return [], 0.0
-            
-        # Get historical portfolio values up to the latest common date
-        history_query = '''
-            WITH portfolio_dates AS (
-                SELECT DISTINCT timestamp
-                FROM (
-                    SELECT timestamp FROM StocksHistory
-                    UNION
-                    SELECT timestamp FROM DailyStockInfo
-                ) all_dates
-                WHERE timestamp <= %s
-            ),
-            stock_values AS (
-                SELECT 
-                    pd.timestamp,
-                    ps.symbol,
-                    ps.num_shares,
-                    COALESCE(sh.close, dsi.close) as close_price
-                FROM portfolio_dates pd
-                CROSS JOIN (
-                    SELECT symbol, num_shares
-                    FROM PortfolioStocks
-                    WHERE portfolio_id = %s
-                ) ps
-                LEFT JOIN StocksHistory sh ON sh.symbol = ps.symbol AND sh.timestamp = pd.timestamp
-                LEFT JOIN DailyStockInfo dsi ON dsi.symbol = ps.symbol AND dsi.timestamp = pd.timestamp
-            )
-            SELECT 
-                timestamp,
-                SUM(num_shares * close_price) + %s as total_value
-            FROM stock_values
-            GROUP BY timestamp
-            ORDER BY timestamp ASC;
-        '''
+        from models.prediction_model import PortfolioPredictionModel
+        model = PortfolioPredictionModel()
         
-        cursor.execute(history_query, (latest_date, portfolio_id, cash_balance))
-        portfolio_data = [{'timestamp': row[0].strftime('%Y-%m-%d'), 'value': float(row[1])} 
-                         for row in cursor.fetchall()]
+        # Fitted parameters are reused until the holdings, the cash or the price data change
+        latest_date = holdings_valuation.latest_common_date(cursor, symbols)
+        key = ('portfolio', holdings_key(holdings), cash_balance, latest_date, correlated)
+        params = forecast_cache.get(key)
         
-        cursor.close()
+        if params is None:
+            # Get historical portfolio values up to the latest common date
+            history = holdings_valuation.history(cursor, holdings, 'all', cash_balance)
+            if not history:
+                cursor.close()
+                return [], 0.0
+            portfolio_data = [{'timestamp': timestamp.strftime('%Y-%m-%d'), 'value': value}
+                             for timestamp, value in history]
+            
+            if correlated:
+                # Simulate each holding with the return covariance over the same window as the history
+                mean_returns, covariance, last_prices = holdings_return_distribution(
+                    cursor, symbols, history[0][0], history[-1][0])
+                params = model.fit_holdings(portfolio_data, last_prices, [d2f(num_shares) for _, num_shares in holdings],
+                                            mean_returns, covariance, cash_balance)
+            else:
+                params = model.fit_values(portfolio_data)
+            if params is None:
+                cursor.close()
+                return [], 0.0
+            forecast_cache.put(key, symbols, params)
         
-        # Use prediction model
-        from models.prediction_model import PortfolioPredictionModel
-        model = PortfolioPredictionModel()
-        return model.predict_portfolio_value(portfolio_data, days_to_predict) 
\ No newline at end of file
+        cursor.close()
+        if correlated:
+            return model.forecast_holdings(params, days_to_predict, seed=seed)
+        return model.forecast_values(params, days_to_predict, seed=seed)
+ 
\ No newline at end of file
@@ -0,0 +1,171 @@
+import os
+import time
+import datetime
+import tempfile
+import numpy as np
+
+# Directory of the on-disk price cache; set PRICE_CACHE_DIR to an empty string to disable it
+PRICE_CACHE_DIR = os.environ.get(
+    'PRICE_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.price_cache')
+)
+
+# File layout, little endian:
+#   header (64 bytes): magic, format version, row count, last date (days since
+#                      1970-01-01), write time, padding
+#   dates  : rows x int64 days (datetime64[D])
+#   columns: open, high, low, close, volume, each rows x float64
+MAGIC = b'PRC1'
+VERSION = 1
+HEADER = np.dtype([
+    ('magic', 'S4'), ('version', '<u4'), ('rows', '<u8'),
+    ('last_date', '<i8'), ('written_at', '<f8'), ('reserved', 'V32'),
+])
+assert HEADER.itemsize == 64
+
+
+class PriceCacheDir:
+    """
+    One memory-mapped file per symbol holding a PriceSeries. Reads map the file
+    and return views on it (no copy, no parsing), so a cold start reads history
+    from local disk instead of the database. Files are replaced atomically, so a
+    mapping that is still in use keeps seeing the old contents. A file that could
+    not be truncated after its rows were rewritten gets a `.stale` marker holding
+    the first rewritten date; loads ignore the rows from there until the next save.
+    """
+
+    def __init__(self, path=PRICE_CACHE_DIR):
+        self.path = path
+
+    def _file(self, symbol):
+        return os.path.join(self.path, f"{symbol}.prc")
+
+    def _marker(self, symbol):
+        return os.path.join(self.path, f"{symbol}.stale")
+
+    def stale_since(self, symbol):
+        """First date of the symbol's file that must not be served, None when all of it is valid"""
+        try:
+            with open(self._marker(symbol)) as handle:
+                return datetime.date.fromisoformat(handle.read().strip())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return datetime.date.min
+
+    def mark_stale(self, symbol, since=None):
+        """Record that the symbol's rows from `since` (all of them when None) were rewritten"""
+        since = since or datetime.date.min
+        marked = self.stale_since(symbol)
+        if marked is not None and marked <= since:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                handle.write(since.isoformat())
+            os.replace(temp_path, self._marker(symbol))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _clear_stale(self, symbol):
+        try:
+            os.remove(self._marker(symbol))
+        except FileNotFoundError:
+            pass
+
+    def load(self, symbol):
+        """The cached PriceSeries of the symbol (up to its stale marker), or None when there is no valid file"""
+        from queries.price_store import PriceSeries
+        path = self._file(symbol)
+        if not os.path.exists(path):
+            return None
+        try:
+            buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        except (OSError, ValueError):
+            # Unreadable or empty (an empty file cannot be mapped)
+            self.discard(symbol)
+            return None
+        valid = len(buffer) >= HEADER.itemsize
+        if valid:
+            header = buffer[:HEADER.itemsize].view(HEADER)[0]
+            rows = int(header['rows'])
+            valid = (header['magic'] == MAGIC and header['version'] == VERSION
+                     and len(buffer) == HEADER.itemsize + 48 * rows)
+        if not valid:
+            del buffer  # unmap before deleting, Windows cannot remove a mapped file
+            self.discard(symbol)
+            return None
+        offset = HEADER.itemsize
+        dates = buffer[offset:offset + 8 * rows].view('<M8[D]')
+        columns = []
+        for i in range(5):
+            start = offset + 8 * rows * (i + 1)
+            columns.append(buffer[start:start + 8 * rows].view('<f8'))
+        series = PriceSeries(dates, *columns)
+        stale_since = self.stale_since(symbol)
+        if stale_since is None:
+            return series
+        if stale_since == datetime.date.min:
+            return None
+        return series.between(None, stale_since - datetime.timedelta(days=1))
+
+    def last_date(self, series):
+        return series.dates[-1].astype(object) if len(series) else None
+
+    def save(self, symbol, series):
+        """Write the series to the symbol's file (atomically replacing the previous one) and clear its marker"""
+        os.makedirs(self.path, exist_ok=True)
+        header = np.zeros(1, dtype=HEADER)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['rows'] = len(series)
+        header['last_date'] = series.dates[-1].astype('<i8') if len(series) else -1
+        header['written_at'] = time.time()
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(header.tobytes())
+                handle.write(np.ascontiguousarray(series.dates, dtype='<M8[D]').tobytes())
+                for name in ('open', 'high', 'low', 'close', 'volume'):
+                    handle.write(np.ascontiguousarray(getattr(series, name), dtype='<f8').tobytes())
+            os.replace(temp_path, self._file(symbol))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._clear_stale(symbol)
+
+    def truncate(self, symbol, since):
+        """Drop the cached rows dated on or after `since`; they are re-read from the database"""
+        marked = self.stale_since(symbol) is not None
+        series = self.load(symbol)
+        if series is None:
+            return
+        kept = series.between(None, since - datetime.timedelta(days=1))
+        # A marked file is rewritten too, so the marker can go
+        if marked or len(kept) < len(series):
+            self.save(symbol, kept)
+
+    def symbols(self):
+        """Symbols with a cache file"""
+        if not os.path.isdir(self.path):
+            return []
+        return [name[:-len('.prc')] for name in os.listdir(self.path) if name.endswith('.prc')]
+
+    def discard(self, symbol):
+        """Best-effort removal of a broken cache file; it is rebuilt from the database"""
+        try:
+            os.remove(self._file(symbol))
+        except OSError:
+            pass
+
+    def remove(self, symbol=None):
+        """Delete the symbol's file, or every cache file, with their markers"""
+        names = [f"{symbol}.prc", f"{symbol}.stale"] if symbol else \
+            (os.listdir(self.path) if os.path.isdir(self.path) else [])
+        # Data files first: a marker must outlive the file it guards
+        for name in sorted(names, key=lambda name: name.endswith('.stale')):
+            if name.endswith(('.prc', '.stale')) and os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
@@ -0,0 +1,286 @@
+import os
+import datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from queries.latest_prices import latest_prices
+from queries.price_cache import PriceCacheDir, PRICE_CACHE_DIR
+
+# Memory budget of the store; least recently used symbols are evicted beyond it
+PRICE_STORE_BUDGET = int(float(os.environ.get('PRICE_STORE_MB', 256)) * 2**20)
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class PriceSeries:
+    """
+    Columnar daily history of one symbol: a sorted datetime64[D] date index and
+    one contiguous float64 array per OHLCV column.
+    """
+    __slots__ = ('dates',) + PRICE_COLUMNS
+
+    def __init__(self, dates, open, high, low, close, volume):
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (timestamp, open, high, low, close, volume) rows in date order"""
+        dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        values = np.array([row[1:6] for row in rows], dtype=np.float64).reshape(len(rows), 5)
+        # Copy each column out so it is contiguous on its own
+        return cls(dates, *(np.ascontiguousarray(values[:, i]) for i in range(5)))
+
+    @classmethod
+    def empty(cls):
+        return cls.from_rows([])
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def between(self, start_date=None, end_date=None):
+        """Rows with start_date <= date <= end_date, as views on the same arrays"""
+        lo = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(start_date, 'D'), 'left')
+        hi = len(self.dates) if end_date is None else np.searchsorted(self.dates, np.datetime64(end_date, 'D'), 'right')
+        return PriceSeries(*(getattr(self, name)[lo:hi] for name in self.__slots__))
+
+    def splice(self, since, newer):
+        """Replace the rows dated on or after `since` with `newer`"""
+        keep = np.searchsorted(self.dates, np.datetime64(since, 'D'), 'left')
+        return PriceSeries(*(np.concatenate([getattr(self, name)[:keep], getattr(newer, name)])
+                             for name in self.__slots__))
+
+    def close_asof(self, dates):
+        """Close on or before each of `dates` (datetime64[D]); NaN before the first price"""
+        index = np.searchsorted(self.dates, dates, 'right') - 1
+        closes = self.close[np.clip(index, 0, None)] if len(self.close) else np.full(len(dates), np.nan)
+        return np.where(index >= 0, closes, np.nan)
+
+    def to_frame(self):
+        """DataFrame indexed by Date with Open, High, Low, Close and Volume columns"""
+        return pd.DataFrame(
+            {name.capitalize(): getattr(self, name) for name in PRICE_COLUMNS},
+            index=pd.DatetimeIndex(self.dates, name='Date')
+        )
+
+
+class PriceStore:
+    """
+    Process-local columnar cache of symbol histories read from StockPrices.
+    Symbols are loaded on demand (many per query), kept in LRU order under a
+    byte budget, and refreshed incrementally: invalidate(symbols, since) marks
+    the rows from `since` stale and only those are re-read on the next access.
+    With a PriceCacheDir, histories loaded in earlier sessions are mapped from
+    local files and only the days after each file's last date are queried.
+    """
+
+    def __init__(self, max_bytes=PRICE_STORE_BUDGET, disk=None):
+        self.max_bytes = max_bytes
+        self.disk = disk  # optional PriceCacheDir backing the store across sessions
+        self._series = OrderedDict()
+        self._stale = {}  # symbol -> first date to re-read
+        # Bumped by every invalidation (the epoch by those of every symbol), cached or
+        # not, so a load that raced one is not stored as current
+        self._generations = {}
+        self._epoch = 0
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        # Serializes cache file writes with invalidations, so a save checked against
+        # the generation cannot land after a newer invalidation of the file
+        self._disk_lock = threading.Lock()
+
+    def get(self, cursor, symbol):
+        """PriceSeries of the symbol's full history (empty when it has no prices)"""
+        return self.get_many(cursor, [symbol])[symbol]
+
+    def get_many(self, cursor, symbols):
+        """{symbol: PriceSeries} for the symbols, loading what is missing or stale in bulk"""
+        result = {}
+        missing = []
+        stale = {}
+        with self._lock:
+            generations = {symbol: self._generation(symbol) for symbol in symbols}
+            for symbol in dict.fromkeys(symbols):
+                series = self._series.get(symbol)
+                if series is None:
+                    missing.append(symbol)
+                elif symbol in self._stale:
+                    stale[symbol] = self._stale[symbol]
+                    result[symbol] = series
+                else:
+                    self._series.move_to_end(symbol)
+                    result[symbol] = series
+
+        disk = self.disk  # may be turned off by a concurrent invalidate
+        if missing and disk:
+            missing = self._load_from_disk(disk, cursor, missing, result, stale, generations)
+        if missing:
+            loaded = self._load(cursor, missing)
+            for symbol in missing:
+                result[symbol] = loaded.get(symbol) or PriceSeries.empty()
+        if stale:
+            # One query from the earliest stale date; each symbol is spliced from there
+            since = min(stale.values())
+            loaded = self._load(cursor, list(stale), since)
+            for symbol in stale:
+                result[symbol] = result[symbol].splice(since, loaded.get(symbol) or PriceSeries.empty())
+
+        if missing or stale:
+            current = []
+            with self._lock:
+                for symbol in missing + list(stale):
+                    # Invalidated while loading: the symbol stays missing or stale for the next read
+                    if self._generation(symbol) != generations[symbol]:
+                        continue
+                    self._store(symbol, result[symbol])
+                    self._stale.pop(symbol, None)
+                    current.append(symbol)
+                self._evict()
+            if self.disk:
+                with self._disk_lock:
+                    for symbol in current:
+                        with self._lock:
+                            unchanged = self._generation(symbol) == generations[symbol]
+                        if unchanged and self.disk:
+                            self._save_to_disk(symbol, result[symbol])
+        return result
+
+    def _generation(self, symbol):
+        return self._epoch, self._generations.get(symbol, 0)
+
+    def _save_to_disk(self, symbol, series):
+        """The disk cache is best-effort: a failed write leaves the read served from the database"""
+        try:
+            self.disk.save(symbol, series)
+        except OSError as e:
+            print(f"❌ Failed to write the price cache of {symbol}: {e}")
+            self.disk.discard(symbol)
+
+    def _load_from_disk(self, disk, cursor, symbols, result, stale, generations):
+        """
+        Serve symbols from their cache files, validated against the latest price
+        date in the database. A file that is behind is used and its newer rows
+        queued as stale; returns the symbols that still need a full load.
+        """
+        latest = latest_prices.get_latest(cursor, symbols)
+        remaining = []
+        for symbol in symbols:
+            try:
+                series = disk.load(symbol) if symbol in latest else None
+            except OSError as e:
+                print(f"❌ Failed to read the price cache of {symbol}: {e}")
+                disk.discard(symbol)
+                series = None
+            last_date = disk.last_date(series) if series is not None else None
+            if last_date is None or last_date > latest[symbol][0]:
+                remaining.append(symbol)
+                continue
+            result[symbol] = series
+            if last_date < latest[symbol][0]:
+                stale[symbol] = last_date + datetime.timedelta(days=1)
+            else:
+                with self._lock:
+                    if self._generation(symbol) == generations[symbol]:
+                        self._store(symbol, series)
+        return remaining
+
+    def _load(self, cursor, symbols, since=None):
+        query = '''
+            SELECT symbol, timestamp, open, high, low, close, volume
+              FROM StockPrices
+             WHERE symbol IN %s AND timestamp >= %s
+             ORDER BY symbol, timestamp;
+        '''
+        cursor.execute(query, (tuple(symbols), since or '1900-01-01'))
+        rows = cursor.fetchall()
+        loaded = {}
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i == len(rows) or rows[i][0] != rows[start][0]:
+                loaded[rows[start][0]] = PriceSeries.from_rows([row[1:] for row in rows[start:i]])
+                start = i
+        return loaded
+
+    def _store(self, symbol, series):
+        previous = self._series.pop(symbol, None)
+        if previous is not None:
+            self._nbytes -= previous.nbytes
+        self._series[symbol] = series
+        self._nbytes += series.nbytes
+
+    def _evict(self):
+        while self._nbytes > self.max_bytes and len(self._series) > 1:
+            _, series = self._series.popitem(last=False)
+            self._nbytes -= series.nbytes
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def invalidate(self, symbols=None, since=None):
+        """
+        Mark rows of `symbols` dated on or after `since` as stale, or drop the
+        symbols entirely when `since` is None (everything when symbols is None)
+        """
+        with self._lock:
+            if symbols is None:
+                self._epoch += 1
+            else:
+                for symbol in symbols:
+                    self._generations[symbol] = self._generations.get(symbol, 0) + 1
+            for symbol in list(self._series) if symbols is None else symbols:
+                if symbol not in self._series:
+                    continue
+                if since is None:
+                    self._nbytes -= self._series.pop(symbol).nbytes
+                    self._stale.pop(symbol, None)
+                else:
+                    self._stale[symbol] = min(self._stale.get(symbol, since), since)
+        if self.disk:
+            with self._disk_lock:
+                self._invalidate_disk(symbols, since)
+
+    def _invalidate_disk(self, symbols, since):
+        """
+        Cache files must not keep rows that were rewritten in the database. When a
+        file cannot be truncated (a full disk, a replace over a mapped file) its
+        stale marker makes loads skip those rows; when not even the marker can be
+        written the disk cache is turned off for this process.
+        """
+        targets = self.disk.symbols() if symbols is None else symbols
+        failed = []
+        for symbol in targets:
+            try:
+                if since is None:
+                    self.disk.remove(symbol)
+                else:
+                    self.disk.truncate(symbol, since)
+            except OSError as e:
+                print(f"❌ Failed to update the price cache of {symbol}: {e}")
+                failed.append(symbol)
+        if not failed:
+            return
+        with self._lock:
+            # Served from the database from now on, never from the untruncated file
+            for symbol in failed:
+                if symbol in self._series:
+                    self._nbytes -= self._series.pop(symbol).nbytes
+                    self._stale.pop(symbol, None)
+        try:
+            for symbol in failed:
+                self.disk.mark_stale(symbol, since)
+        except OSError as e:
+            print(f"❌ Failed to mark the price cache stale, disabling it: {e}")
+            self.disk = None
+
+
+price_store = PriceStore(disk=PriceCacheDir() if PRICE_CACHE_DIR else None)
@@ -1,28 +1,14 @@
 import psycopg2
+from queries.db import PooledQueries, with_connection
 from queries.utils import decimal_to_float as d2f
 from queries.stock_list import StockList
 
-class Reviews:
-    conn = psycopg2.connect(
-        host='34.130.75.185',
-        database='template1',
-        user='postgres',
-        password='2357'
-    )
+class Reviews(PooledQueries):
     stock_list = StockList()
 
-    def ensure_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(
-                host='34.130.75.185',
-                database='template1',
-                user='postgres',
-                password='2357'
-            )
-
+    @with_connection
     def create_review(self, user_id, stocklist_id, review_text):
 
-        self.ensure_connection()
         if len(review_text) > 4000:
             return None
         cursor = self.conn.cursor()
@@ -57,9 +43,9 @@ class Reviews:
         cursor.close()
         return new_review_id
 
+    @with_connection
     def update_review(self, review_id, user_id, new_text):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         # 1) Check if user is indeed the author
         check_query = '''
@@ -87,9 +73,9 @@ class Reviews:
         cursor.close()
         return updated
 
+    @with_connection
     def delete_review(self, review_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         # 1) Get the user_id of the review's author + the stocklist's creator
         check_query = '''
@@ -122,9 +108,9 @@ class Reviews:
         cursor.close()
         return deleted_id
 
+    @with_connection
     def view_reviews(self, stocklist_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
 
         # check access
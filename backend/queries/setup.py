@@ -1,6 +1,13 @@
 import os
+import re
 import csv
+import datetime
 import psycopg2
+
+# S&P 500 daily history shipped with the repository (data/ next to backend/)
+HISTORY_CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'data', 'SP500History.csv')
+
 create_users = '''
     CREATE TABLE IF NOT EXISTS Users (
         user_id SERIAL PRIMARY KEY,
@@ -131,6 +138,257 @@ create_daily_stock_info = '''
     );
 '''
 
+# Compact storage mode of the two source price tables: set PRICE_STORAGE=compact to store
+# OHLC as fixed-point integer cents (exact to the cent, same width as REAL) and volume as
+# BIGINT, plus a BRIN index for date-range scans of the append-only daily table (a few
+# pages where a B-tree on timestamp grows with the table). benchmarks/price_storage.py
+# measures both layouts.
+# StockPrices, which every read goes through, keeps REAL dollars; rows are converted
+# when they are written to and copied out of the source tables.
+COMPACT_PRICE_STORAGE = os.environ.get('PRICE_STORAGE', '').lower() == 'compact'
+COMPACT_PRICE_TABLES = ('StocksHistory', 'DailyStockInfo')
+
+create_stock_history_compact = '''CREATE TABLE IF NOT EXISTS StocksHistory (
+    timestamp DATE,
+    open INT,      -- cents
+    high INT,
+    low INT,
+    close INT,
+    volume BIGINT,
+    symbol VARCHAR(5),
+    PRIMARY KEY(symbol, timestamp)
+    );
+    '''
+
+create_daily_stock_info_compact = '''
+    CREATE TABLE IF NOT EXISTS DailyStockInfo (
+        timestamp DATE,
+        open INT,      -- cents
+        high INT,
+        low INT,
+        close INT,
+        volume BIGINT,
+        symbol VARCHAR(5),
+        PRIMARY KEY (symbol, timestamp)
+    );
+'''
+
+# Daily rows arrive in date order, so block ranges of timestamp stay tight
+create_compact_indexes = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_daily_stock_info_timestamp_brin
+    ON DailyStockInfo USING BRIN (timestamp);
+    '''
+]
+
+# Session staging table the bulk writers COPY dollar prices into before merging them into
+# a source table in either storage mode
+create_price_staging = '''
+    CREATE TEMP TABLE IF NOT EXISTS {name} (
+        timestamp DATE,
+        open DOUBLE PRECISION,
+        high DOUBLE PRECISION,
+        low DOUBLE PRECISION,
+        close DOUBLE PRECISION,
+        volume BIGINT,
+        symbol VARCHAR(5)
+    ) ON COMMIT DELETE ROWS
+'''
+
+def compact_price_tables(cursor):
+    """The source price tables that store integer cents, read from the catalog"""
+    cursor.execute('''
+        SELECT table_name
+          FROM information_schema.columns
+         WHERE table_name IN %s AND column_name = 'close' AND data_type = 'integer'
+    ''', (tuple(table.lower() for table in COMPACT_PRICE_TABLES),))
+    found = {row[0] for row in cursor.fetchall()}
+    return [table for table in COMPACT_PRICE_TABLES if table.lower() in found]
+
+def stored_prices(compact):
+    """open, high, low, close select-list converting dollars to the table's stored form"""
+    if not compact:
+        return 'open, high, low, close'
+    return ', '.join(f'ROUND({column} * 100)::INT' for column in ('open', 'high', 'low', 'close'))
+
+def dollar_prices(compact):
+    """open, high, low, close select-list converting a table's stored prices to dollars"""
+    if not compact:
+        return 'open, high, low, close'
+    return ', '.join(f'{column} / 100.0' for column in ('open', 'high', 'low', 'close'))
+
+# Schema mode of the price tables (StocksHistory, DailyStockInfo, StockPrices): set
+# PRICE_PARTITIONS=yearly to create them range-partitioned by year on timestamp, so
+# period-bounded scans and MIN(timestamp) probes only touch the years they need and old
+# years can be compacted on their own. Existing heap tables are converted by
+# `python reset_db.py --partition`.
+PARTITION_PRICE_TABLES = os.environ.get('PRICE_PARTITIONS', '').lower() == 'yearly'
+PRICE_TABLES = ('StocksHistory', 'DailyStockInfo', 'StockPrices')
+PARTITION_FIRST_YEAR = 1990  # earliest yearly partition created for an empty table
+
+def partitioned_table(create_query):
+    """The CREATE TABLE statement of a price table, range-partitioned on timestamp"""
+    return create_query.rstrip().rstrip(';').rstrip() + ' PARTITION BY RANGE (timestamp);'
+
+def price_table_queries(partitioned=PARTITION_PRICE_TABLES, compact=COMPACT_PRICE_STORAGE):
+    """CREATE TABLE statements of the price tables in the configured schema and storage modes"""
+    if compact:
+        queries = [create_stock_history_compact, create_daily_stock_info_compact, create_stock_prices]
+    else:
+        queries = [create_stock_history, create_daily_stock_info, create_stock_prices]
+    return [partitioned_table(query) for query in queries] if partitioned else queries
+
+def partitioned_price_tables(cursor):
+    """The price tables that exist as partitioned tables"""
+    cursor.execute('''
+        SELECT c.relname
+          FROM pg_partitioned_table p
+          JOIN pg_class c ON c.oid = p.partrelid
+         WHERE c.relname IN %s
+    ''', (tuple(table.lower() for table in PRICE_TABLES),))
+    found = {row[0] for row in cursor.fetchall()}
+    return [table for table in PRICE_TABLES if table.lower() in found]
+
+def ensure_price_partitions(cursor, first_year=None, last_year=None, tables=None):
+    """
+    Create the missing yearly partitions (and a default partition for dates
+    outside them) of every partitioned price table (or of `tables`), from
+    first_year (the table's earliest data, PARTITION_FIRST_YEAR when empty)
+    through next year. Setup runs this on every start, so a new year's
+    partition exists before its first row arrives.
+    Years that already have rows in the default partition stay there (Postgres
+    refuses a partition for them). A no-op for heap tables. The caller commits.
+    """
+    last_year = last_year or datetime.date.today().year + 1
+    for table in partitioned_price_tables(cursor):
+        if tables is not None and table not in tables:
+            continue
+        start = first_year
+        if start is None:
+            cursor.execute(f"SELECT EXTRACT(YEAR FROM MIN(timestamp))::INT FROM {table}")
+            start = cursor.fetchone()[0] or PARTITION_FIRST_YEAR
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{table.lower()}_default",))
+        defaulted = set()
+        if cursor.fetchone()[0]:
+            cursor.execute(f"SELECT DISTINCT EXTRACT(YEAR FROM timestamp)::INT FROM {table}_default")
+            defaulted = {row[0] for row in cursor.fetchall()}
+        for year in range(min(start, last_year), last_year + 1):
+            if year in defaulted:
+                continue
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table}_y{year} PARTITION OF {table}
+                    FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');
+            ''')
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;")
+
+# Progress of resumable history imports, one row per CSV file: the byte offset up to which
+# every chunk is committed, so an interrupted import resumes there and an appended file only
+# imports its new tail. prefix_hash fingerprints the imported bytes to detect a replaced file
+# (the ALTER upgrades tables created before it existed).
+create_import_checkpoints = '''
+    CREATE TABLE IF NOT EXISTS ImportCheckpoints (
+        file_name VARCHAR(255) PRIMARY KEY,
+        file_size BIGINT NOT NULL,
+        byte_offset BIGINT NOT NULL,
+        prefix_hash VARCHAR(64),
+        rows_read BIGINT NOT NULL DEFAULT 0,
+        rows_inserted BIGINT NOT NULL DEFAULT 0,
+        rows_rejected BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    ALTER TABLE ImportCheckpoints ADD COLUMN IF NOT EXISTS prefix_hash VARCHAR(64);
+'''
+
+# Unified price relation that every price query reads from. StocksHistory (static S&P history)
+# and DailyStockInfo (Yahoo refreshes) are merged here on ingest, so reads scan one indexed
+# table instead of a UNION ALL of both. On overlapping days the DailyStockInfo row wins.
+create_stock_prices = '''
+    CREATE TABLE IF NOT EXISTS StockPrices (
+        timestamp DATE,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INT,
+        symbol VARCHAR(5),
+        PRIMARY KEY (symbol, timestamp)
+    );
+'''
+
+refresh_stock_prices_query = '''
+    INSERT INTO StockPrices (timestamp, open, high, low, close, volume, symbol)
+    SELECT timestamp, {prices}, volume, symbol
+      FROM {source}
+     WHERE {conditions}
+    ON CONFLICT (symbol, timestamp)
+    DO UPDATE SET open = EXCLUDED.open,
+                  high = EXCLUDED.high,
+                  low = EXCLUDED.low,
+                  close = EXCLUDED.close,
+                  volume = EXCLUDED.volume;
+'''
+
+# Most recent close per symbol, kept in step with StockPrices by refresh_stock_prices so
+# valuations look up one row per holding
+create_latest_prices = '''
+    CREATE TABLE IF NOT EXISTS LatestPrices (
+        symbol VARCHAR(5) PRIMARY KEY,
+        timestamp DATE NOT NULL,
+        close REAL
+    );
+'''
+
+refresh_latest_prices_query = '''
+    INSERT INTO LatestPrices (symbol, timestamp, close)
+    SELECT DISTINCT ON (symbol) symbol, timestamp, close
+      FROM StockPrices
+     WHERE {conditions}
+     ORDER BY symbol, timestamp DESC
+    ON CONFLICT (symbol)
+    DO UPDATE SET timestamp = EXCLUDED.timestamp,
+                  close = EXCLUDED.close;
+'''
+
+def refresh_stock_prices(cursor, symbols=None, start_date=None, include_history=False):
+    """
+    Incrementally copy rows into StockPrices. Ingestion paths pass the symbols and
+    first date they just wrote to DailyStockInfo; a full rebuild after loading the
+    CSV passes include_history=True. The caller commits.
+    """
+    conditions = ['TRUE']
+    params = []
+    if symbols:
+        conditions.append('symbol IN %s')
+        params.append(tuple(symbols))
+    if start_date:
+        conditions.append('timestamp >= %s')
+        params.append(start_date)
+
+    compact = compact_price_tables(cursor)
+    # History first so that DailyStockInfo overwrites it on overlapping days
+    sources = ['StocksHistory', 'DailyStockInfo'] if include_history else ['DailyStockInfo']
+    for source in sources:
+        query = refresh_stock_prices_query.format(source=source, prices=dollar_prices(source in compact),
+                                                  conditions=' AND '.join(conditions))
+        cursor.execute(query, params)
+
+    # The latest row may predate start_date only if nothing newer was written, so
+    # re-deriving LatestPrices per symbol (without the date bound) is always correct
+    if symbols:
+        cursor.execute(refresh_latest_prices_query.format(conditions='symbol IN %s'), (tuple(symbols),))
+    else:
+        cursor.execute(refresh_latest_prices_query.format(conditions='TRUE'))
+
+def backfill_stock_prices(cursor):
+    """Populate StockPrices/LatestPrices if they are empty (e.g. a database created before they existed)"""
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM StockPrices)")
+    if not cursor.fetchone()[0]:
+        refresh_stock_prices(cursor, include_history=True)
+        return
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM LatestPrices)")
+    if not cursor.fetchone()[0]:
+        cursor.execute(refresh_latest_prices_query.format(conditions='TRUE'))
+
 load_stock_history_from_csv = '''COPY StocksHistory(timestamp, open, high,low, close, volume, symbol) 
     FROM 'data/pg17/data/sp500history.csv' DELIMITER ',' CSV HEADER;
 '''
@@ -138,11 +396,11 @@ load_stock_history_from_csv = '''COPY StocksHistory(timestamp, open, high,low, c
 def load_stock_history_from_local(conn):
     """
     Load stock history data from a local CSV file and insert it into the database
+    (dollar prices only; compact price storage is loaded by import_stock_history)
     """
     cursor = conn.cursor()
     
-    csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                            '../data', 'SP500History.csv')
+    csv_path = HISTORY_CSV_PATH
     
     print(f"Reading CSV from local path: {csv_path}")
     
@@ -205,11 +463,11 @@ def load_stock_history_from_local(conn):
 def load_stock_history_from_local_fast(conn):
     """
     Load stock history data from a local CSV file using efficient batching
+    (dollar prices only; compact price storage is loaded by import_stock_history)
     """
     cursor = conn.cursor()
     
-    csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                            '..\data', 'SP500History.csv')
+    csv_path = HISTORY_CSV_PATH
     
     print(f"Reading CSV from local path: {csv_path}")
     
@@ -252,28 +510,66 @@ copy_symbols = '''
     ON CONFLICT (symbol) DO NOTHING;
 '''
 
-# Create indexes for portfolio value optimization
+# Managed secondary indexes, one per access pattern of the query modules that no primary key
+# or UNIQUE constraint already serves (those lead with sender_id, stocklist_id, user_id, ...)
 create_indexes = [
+    # Date-range scans (history date spine, MIN(timestamp) probes)
+    '''
+    CREATE INDEX IF NOT EXISTS idx_stock_prices_timestamp
+    ON StockPrices(timestamp);
+    ''',
+    # Incoming requests and the receiver side of view_friends / delete_friend
+    '''
+    CREATE INDEX IF NOT EXISTS idx_friend_request_receiver_status
+    ON FriendRequest(receiver_id, status);
+    ''',
+    # Lists a user owns or was shared (UNIQUE (stocklist_id, user_id) only serves per-list lookups)
+    '''
+    CREATE INDEX IF NOT EXISTS idx_stock_list_access_user_role
+    ON StockListAccess(user_id, access_role);
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_stock_lists_creator_created
+    ON StockLists(creator_id, created_at DESC);
+    ''',
+    # Public lists are a small share of all lists; a partial index keeps only those
+    '''
+    CREATE INDEX IF NOT EXISTS idx_stock_lists_public
+    ON StockLists(stocklist_id) WHERE is_public;
+    ''',
     '''
-    CREATE INDEX IF NOT EXISTS idx_stocks_history_symbol_timestamp 
-    ON StocksHistory(symbol, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_portfolios_user_created
+    ON Portfolios(user_id, created_at DESC);
     ''',
     '''
-    CREATE INDEX IF NOT EXISTS idx_daily_stock_info_symbol_timestamp 
-    ON DailyStockInfo(symbol, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_portfolio_transactions_portfolio_time
+    ON PortfolioTransactions(portfolio_id, transaction_time DESC);
     ''',
+    # Reviews of a list in display order (UNIQUE (user_id, stocklist_id) leads with the user)
     '''
-    CREATE INDEX IF NOT EXISTS idx_portfolio_stocks_portfolio_symbol 
-    ON PortfolioStocks(portfolio_id, symbol);
+    CREATE INDEX IF NOT EXISTS idx_reviews_stocklist_created
+    ON Reviews(stocklist_id, created_at);
     '''
 ]
 
+# Indexes earlier schemas created that duplicated the primary keys of their tables; dropped
+# on reset so existing databases stop maintaining them
+retired_indexes = [
+    'idx_stocks_history_symbol_timestamp',
+    'idx_daily_stock_info_symbol_timestamp',
+    'idx_portfolio_stocks_portfolio_symbol',
+]
+
+
+def index_names(queries):
+    """Names of the indexes created by CREATE INDEX queries"""
+    return [re.search(r'CREATE INDEX IF NOT EXISTS (\w+)', query).group(1) for query in queries]
+
 
 
 setup_queries = [
     create_users,
     create_friend_requests,
-    create_stock_history,
     create_stocks,
     create_stock_lists,
     create_stock_list_access,
@@ -282,7 +578,11 @@ setup_queries = [
     create_portfolio_stocks,
     create_portfolio_transactions,
     create_reviews,
-    create_daily_stock_info,
+    *price_table_queries(),
+    create_latest_prices,
+    create_import_checkpoints,
 ]
 
 setup_queries.extend(create_indexes)
+if COMPACT_PRICE_STORAGE:
+    setup_queries.extend(create_compact_indexes)
@@ -1,32 +1,28 @@
 import psycopg2
 import yfinance as yf
 import datetime
-import time
 import matplotlib.pyplot as plt
 import mplfinance as mpf
+import numpy as np
 import pandas as pd
-from queries.utils import decimal_to_float as d2f
+from queries.db import PooledQueries, with_connection, lease, stream_query, STREAM_CHUNK_SIZE
+from queries.utils import decimal_to_float as d2f, period_start_date
+from queries.setup import refresh_stock_prices
+from queries.latest_prices import latest_prices
+from queries.price_store import price_store
+from queries.history_engine import holdings_valuation
+from queries.analytics_engine import analytics_cache
+from queries.forecast_cache import forecast_cache
+from queries.ingest import DailyIngestor, daily_frame, store_daily_frame
 from typing import Tuple, List, Dict
 
-class StockData:
-    conn = psycopg2.connect(
-        host='34.130.75.185',
-        database='template1',
-        user='postgres',
-        password='2357'
-    )
+STOCK_INFO_PAGE_SIZE = 100  # rows per page of the Stock Info table
 
-    def ensure_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(
-                host='34.130.75.185',
-                database='template1',
-                user='postgres',
-                password='2357'
-            )
 
+class StockData(PooledQueries):
+
+    @with_connection
     def fetch_and_store_daily_info_yahoo(self, symbol, num_days=1):
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Verify symbol exists in Stocks table
@@ -40,25 +36,15 @@ class StockData:
             cursor.close()
             return None
         
-        # Get the most recent date from DailyStockInfo
+        # Get the most recent date across StocksHistory and DailyStockInfo
         recent_date_query = '''
             SELECT MAX(timestamp) 
-            FROM DailyStockInfo
+            FROM StockPrices
             WHERE symbol = %s;
         '''
         cursor.execute(recent_date_query, (symbol,))
         latest_date = cursor.fetchone()[0]
         
-        # If no data in DailyStockInfo, get most recent date from StocksHistory
-        if not latest_date:
-            history_date_query = '''
-                SELECT MAX(timestamp) 
-                FROM StocksHistory
-                WHERE symbol = %s;
-            '''
-            cursor.execute(history_date_query, (symbol,))
-            latest_date = cursor.fetchone()[0]
-        
         adjustment_ratio = 1
         # Calculate the start date (day after the most recent date)
         if latest_date:
@@ -107,74 +93,32 @@ class StockData:
             cursor.close()
             return 0  # No new data available
         
-        # Insert all fetched days
-        inserted_count = 0
-        for index, row in data.iterrows():
-            # Convert index to date object
-            date = index.date() if hasattr(index, 'date') else index.to_pydatetime().date()
-            
-            # Skip if date is in the future
-            if date > today:
-                continue
-                
-            open_price = float(row["Open"]) * adjustment_ratio
-            high_price = float(row["High"]) * adjustment_ratio
-            low_price = float(row["Low"]) * adjustment_ratio
-            close_price = float(row["Close"]) * adjustment_ratio
-            volume = int(row["Volume"]) / adjustment_ratio
-            
-            query = '''
-                INSERT INTO DailyStockInfo (symbol, timestamp, open, high, low, close, volume)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol, timestamp) 
-                DO UPDATE SET open = EXCLUDED.open,
-                            high = EXCLUDED.high,
-                            low = EXCLUDED.low,
-                            close = EXCLUDED.close,
-                            volume = EXCLUDED.volume
-            '''
-            cursor.execute(query, (symbol, date, open_price, high_price, low_price, close_price, volume))
-            inserted_count += 1
+        # Write all fetched days in one bulk upsert
+        frame = daily_frame(symbol, data, adjustment_ratio, until=today)
+        inserted_count = store_daily_frame(cursor, frame)
+        # Yahoo is queried from the latest stored day, so that day is rewritten too
+        written_from = frame['timestamp'].min() if inserted_count else None
         
+        if written_from:
+            refresh_stock_prices(cursor, [symbol], written_from)
         self.conn.commit()
+        latest_prices.invalidate([symbol])
+        holdings_valuation.invalidate()
+        if written_from:
+            price_store.invalidate([symbol], written_from)
+            analytics_cache.invalidate([symbol], written_from)
+            forecast_cache.invalidate([symbol])
         cursor.close()
         return inserted_count
 
-    def fetch_and_store_all_stocks_daily_info(self, num_days=1):
-
-        self.ensure_connection()
-        cursor = self.conn.cursor()
-        
-        # Get all stock symbols
-        query = '''
-            SELECT symbol FROM Stocks;
-        '''
-        cursor.execute(query)
-        symbols = [row[0] for row in cursor.fetchall()]
-        cursor.close()
-        
-        results = {}
-        for symbol in symbols:
-            try:
-                # Add a small delay to avoid rate limiting
-                time.sleep(0.5)
-                print(f"Fetching data for {symbol}...")
-                inserted_count = self.fetch_and_store_daily_info_yahoo(symbol, num_days)
-                if inserted_count:
-                    results[symbol] = inserted_count
-                    print(f"✅ Successfully updated {inserted_count} days for {symbol}")
-                else:
-                    results[symbol] = 0
-                    print(f"ℹ️ No new data available for {symbol}")
-            except Exception as e:
-                print(f"❌ Error fetching data for {symbol}: {e}")
-                results[symbol] = None
-        
-        return results
+    @with_connection
+    def fetch_and_store_all_stocks_daily_info(self, num_days=1, provider=None, progress=None, cancel=None):
+        # Batched, rate-limited download of every symbol; see queries/ingest.py
+        return DailyIngestor(provider).run(self.conn, num_days, progress=progress, cancel=cancel)
     
+    @with_connection
     def fetch_and_store_spy_info_between_dates(self, start_date, end_date):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         try:
@@ -190,41 +134,22 @@ class StockData:
                 cursor.close()
                 return 0  # No data available
             
-            # Insert all fetched days
-            inserted_count = 0
-            for index, row in data.iterrows():
-                # Convert index to date object
-                date = index.date() if hasattr(index, 'date') else index.to_pydatetime().date()
-                
-                open_price = float(row["Open"])
-                high_price = float(row["High"])
-                low_price = float(row["Low"])
-                close_price = float(row["Close"])
-                volume = int(row["Volume"])
-                
-                # First, ensure SPY exists in the Stocks table
-                ensure_spy_query = '''
-                    INSERT INTO Stocks (symbol)
-                    VALUES ('SPY')
-                    ON CONFLICT (symbol) DO NOTHING;
-                '''
-                cursor.execute(ensure_spy_query)
-                
-                # Insert into DailyStockInfo
-                query = '''
-                    INSERT INTO DailyStockInfo (symbol, timestamp, open, high, low, close, volume)
-                    VALUES ('SPY', %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (symbol, timestamp) 
-                    DO UPDATE SET open = EXCLUDED.open,
-                                high = EXCLUDED.high,
-                                low = EXCLUDED.low,
-                                close = EXCLUDED.close,
-                                volume = EXCLUDED.volume;
-                '''
-                cursor.execute(query, (date, open_price, high_price, low_price, close_price, volume))
-                inserted_count += 1
+            # Ensure SPY exists in the Stocks table, then write all fetched days at once
+            ensure_spy_query = '''
+                INSERT INTO Stocks (symbol)
+                VALUES ('SPY')
+                ON CONFLICT (symbol) DO NOTHING;
+            '''
+            cursor.execute(ensure_spy_query)
+            inserted_count = store_daily_frame(cursor, daily_frame('SPY', data))
             
+            refresh_stock_prices(cursor, ['SPY'], start_date)
             self.conn.commit()
+            latest_prices.invalidate(['SPY'])
+            holdings_valuation.invalidate()
+            price_store.invalidate(['SPY'], start_date)
+            analytics_cache.invalidate(['SPY'], start_date)
+            forecast_cache.invalidate(['SPY'])
             cursor.close()
             return inserted_count
             
@@ -234,30 +159,20 @@ class StockData:
             cursor.close()
             return None
 
+    @with_connection
     def view_stock_info(self, symbol, period='all', graph=False):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Calculate the start date based on period
-        # Get the most recent date from DailyStockInfo
+        # Get the most recent date across StocksHistory and DailyStockInfo
         recent_date_query = '''
             SELECT MAX(timestamp) 
-            FROM DailyStockInfo
+            FROM StockPrices
             WHERE symbol = %s;
         '''
         cursor.execute(recent_date_query, (symbol,))
         latest_date = cursor.fetchone()[0]
-        
-        # If no data in DailyStockInfo, get most recent date from StocksHistory
-        if not latest_date:
-            history_date_query = '''
-                SELECT MAX(timestamp) 
-                FROM StocksHistory
-                WHERE symbol = %s;
-            '''
-            cursor.execute(history_date_query, (symbol,))
-            latest_date = cursor.fetchone()[0]
 
         if period == '5d':
             start_date = latest_date - datetime.timedelta(days=5)
@@ -277,33 +192,131 @@ class StockData:
         
         query = '''
             SELECT timestamp, open, high, low, close, volume
-            FROM StocksHistory
-            WHERE symbol = %s AND timestamp >= %s
-            UNION ALL
-            SELECT timestamp, open, high, low, close, volume
-            FROM DailyStockInfo
+            FROM StockPrices
             WHERE symbol = %s AND timestamp >= %s
             ORDER BY timestamp ASC;
         '''
-        cursor.execute(query, (symbol, start_date, symbol, start_date))
+        cursor.execute(query, (symbol, start_date))
         data = cursor.fetchall()
         cursor.close()
         return data
 
+    @with_connection
+    def view_stock_info_page(self, symbol, period='all', after=None, before=None, last=False,
+                             limit=STOCK_INFO_PAGE_SIZE):
+        """
+        One page of view_stock_info rows, oldest first, using keyset pagination on
+        the (symbol, timestamp) key: the rows after the `after` date, the rows just
+        before the `before` date, or the final page when `last` is set. Each page
+        is an index range scan, however deep into the history it is.
+        """
+        cursor = self.conn.cursor()
+        start_date = self._period_start(cursor, symbol, period)
+        if start_date is None:
+            cursor.close()
+            return []
+
+        conditions = ['symbol = %s', 'timestamp >= %s']
+        params = [symbol, start_date]
+        if after is not None:
+            conditions.append('timestamp > %s')
+            params.append(after)
+        if before is not None:
+            conditions.append('timestamp < %s')
+            params.append(before)
+        # Pages that end at a bound are read backwards from it, then put back in order
+        descending = before is not None or last
+        query = '''
+            SELECT timestamp, open, high, low, close, volume
+            FROM StockPrices
+            WHERE {conditions}
+            ORDER BY timestamp {direction}
+            LIMIT %s;
+        '''.format(conditions=' AND '.join(conditions), direction='DESC' if descending else 'ASC')
+        cursor.execute(query, params + [limit])
+        data = cursor.fetchall()
+        cursor.close()
+        return data[::-1] if descending else data
+
+    @with_connection
+    def count_stock_info(self, symbol, period='all'):
+        """Number of rows view_stock_info returns for the period, to size a paged view"""
+        cursor = self.conn.cursor()
+        start_date = self._period_start(cursor, symbol, period)
+        if start_date is None:
+            cursor.close()
+            return 0
+        query = '''
+            SELECT COUNT(*)
+            FROM StockPrices
+            WHERE symbol = %s AND timestamp >= %s;
+        '''
+        cursor.execute(query, (symbol, start_date))
+        count = cursor.fetchone()[0]
+        cursor.close()
+        return count
+
+    def stream_stock_info(self, symbol, period='all', chunk_size=STREAM_CHUNK_SIZE, as_frame=True):
+        """
+        Generator over the view_stock_info rows in chunks read from a server-side
+        cursor. Each chunk is a pandas frame indexed by Date with Open, High, Low,
+        Close and Volume columns or, with as_frame=False, a (dates, values) pair of
+        a datetime64[D] array and a (rows x 5) float64 OHLCV matrix.
+        """
+        # The lease ends before the first chunk is yielded; stream_query has its own connection
+        with lease() as conn:
+            cursor = conn.cursor()
+            start_date = self._period_start(cursor, symbol, period)
+            cursor.close()
+        if start_date is None:
+            return
+
+        query = '''
+            SELECT timestamp, open, high, low, close, volume
+            FROM StockPrices
+            WHERE symbol = %s AND timestamp >= %s
+            ORDER BY timestamp ASC;
+        '''
+        for rows in stream_query(query, (symbol, start_date), chunk_size):
+            dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+            values = np.array([row[1:] for row in rows], dtype=np.float64)
+            if as_frame:
+                yield pd.DataFrame(values, index=pd.DatetimeIndex(dates, name='Date'),
+                                   columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+            else:
+                yield dates, values
+
+    @with_connection
+    def view_stock_frame(self, symbol, period='all'):
+        """
+        The view_stock_info rows as a DataFrame (Date index, OHLCV columns) served
+        from the in-memory price store; None for an unknown period, empty without data
+        """
+        cursor = self.conn.cursor()
+        series = price_store.get(cursor, symbol)
+        cursor.close()
+        if not len(series):
+            return series.to_frame()
+        start_date = period_start_date(series.dates[-1].astype(object), period)
+        if start_date is None:
+            return None
+        return series.between(start_date).to_frame()
+
+    def _period_start(self, cursor, symbol, period):
+        """First date of the period counted back from the symbol's latest price, None without data"""
+        latest = latest_prices.get_latest(cursor, [symbol]).get(symbol)
+        if not latest:
+            return None
+        return period_start_date(latest[0], period)
+
     def display_stock_chart(self, symbol, period='all'):
         
         # Get stock data
-        stock_data = self.view_stock_info(symbol, period)
-        
-        if not stock_data:
+        df = self.view_stock_frame(symbol, period)
+        if df is None or df.empty:
             print(f"No data available for {symbol}")
             return
         
-        # Convert to pandas DataFrame
-        df = pd.DataFrame(stock_data, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-        df['Date'] = pd.to_datetime(df['Date'])
-        df.set_index('Date', inplace=True)
-        
         # Get period name for title
         period_names = {
             '5d': '5 Days', 
@@ -327,26 +340,57 @@ class StockData:
 
         return df 
 
+    @with_connection
     def predict_stock_price(self, symbol: str, days_to_predict: int = 30) -> Tuple[List[Dict], float]:
 
-        self.ensure_connection()
-        cursor = self.conn.cursor()
+        from models.prediction_model import StockPredictionModel
+        model = StockPredictionModel()
         
-        # Get historical data
-        data = self.view_stock_info(symbol, 'all')
-        if not data:
-            cursor.close()
+        # Fitted parameters are reused until the symbol has a newer price or is re-ingested
+        cursor = self.conn.cursor()
+        latest = latest_prices.get_latest(cursor, [symbol]).get(symbol)
+        cursor.close()
+        if not latest:
             return [], 0.0
+        key = ('stock', symbol, latest[0])
+        params = forecast_cache.get(key)
+        
+        if params is None:
+            # Get historical data from the price store
+            df = self.view_stock_frame(symbol, 'all')
+            if df is None or df.empty:
+                return [], 0.0
+                
+            # Convert to list of dicts
+            historical_data = [{
+                'timestamp': date.strftime('%Y-%m-%d'),
+                'close': float(close)
+            } for date, close in zip(df.index, df['Close'])]
             
-        # Convert to list of dicts
-        historical_data = [{
-            'timestamp': row[0].strftime('%Y-%m-%d'),
-            'close': float(row[4])
-        } for row in data]
+            params = model.fit_prices(historical_data)
+            if params is None:
+                return [], 0.0
+            forecast_cache.put(key, [symbol], params)
         
+        return model.forecast_prices(params, days_to_predict)
+
+    @with_connection
+    def predict_stock_prices(self, symbols=None, days_to_predict: int = 30, processes=None, seed=None) -> pd.DataFrame:
+        """
+        Forecast table (symbol, date, price, confidence) for many symbols, all of
+        Stocks by default, from one bulk read of the price store
+        """
+        cursor = self.conn.cursor()
+        if symbols is None:
+            cursor.execute("SELECT symbol FROM Stocks ORDER BY symbol;")
+            symbols = [row[0] for row in cursor.fetchall()]
+        history = price_store.get_many(cursor, symbols)
         cursor.close()
         
-        # Use prediction model
+        histories = {
+            symbol: (series.dates[-1].astype(object), series.close)
+            for symbol, series in history.items() if len(series)
+        }
         from models.prediction_model import StockPredictionModel
         model = StockPredictionModel()
-        return model.predict_future_prices(historical_data, days_to_predict) 
\ No newline at end of file
+        return model.predict_many(histories, days_to_predict, processes=processes, seed=seed)
@@ -1,29 +1,19 @@
 import psycopg2
+from queries.db import PooledQueries, with_connection
 from queries.utils import decimal_to_float as d2f
+from queries.latest_prices import latest_prices
+from queries.history_engine import holdings_valuation, holdings_key
+from queries.analytics_engine import compute_holdings_analytics
+from queries.forecast_cache import forecast_cache
 from queries.friends import Friends
 import datetime
 from typing import List, Dict, Tuple
 
-class StockList:
-    conn = psycopg2.connect(
-        host='34.130.75.185',
-        database='template1',
-        user='postgres',
-        password='2357'
-    )
+class StockList(PooledQueries):
     friends = Friends()
 
-    def ensure_connection(self):
-        if self.conn.closed:
-            self.conn = psycopg2.connect(
-                host='34.130.75.185',
-                database='template1',
-                user='postgres',
-                password='2357'
-            )
-
+    @with_connection
     def create_stock_list(self, creator_id, list_name, is_public=False):
-        self.ensure_connection()
         try:
             creator_id = int(creator_id)  # Ensure integer conversion
             is_public = bool(is_public)  # Ensure boolean conversion
@@ -53,9 +43,9 @@ class StockList:
             print(f"Error in create_stock_list: {e}")
             raise e
     
+    @with_connection
     def delete_stock_list(self, stocklist_id, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if the user is the creator or has 'owner' role
@@ -85,20 +75,18 @@ class StockList:
         cursor.close()
         return deleted_id
     
+    @with_connection
     def add_stock_to_list(self, user_id, stocklist_id, symbol, num_shares):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
 
         try:
             # First check if the stock exists
             check_stock_query = '''
-                SELECT 1 FROM DailyStockInfo WHERE symbol = %s
-                UNION
-                SELECT 1 FROM StocksHistory WHERE symbol = %s
+                SELECT 1 FROM StockPrices WHERE symbol = %s
                 LIMIT 1;
             '''
-            cursor.execute(check_stock_query, (symbol, symbol))
+            cursor.execute(check_stock_query, (symbol,))
             if not cursor.fetchone():
                 cursor.close()
                 return None  # Stock does not exist
@@ -132,9 +120,9 @@ class StockList:
             print(f"Error in add_stock_to_list: {e}")
             return None
 
+    @with_connection
     def remove_stock_from_list(self, user_id, stocklist_id, symbol, num_shares):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
 
         is_owner_query = '''
@@ -188,6 +176,7 @@ class StockList:
             cursor.close()
             return result
 
+    @with_connection
     def view_stock_list(self, user_id, stocklist_id):
         accessible_stock_lists = self.view_accessible_stock_lists(user_id)
         if not any([lst[0] == stocklist_id for lst in accessible_stock_lists]):
@@ -207,9 +196,9 @@ class StockList:
         cursor.close()
         return stocklist_data
 
+    @with_connection
     def share_stock_list(self, stocklist_id, owner_id, friend_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         # Check if the caller actually owns this list or is in owner role
         check_owner_query = '''
@@ -243,9 +232,9 @@ class StockList:
         cursor.close()
         return 1
 
+    @with_connection
     def unshare_stock_list(self, stocklist_id, owner_id, friend_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         # Check if the caller actually owns this list
         check_owner_query = '''
@@ -272,9 +261,9 @@ class StockList:
         cursor.close()
         return result is not None
 
+    @with_connection
     def view_accessible_stock_lists(self, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT DISTINCT sl.stocklist_id,
@@ -300,9 +289,9 @@ class StockList:
         cursor.close()
         return results
 
+    @with_connection
     def view_user_owned_stock_lists(self, user_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         query = '''
             SELECT DISTINCT sl.stocklist_id, 
@@ -323,9 +312,9 @@ class StockList:
         cursor.close()
         return stock_lists
 
+    @with_connection
     def compute_stock_list_value(self, user_id, stocklist_id):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to this stock list
@@ -335,45 +324,26 @@ class StockList:
             return None
             
         # Calculate stock value using latest prices
-        value_query = '''
-            WITH latest_prices AS (
-                SELECT 
-                    symbol,
-                    MAX(timestamp) as max_time
-                FROM (
-                    SELECT symbol, timestamp FROM StocksHistory
-                    UNION ALL
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                ) combined
-                GROUP BY symbol
-            ),
-            current_prices AS (
-                SELECT 
-                    lp.symbol,
-                    COALESCE(
-                        (SELECT close FROM DailyStockInfo WHERE symbol = lp.symbol AND timestamp = lp.max_time),
-                        (SELECT close FROM StocksHistory WHERE symbol = lp.symbol AND timestamp = lp.max_time)
-                    ) as close_price
-                FROM latest_prices lp
-            )
-            SELECT SUM(sls.num_shares * cp.close_price)
-            FROM StockListStocks sls
-            JOIN current_prices cp ON sls.symbol = cp.symbol
-            WHERE sls.stocklist_id = %s;
+        holdings_query = '''
+            SELECT symbol, num_shares
+              FROM StockListStocks
+             WHERE stocklist_id = %s
         '''
-        cursor.execute(value_query, (stocklist_id,))
-        result = cursor.fetchone()
-        if not result:
+        cursor.execute(holdings_query, (stocklist_id,))
+        holdings = cursor.fetchall()
+        prices = latest_prices.get_prices(cursor, [symbol for symbol, _ in holdings])
+        priced = [num_shares * prices[symbol] for symbol, num_shares in holdings if symbol in prices]
+        if not priced:
             cursor.close()
             return None
         
-        stock_value = d2f(result[0])
+        stock_value = sum(priced)
         cursor.close()
         return stock_value
 
+    @with_connection
     def view_stock_list_history(self, user_id, stocklist_id, period='all'):
         
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to stock list
@@ -397,88 +367,14 @@ class StockList:
             cursor.close()
             return None
             
-        # Get the most recent date from DailyStockInfo or StocksHistory
-        # for the stocks *in the stock list*, take the minimum of the max dates
-        recent_date_query = '''
-            SELECT MIN(max_ts)
-            FROM (
-                SELECT sls.symbol, MAX(combined.timestamp) as max_ts
-                FROM StockListStocks sls
-                JOIN (
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                    UNION ALL
-                    SELECT symbol, timestamp FROM StocksHistory
-                ) combined ON sls.symbol = combined.symbol
-                WHERE sls.stocklist_id = %s
-                GROUP BY sls.symbol
-            ) AS symbol_max_dates;
-        '''
-        cursor.execute(recent_date_query, (stocklist_id,))
-        latest_date = cursor.fetchone()[0]
-        
-        if not latest_date:
-            cursor.close()
-            return None
-            
-        # Calculate the start date based on period
-        if period == '5d':
-            start_date = latest_date - datetime.timedelta(days=5)
-        elif period == '1mo':
-            start_date = latest_date - datetime.timedelta(days=30)
-        elif period == '6mo':
-            start_date = latest_date - datetime.timedelta(days=180)
-        elif period == '1y':
-            start_date = latest_date - datetime.timedelta(days=365)
-        elif period == '5y':
-            start_date = latest_date - datetime.timedelta(days=5*365)
-        elif period == 'all':
-            start_date = datetime.date(1900, 1, 1)
-        else:
-            cursor.close()
-            return None
-            
-        # Get historical data for all stocks in the list
-        history_query = '''
-            WITH list_dates AS (
-                SELECT DISTINCT timestamp
-                FROM (
-                    SELECT timestamp FROM StocksHistory
-                    UNION
-                    SELECT timestamp FROM DailyStockInfo
-                ) all_dates
-                WHERE timestamp >= %s AND timestamp <= %s
-            ),
-            stock_values AS (
-                SELECT 
-                    ld.timestamp,
-                    sls.symbol,
-                    sls.num_shares,
-                    COALESCE(sh.close, dsi.close) as close_price
-                FROM list_dates ld
-                CROSS JOIN (
-                    SELECT symbol, num_shares
-                    FROM StockListStocks
-                    WHERE stocklist_id = %s
-                ) sls
-                LEFT JOIN StocksHistory sh ON sh.symbol = sls.symbol AND sh.timestamp = ld.timestamp
-                LEFT JOIN DailyStockInfo dsi ON dsi.symbol = sls.symbol AND dsi.timestamp = ld.timestamp
-            )
-            SELECT 
-                timestamp,
-                SUM(num_shares * close_price) as total_value
-            FROM stock_values
-            GROUP BY timestamp
-            ORDER BY timestamp ASC;
-        '''
-        
-        cursor.execute(history_query, (start_date, latest_date, stocklist_id))
-        history = cursor.fetchall()
+        # Value the holdings up to the latest date on which every stock in the list has a price
+        history = holdings_valuation.history(cursor, holdings, period)
         cursor.close()
         return history 
 
-    def predict_stock_list_value(self, user_id: int, stocklist_id: int, days_to_predict: int = 30) -> Tuple[List[Dict], float]:
+    @with_connection
+    def predict_stock_list_value(self, user_id: int, stocklist_id: int, days_to_predict: int = 30, seed=None) -> Tuple[List[Dict], float]:
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to stock list
@@ -487,76 +383,44 @@ class StockList:
             cursor.close()
             return [], 0.0
             
-        # Get the minimum of maximum dates for all stocks in the list
-        max_dates_query = '''
-            SELECT MIN(max_ts)
-            FROM (
-                SELECT sls.symbol, MAX(combined.timestamp) as max_ts
-                FROM StockListStocks sls
-                JOIN (
-                    SELECT symbol, timestamp FROM StocksHistory
-                    UNION ALL
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                ) combined ON sls.symbol = combined.symbol
-                WHERE sls.stocklist_id = %s
-                GROUP BY sls.symbol
-            ) AS symbol_max_dates;
+        # Get current stock list holdings
+        holdings_query = '''
+            SELECT symbol, num_shares
+            FROM StockListStocks
+            WHERE stocklist_id = %s
         '''
-        cursor.execute(max_dates_query, (stocklist_id,))
-        latest_date = cursor.fetchone()[0]
+        cursor.execute(holdings_query, (stocklist_id,))
+        holdings = cursor.fetchall()
         
-        if not latest_date:
-            cursor.close()
-            return [], 0.0
-            
-        # Get historical stock list values up to the latest common date
-        history_query = '''
-            WITH list_dates AS (
-                SELECT DISTINCT timestamp
-                FROM (
-                    SELECT timestamp FROM StocksHistory
-                    UNION
-                    SELECT timestamp FROM DailyStockInfo
-                ) all_dates
-                WHERE timestamp <= %s
-            ),
-            stock_values AS (
-                SELECT 
-                    ld.timestamp,
-                    sls.symbol,
-                    sls.num_shares,
-                    COALESCE(sh.close, dsi.close) as close_price
-                FROM list_dates ld
-                CROSS JOIN (
-                    SELECT symbol, num_shares
-                    FROM StockListStocks
-                    WHERE stocklist_id = %s
-                ) sls
-                LEFT JOIN StocksHistory sh ON sh.symbol = sls.symbol AND sh.timestamp = ld.timestamp
-                LEFT JOIN DailyStockInfo dsi ON dsi.symbol = sls.symbol AND dsi.timestamp = ld.timestamp
-            )
-            SELECT 
-                timestamp,
-                SUM(num_shares * close_price) as total_value
-            FROM stock_values
-            GROUP BY timestamp
-            ORDER BY timestamp ASC;
-        '''
+        from models.prediction_model import StockListPredictionModel
+        model = StockListPredictionModel()
         
-        cursor.execute(history_query, (latest_date, stocklist_id))
-        list_data = [{'timestamp': row[0].strftime('%Y-%m-%d'), 'value': float(row[1])} 
-                    for row in cursor.fetchall()]
+        # Fitted parameters are reused until the holdings or the price data change
+        latest_date = holdings_valuation.latest_common_date(cursor, [symbol for symbol, _ in holdings])
+        key = ('stocklist', holdings_key(holdings), latest_date)
+        params = forecast_cache.get(key)
         
-        cursor.close()
+        if params is None:
+            # Get historical stock list values up to the latest common date
+            history = holdings_valuation.history(cursor, holdings, 'all')
+            if not history:
+                cursor.close()
+                return [], 0.0
+            list_data = [{'timestamp': timestamp.strftime('%Y-%m-%d'), 'value': value}
+                        for timestamp, value in history]
+            
+            params = model.fit_values(list_data)
+            if params is None:
+                cursor.close()
+                return [], 0.0
+            forecast_cache.put(key, [symbol for symbol, _ in holdings], params)
         
-        # Use prediction model
-        from models.prediction_model import StockListPredictionModel
-        model = StockListPredictionModel()
-        return model.predict_stock_list_value(list_data, days_to_predict) 
+        cursor.close()
+        return model.forecast_values(params, days_to_predict, seed=seed) 
 
+    @with_connection
     def compute_stock_list_analytics(self, user_id, stocklist_id, start_date=None, end_date=None):
 
-        self.ensure_connection()
         cursor = self.conn.cursor()
         
         # Check if user has access to stock list
@@ -571,11 +435,7 @@ class StockList:
                 FROM (
                     SELECT sls.symbol, MAX(combined.timestamp) as max_ts
                     FROM StockListStocks sls
-                    JOIN (
-                        SELECT symbol, timestamp FROM DailyStockInfo
-                        UNION ALL
-                        SELECT symbol, timestamp FROM StocksHistory
-                    ) combined ON sls.symbol = combined.symbol
+                    JOIN StockPrices combined ON sls.symbol = combined.symbol
                     WHERE sls.stocklist_id = %s
                     GROUP BY sls.symbol
                 ) AS symbol_max_dates;
@@ -589,11 +449,7 @@ class StockList:
             end_date = latest_date
             earliest_date_query = '''
                 SELECT MIN(timestamp)
-                FROM (
-                    SELECT symbol, timestamp FROM DailyStockInfo
-                    UNION ALL
-                    SELECT symbol, timestamp FROM StocksHistory
-                ) combined
+                FROM StockPrices
             '''
             cursor.execute(earliest_date_query, (stocklist_id,))
             start_date = cursor.fetchone()[0]
@@ -617,7 +473,7 @@ class StockList:
             SELECT COUNT(*)
             FROM (
                 SELECT timestamp
-                FROM DailyStockInfo
+                FROM StockPrices
                 WHERE symbol = 'SPY' AND timestamp BETWEEN %s AND %s
             ) spy_data
         '''
@@ -634,142 +490,11 @@ class StockList:
                 print("Could not fetch SPY data")
                 return None  # Could not fetch SPY data
 
-        # Calculate daily returns, CV, and Beta for each stock
-        analytics_query = '''
-            WITH daily_returns AS (
-                SELECT 
-                    symbol,
-                    timestamp,
-                    (close - LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp)) / LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp) as daily_return
-                FROM (
-                    (SELECT symbol, timestamp, close
-                    FROM StocksHistory
-                    WHERE symbol IN %s AND timestamp >= %s AND timestamp <= %s)
-                    UNION ALL
-                    (SELECT symbol, timestamp, close
-                    FROM DailyStockInfo
-                    WHERE symbol IN %s AND timestamp >= %s AND timestamp <= %s)
-                ) combined
-            ),
-            spy_returns AS (
-                SELECT 
-                    timestamp,
-                    (close - LAG(close) OVER (ORDER BY timestamp)) / LAG(close) OVER (ORDER BY timestamp) as spy_return
-                FROM (
-                    SELECT timestamp, close
-                    FROM DailyStockInfo
-                    WHERE symbol = 'SPY' AND timestamp >= %s AND timestamp <= %s
-                ) spy_data
-            ),
-            stock_stats AS (
-                SELECT 
-                    dr.symbol,
-                    AVG(dr.daily_return) as mean_return,
-                    STDDEV(dr.daily_return) as std_return,
-                    (AVG(dr.daily_return * sr.spy_return) - AVG(dr.daily_return) * AVG(sr.spy_return)) as cov_with_spy,
-                    VARIANCE(sr.spy_return) as spy_variance
-                FROM daily_returns dr
-                JOIN spy_returns sr ON dr.timestamp = sr.timestamp
-                WHERE dr.daily_return IS NOT NULL AND sr.spy_return IS NOT NULL
-                GROUP BY dr.symbol
-            ),
-            correlation_matrix AS (
-                SELECT 
-                    a.symbol as symbol1,
-                    b.symbol as symbol2,
-                    (AVG(a.daily_return * b.daily_return) - AVG(a.daily_return) * AVG(b.daily_return)) / 
-                    (STDDEV(a.daily_return) * STDDEV(b.daily_return)) as correlation
-                FROM daily_returns a
-                JOIN daily_returns b ON a.timestamp = b.timestamp
-                GROUP BY a.symbol, b.symbol
-            ),
-            covariance_matrix AS (
-                SELECT 
-                    a.symbol as symbol1,
-                    b.symbol as symbol2,
-                    (AVG(a.daily_return * b.daily_return) - AVG(a.daily_return) * AVG(b.daily_return)) as covariance
-                FROM daily_returns a
-                JOIN daily_returns b ON a.timestamp = b.timestamp
-                GROUP BY a.symbol, b.symbol
-            )
-            SELECT 
-                ss.symbol,
-                ss.mean_return,
-                ss.std_return,
-                CASE 
-                    WHEN ss.mean_return = 0 THEN 0 
-                    ELSE ss.std_return / ss.mean_return 
-                END as coefficient_of_variation,
-                CASE 
-                    WHEN ss.spy_variance = 0 THEN 0 
-                    ELSE ss.cov_with_spy / ss.spy_variance 
-                END as beta,
-                cm.symbol2,
-                cm.correlation,
-                covm.symbol2 as cov_symbol2,
-                covm.covariance
-            FROM stock_stats ss
-            LEFT JOIN correlation_matrix cm ON ss.symbol = cm.symbol1
-            LEFT JOIN covariance_matrix covm ON ss.symbol = covm.symbol1
-            ORDER BY ss.symbol, cm.symbol2, covm.symbol2;
-        '''
-        
-        # Prepare parameters for the query
-        symbols = tuple(stock[0] for stock in stock_list_stocks)
-        params = (symbols, start_date, end_date, symbols, start_date, end_date,
-                 start_date, end_date)
-        
-        cursor.execute(analytics_query, params)
-        analytics_data = cursor.fetchall()
-        
-        if not analytics_data:
-            cursor.close()
+        # Calculate daily returns, CV, Beta, correlation and covariance for each stock from one
+        # fetch of the aligned returns (holdings + SPY), vectorized in memory
+        analytics = compute_holdings_analytics(cursor, stock_list_stocks, start_date, end_date)
+        cursor.close()
+        if not analytics:
             print("No analytics data")
             return None
-            
-        stock_analytics = []
-        correlation_matrix = {}
-        covariance_matrix = {}
-        
-        current_symbol = None
-        for row in analytics_data:
-            symbol = row[0]
-            cv = float(row[3])
-            beta = float(row[4])
-            corr_symbol2 = row[5]
-            correlation = float(row[6]) if row[6] is not None else 0
-            cov_symbol2 = row[7]
-            covariance = float(row[8]) if row[8] is not None else 0
-            
-            # Add stock analytics if we haven't seen this symbol before
-            if symbol != current_symbol:
-                current_symbol = symbol
-                stock_analytics.append({
-                    'symbol': symbol,
-                    'shares': next(stock[1] for stock in stock_list_stocks if stock[0] == symbol),
-                    'coefficient_of_variation': cv,
-                    'beta': beta
-                })
-                correlation_matrix[symbol] = {symbol: 1.0}  # Self-correlation is always 1
-                covariance_matrix[symbol] = {symbol: covariance}  # Self-covariance
-            
-            # Add correlation and covariance data if available
-            if corr_symbol2 is not None:
-                correlation_matrix[symbol][corr_symbol2] = correlation
-                if corr_symbol2 not in correlation_matrix:
-                    correlation_matrix[corr_symbol2] = {}
-                correlation_matrix[corr_symbol2][symbol] = correlation
-                correlation_matrix[corr_symbol2][corr_symbol2] = 1.0
-            
-            if cov_symbol2 is not None:
-                covariance_matrix[symbol][cov_symbol2] = covariance
-                if cov_symbol2 not in covariance_matrix:
-                    covariance_matrix[cov_symbol2] = {}
-                covariance_matrix[cov_symbol2][symbol] = covariance
-        
-        cursor.close()
-        return {
-            'stock_analytics': stock_analytics,
-            'correlation_matrix': correlation_matrix,
-            'covariance_matrix': covariance_matrix
-        } 
\ No newline at end of file
+        return analytics
@@ -1,4 +1,5 @@
 import decimal
+import datetime
 delete_all_tables = '''
     DO $$ DECLARE
         r RECORD;
@@ -16,4 +17,21 @@ def decimal_to_float(value):
         return None
     if isinstance(value, decimal.Decimal):
         return float(value)
-    return value
\ No newline at end of file
+    return value
+
+
+def period_start_date(latest_date, period):
+    """First date of a named history period ending at latest_date, or None for an unknown period."""
+    if period == '5d':
+        return latest_date - datetime.timedelta(days=5)
+    elif period == '1mo':
+        return latest_date - datetime.timedelta(days=30)
+    elif period == '6mo':
+        return latest_date - datetime.timedelta(days=180)
+    elif period == '1y':
+        return latest_date - datetime.timedelta(days=365)
+    elif period == '5y':
+        return latest_date - datetime.timedelta(days=5*365)
+    elif period == 'all':
+        return datetime.date(1900, 1, 1)
+    return None
@@ -1,17 +1,15 @@
+import argparse
 import psycopg2
+from queries.db import connect
+from queries.price_cache import PriceCacheDir
 from queries.setup import (
     create_users, create_friend_requests, create_stock_lists, create_stock_list_access,
     create_stocks, create_stock_list_stocks, create_portfolios, create_portfolio_stocks,
-    create_portfolio_transactions, create_reviews, create_stock_history, create_daily_stock_info,
-    create_indexes
+    create_portfolio_transactions, create_reviews, create_latest_prices, create_import_checkpoints,
+    create_indexes as index_queries, retired_indexes, index_names, price_table_queries, partitioned_table,
+    partitioned_price_tables, ensure_price_partitions, compact_price_tables, create_compact_indexes, PRICE_TABLES
 )
 
-# Database connection parameters
-DB_HOST = '34.130.75.185'
-DB_NAME = 'template1'
-DB_USER = 'postgres'
-DB_PASSWORD = '2357'
-
 def drop_tables(cursor):
     """Drop all tables in the correct order to respect foreign key constraints"""
     drop_queries = [
@@ -23,6 +21,9 @@ def drop_tables(cursor):
         "DROP TABLE IF EXISTS StockListAccess CASCADE;",
         "DROP TABLE IF EXISTS StockLists CASCADE;",
         "DROP TABLE IF EXISTS FriendRequest CASCADE;",
+        "DROP TABLE IF EXISTS ImportCheckpoints CASCADE;",
+        "DROP TABLE IF EXISTS LatestPrices CASCADE;",
+        "DROP TABLE IF EXISTS StockPrices CASCADE;",
         "DROP TABLE IF EXISTS DailyStockInfo CASCADE;",
         "DROP TABLE IF EXISTS StocksHistory CASCADE;",
         "DROP TABLE IF EXISTS Stocks CASCADE;",
@@ -45,39 +46,95 @@ def create_tables(cursor):
         create_portfolio_stocks,
         create_portfolio_transactions,
         create_reviews,
-        create_stock_history,
-        create_daily_stock_info
+        *price_table_queries(),
+        create_latest_prices,
+        create_import_checkpoints
     ]
     
     for query in create_queries:
         cursor.execute(query)
+    ensure_price_partitions(cursor)
 
 def drop_indexes(cursor):
-    """Drop all indexes"""
-    drop_index_queries = [
-        "DROP INDEX IF EXISTS idx_stocks_history_symbol_timestamp;",
-        "DROP INDEX IF EXISTS idx_daily_stock_info_symbol_timestamp;",
-        "DROP INDEX IF EXISTS idx_portfolio_stocks_portfolio_symbol;"
-    ]
-    
-    for query in drop_index_queries:
-        cursor.execute(query)
+    """Drop all managed indexes, and those earlier schemas created"""
+    for name in index_names(index_queries) + index_names(create_compact_indexes) + retired_indexes:
+        cursor.execute(f"DROP INDEX IF EXISTS {name};")
 
 def create_indexes(cursor):
     """Create all indexes"""
-    for query in create_indexes:
+    for query in index_queries:
         cursor.execute(query)
+    if 'DailyStockInfo' in compact_price_tables(cursor):
+        for query in create_compact_indexes:
+            cursor.execute(query)
+
+def migrate_to_partitioned(cursor):
+    """
+    Convert the price tables that are still heap tables into yearly range-partitioned
+    tables in place: each is renamed aside, recreated partitioned with partitions
+    covering its data, copied over and dropped. Indexes are recreated on the new
+    tables. Runs in the caller's transaction.
+    """
+    partitioned = set(partitioned_price_tables(cursor))
+    compact = set(compact_price_tables(cursor))
+    heap_tables = []
+    for table, real_query, compact_query in zip(PRICE_TABLES, price_table_queries(partitioned=False, compact=False),
+                                                price_table_queries(partitioned=False, compact=True)):
+        if table not in partitioned:
+            # Each table keeps the storage mode it was created with
+            heap_tables.append((table, compact_query if table in compact else real_query))
+    if not heap_tables:
+        print("Price tables are already partitioned")
+        return
+    drop_indexes(cursor)
+    for table, create_query in heap_tables:
+        print(f"Partitioning {table}")
+        old = f"{table}_heap"
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        # The primary key index keeps its name; free it for the new table
+        cursor.execute(f"ALTER INDEX {table.lower()}_pkey RENAME TO {old.lower()}_pkey")
+        cursor.execute(partitioned_table(create_query))
+        cursor.execute(f"SELECT EXTRACT(YEAR FROM MIN(timestamp))::INT FROM {old}")
+        ensure_price_partitions(cursor, first_year=cursor.fetchone()[0], tables=[table])
+        cursor.execute(f'''
+            INSERT INTO {table} (timestamp, open, high, low, close, volume, symbol)
+            SELECT timestamp, open, high, low, close, volume, symbol
+              FROM {old}
+        ''')
+        cursor.execute(f"DROP TABLE {old}")
+    create_indexes(cursor)
+
+def compact_partitions(conn, before_year):
+    """
+    Compact the yearly price partitions older than `before_year`: rewrite each in
+    primary key order (CLUSTER) and freeze it (VACUUM), so closed years stay
+    dense and are never rewritten by later vacuums
+    """
+    conn.autocommit = True  # VACUUM cannot run inside a transaction
+    cursor = conn.cursor()
+    query = '''
+        SELECT child.relname, index.relname
+          FROM pg_inherits i
+          JOIN pg_class parent ON parent.oid = i.inhparent
+          JOIN pg_class child ON child.oid = i.inhrelid
+          JOIN pg_index x ON x.indrelid = child.oid AND x.indisprimary
+          JOIN pg_class index ON index.oid = x.indexrelid
+         WHERE parent.relname IN %s AND child.relname ~ '_y[0-9]{4}$'
+           AND substring(child.relname FROM '_y([0-9]{4})$')::INT < %s
+         ORDER BY child.relname
+    '''
+    cursor.execute(query, (tuple(table.lower() for table in PRICE_TABLES), before_year))
+    for partition, primary_key in cursor.fetchall():
+        print(f"Compacting {partition}")
+        cursor.execute(f"CLUSTER {partition} USING {primary_key}")
+        cursor.execute(f"VACUUM (FREEZE, ANALYZE) {partition}")
+    cursor.close()
 
 def reset_database():
     """Reset the database by dropping and recreating all tables and indexes"""
     try:
-        # Connect to the database
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
+        # Connect to the database (settings come from DB_* env vars or db.ini)
+        conn = connect()
         cursor = conn.cursor()
         
         print("Starting database reset")
@@ -94,12 +151,15 @@ def reset_database():
         print("Creating all tables")
         create_tables(cursor)
         
-        # # Create all indexes
-        # print("Creating all indexes")
-        # create_indexes(cursor)
+        # Create all indexes
+        print("Creating all indexes")
+        create_indexes(cursor)
         
         # Commit the changes
         conn.commit()
+
+        # Cached histories describe the old tables
+        PriceCacheDir().remove()
         print("Database reset complete")
         
     except psycopg2.Error as e:
@@ -112,5 +172,37 @@ def reset_database():
         if conn:
             conn.close()
 
+def migrate_database(before_year=None):
+    """Partition the price tables in place (no data is dropped), then optionally compact old years"""
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        print("Starting price table migration")
+        migrate_to_partitioned(cursor)
+        conn.commit()
+        # Cached histories are unchanged by the migration, so the price cache is kept
+        print("Price table migration complete")
+        if before_year:
+            compact_partitions(conn, before_year)
+    except psycopg2.Error as e:
+        print(f"Price table migration failed: {e}")
+        if conn:
+            conn.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 if __name__ == "__main__":
-    reset_database() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reset the database, or migrate its price tables")
+    parser.add_argument('--partition', action='store_true',
+                        help='convert the price tables to yearly partitions in place instead of resetting')
+    parser.add_argument('--compact-before', type=int, metavar='YEAR',
+                        help='with --partition, compact the partitions of years before YEAR')
+    args = parser.parse_args()
+    if args.partition:
+        migrate_database(args.compact_before)
+    else:
+        reset_database() 
\ No newline at end of file